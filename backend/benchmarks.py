@@ -0,0 +1,255 @@
+"""
+Benchmarks de rendimiento de los núcleos de cálculo del backend.
+Ejecutar: python benchmarks.py [suite | estimacion] (ver --help)
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ejemplo_datos import (
+    generar_estados,
+    generar_exposiciones,
+    generar_matriz_sintetica,
+    generar_registros_sinteticos,
+)
+from main import (
+    CACHE,
+    analizar_propiedades_markov,
+    aplicar_stress,
+    calcular_perdidas_esperadas,
+    calcular_propiedades_algebra_lineal,
+    calcular_vector_estacionario,
+    clasificar_estados,
+    contar_transiciones,
+    estimar_matriz_transicion,
+    normalizar_conteos,
+    preparar_matriz,
+)
+
+ESTADOS_SUITE = (3, 10, 50, 200, 1000, 5000)
+REGISTROS_SUITE = (10**3, 10**4, 10**5, 10**6, 10**7)
+ARCHIVO_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_base.json")
+
+# Una medición es regresión si supera a la base en más de la tolerancia relativa
+# y además en más de MARGEN_ABSOLUTO segundos (evita falsos positivos por ruido)
+TOLERANCIA_REGRESION = 0.25
+MARGEN_ABSOLUTO = 1e-3
+
+
+def generar_registros(n_registros: int, n_estados: int = 3, semilla: int = 0):
+    """Pares [origen, destino] sintéticos al estilo de ejemplo_datos.py"""
+    return generar_registros_sinteticos(n_registros, n_estados, semilla)
+
+
+def contar_transiciones_bucle(registros):
+    """Implementación original con bucle Python, usada como referencia"""
+    estados = sorted(set([item for sublist in registros for item in sublist]))
+    n_estados = len(estados)
+    estado_idx = {estado: i for i, estado in enumerate(estados)}
+    matriz_conteo = np.zeros((n_estados, n_estados))
+    for origen, destino in registros:
+        matriz_conteo[estado_idx[origen], estado_idx[destino]] += 1
+    return estados, matriz_conteo
+
+
+def medir(funcion, *args, repeticiones: int = 3, preparar=None, tiempo_max: float = 5.0) -> float:
+    """Devuelve el mejor tiempo (segundos) de varias repeticiones; corta antes si se supera tiempo_max"""
+    mejor = float("inf")
+    acumulado = 0.0
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion(*args)
+        transcurrido = time.perf_counter() - inicio
+        mejor = min(mejor, transcurrido)
+        acumulado += transcurrido
+        if acumulado > tiempo_max:
+            break
+    return mejor
+
+
+def benchmark_estimacion(tamanos=(10**5, 10**6, 10**7), n_estados: int = 5):
+    """Throughput del conteo vectorizado frente al bucle original (ambos con la misma normalización)"""
+    print("=" * 70)
+    print("Estimación de matriz de transición (conteo + normalización en ambos lados)")
+    print("=" * 70)
+    print(f"{'registros':>12} {'vectorizado (s)':>16} {'reg/s':>14} {'bucle (s)':>12} {'speedup':>8}")
+
+    for n_registros in tamanos:
+        registros = generar_registros(n_registros, n_estados)
+
+        # Mismos pasos en los dos lados: solo cambia cómo se cuenta
+        t_vec = medir(lambda r: normalizar_conteos(contar_transiciones(r)[1]), registros)
+        t_bucle = medir(lambda r: normalizar_conteos(contar_transiciones_bucle(r)[1]), registros, repeticiones=1)
+
+        estados_vec, conteo_vec = contar_transiciones(registros)
+        estados_bucle, conteo_bucle = contar_transiciones_bucle(registros)
+        assert estados_vec == estados_bucle and np.array_equal(conteo_vec, conteo_bucle)
+
+        print(f"{n_registros:>12,} {t_vec:>16.4f} {n_registros / t_vec:>14,.0f} "
+              f"{t_bucle:>12.4f} {t_bucle / t_vec:>7.1f}x")
+        del registros
+
+
+def nucleos_por_estados(n_estados: int):
+    """Casos (nombre, función, argumentos) de los núcleos que dependen del número de estados"""
+    estados = generar_estados(n_estados)
+    densa = generar_matriz_sintetica(n_estados)
+    matriz = preparar_matriz(densa)
+    ead, lgd = generar_exposiciones(estados)
+    return [
+        ("calcular_vector_estacionario", calcular_vector_estacionario, (matriz,)),
+        ("calcular_propiedades_algebra_lineal", calcular_propiedades_algebra_lineal, (densa,)),
+        ("analizar_propiedades_markov", analizar_propiedades_markov, (matriz, estados)),
+        ("clasificar_estados", clasificar_estados, (matriz, estados)),
+        ("aplicar_stress", aplicar_stress, (matriz, estados, 1.2, 1.3)),
+        ("calcular_perdidas_esperadas", calcular_perdidas_esperadas, (matriz, estados, ead, lgd)),
+    ]
+
+
+def ejecutar_suite(estados=ESTADOS_SUITE, registros=REGISTROS_SUITE, n_estados_registros: int = 10,
+                   nucleos=None, repeticiones: int = 3) -> dict:
+    """Barre estados y registros; devuelve {"nucleo/parametro": segundos}"""
+    resultados = {}
+
+    def registrar(nombre, parametro, funcion, *args):
+        if nucleos and nombre not in nucleos:
+            return
+        clave = f"{nombre}/{parametro}"
+        try:
+            # La caché de resultados se vacía antes de cada repetición para medir el cálculo real
+            resultados[clave] = medir(funcion, *args, repeticiones=repeticiones, preparar=CACHE.limpiar)
+            print(f"  {clave:<55} {resultados[clave]:>12.5f} s", flush=True)
+        except Exception as e:
+            print(f"  {clave:<55} {'omitido':>12}   ({e})", flush=True)
+
+    print("=" * 70)
+    print(f"Estimación ({n_estados_registros} estados, sin secciones de análisis)")
+    print("=" * 70)
+    for n_registros in registros:
+        lista = generar_registros(n_registros, n_estados_registros)
+        registrar("estimar_matriz_transicion", f"registros={n_registros}",
+                  estimar_matriz_transicion, lista, [])
+        del lista
+
+    print("=" * 70)
+    print("Núcleos por número de estados")
+    print("=" * 70)
+    for n_estados in estados:
+        for nombre, funcion, args in nucleos_por_estados(n_estados):
+            registrar(nombre, f"estados={n_estados}", funcion, *args)
+
+    return resultados
+
+
+def guardar_base(resultados: dict, archivo: str = ARCHIVO_BASE) -> None:
+    """Guarda (o actualiza) los tiempos de referencia junto con los datos de la máquina"""
+    base = cargar_base(archivo)
+    base["resultados"].update(resultados)
+    base["maquina"] = {
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    base["fecha"] = datetime.now().isoformat(timespec="seconds")
+    with open(archivo, "w", encoding="utf-8") as f:
+        json.dump(base, f, indent=2, sort_keys=True)
+    print(f"\nBase guardada en {archivo} ({len(base['resultados'])} mediciones)")
+
+
+def cargar_base(archivo: str = ARCHIVO_BASE) -> dict:
+    if not os.path.exists(archivo):
+        return {"resultados": {}}
+    with open(archivo, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar_con_base(resultados: dict, base: dict, tolerancia: float = TOLERANCIA_REGRESION) -> list:
+    """Imprime la comparación con la base y devuelve las claves con regresión"""
+    referencia = base.get("resultados", {})
+    regresiones = []
+
+    print("=" * 70)
+    print(f"Comparación con la base (tolerancia {tolerancia:.0%})")
+    print("=" * 70)
+    print(f"{'medición':<55} {'actual':>10} {'base':>10} {'ratio':>7}")
+    for clave, tiempo in resultados.items():
+        if clave not in referencia:
+            print(f"{clave:<55} {tiempo:>10.5f} {'-':>10} {'nuevo':>7}")
+            continue
+        anterior = referencia[clave]
+        ratio = tiempo / anterior if anterior > 0 else float("inf")
+        regresion = ratio > 1 + tolerancia and tiempo - anterior > MARGEN_ABSOLUTO
+        marca = "  REGRESIÓN" if regresion else ""
+        print(f"{clave:<55} {tiempo:>10.5f} {anterior:>10.5f} {ratio:>6.2f}x{marca}")
+        if regresion:
+            regresiones.append(clave)
+
+    if regresiones:
+        print(f"\n{len(regresiones)} regresión(es) respecto a la base")
+    else:
+        print("\nSin regresiones respecto a la base")
+    return regresiones
+
+
+def _lista_numeros(texto: str):
+    return tuple(int(float(x)) for x in texto.split(",") if x)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de los núcleos de cálculo")
+    sub = parser.add_subparsers(dest="comando")
+
+    suite = sub.add_parser("suite", help="Barrido de estados y registros sobre todos los núcleos")
+    suite.add_argument("--estados", type=_lista_numeros, default=ESTADOS_SUITE,
+                       help="Números de estados separados por comas (por defecto 3,...,5000)")
+    suite.add_argument("--registros", type=_lista_numeros, default=REGISTROS_SUITE,
+                       help="Números de registros separados por comas (por defecto 1e3,...,1e7)")
+    suite.add_argument("--nucleos", type=lambda t: t.split(","), default=None,
+                       help="Restringe la suite a estos núcleos (nombres separados por comas)")
+    suite.add_argument("--repeticiones", type=int, default=3)
+    suite.add_argument("--base", default=ARCHIVO_BASE, help="Archivo JSON con los tiempos de referencia")
+    suite.add_argument("--guardar", action="store_true", help="Guarda los resultados como nueva base")
+    suite.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESION)
+
+    estimacion = sub.add_parser("estimacion", help="Conteo vectorizado frente al bucle original")
+    estimacion.add_argument("tamanos", nargs="*", type=lambda x: int(float(x)))
+
+    # Sin subcomando se ejecuta la suite
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("suite", "estimacion", "-h", "--help"):
+        argv = ["suite"] + argv
+    args = parser.parse_args(argv)
+
+    if args.comando == "estimacion":
+        benchmark_estimacion(tuple(args.tamanos) or (10**5, 10**6, 10**7))
+        return 0
+
+    # Los tiempos dependen de la máquina: la base no se versiona y hay que generarla antes de comparar
+    if not args.guardar and not os.path.exists(args.base):
+        print(f"No existe la base de referencia {args.base}.", file=sys.stderr)
+        print("Créela en esta máquina con el mismo barrido y --guardar, por ejemplo:", file=sys.stderr)
+        print("    python benchmarks.py suite --estados 3,50,500 --registros 1e3,1e5 --guardar", file=sys.stderr)
+        return 2
+
+    resultados = ejecutar_suite(args.estados, args.registros, nucleos=args.nucleos,
+                                repeticiones=args.repeticiones)
+    regresiones = comparar_con_base(resultados, cargar_base(args.base), args.tolerancia)
+    if args.guardar:
+        guardar_base(resultados, args.base)
+    # Código de salida distinto de cero para poder usarlo como control en CI
+    return 1 if regresiones and not args.guardar else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,8 @@ Archivo de ejemplo con datos sintéticos para probar el sistema.
 Puedes usar estos datos directamente en la interfaz web o en las pruebas de la API.
 """
 
+import numpy as np
+
 # Ejemplo 1: Datos históricos de transiciones
 # Simula 1000 transiciones mensuales de clientes entre estados
 
@@ -72,6 +74,61 @@ def generar_json_ejemplo():
     }
 
 
+# Generadores sintéticos de cualquier tamaño (usados por benchmarks.py)
+def generar_estados(n_estados: int):
+    """Sano, Moroso_1 ... Moroso_k, Incobrable (n_estados >= 3)"""
+    if n_estados < 3:
+        raise ValueError("Se requieren al menos 3 estados")
+    if n_estados == 3:
+        return list(EJEMPLO_ESTADOS)
+    return ["Sano"] + [f"Moroso_{i}" for i in range(1, n_estados - 1)] + ["Incobrable"]
+
+
+def generar_matriz_sintetica(n_estados: int, semilla: int = 0, ancho_banda: int = 2):
+    """Matriz de crédito en banda: permanencia, deterioro / cura entre tramos vecinos y salto a Incobrable"""
+    rng = np.random.default_rng(semilla)
+    n = n_estados
+    matriz = np.zeros((n, n))
+    
+    for desplazamiento in range(-ancho_banda, ancho_banda + 1):
+        filas = np.arange(max(0, -desplazamiento), min(n - 1, n - desplazamiento))
+        peso = 8.0 if desplazamiento == 0 else 1.0 / abs(desplazamiento)
+        matriz[filas, filas + desplazamiento] = peso * (0.5 + rng.random(len(filas)))
+    
+    # Probabilidad de default creciente con el tramo de mora; Incobrable es absorbente
+    matriz[:-1, -1] += 0.02 + 0.5 * np.arange(n - 1) / max(n - 2, 1) * rng.random(n - 1)
+    matriz[-1] = 0.0
+    matriz[-1, -1] = 1.0
+    return matriz / matriz.sum(axis=1, keepdims=True)
+
+
+def generar_registros_sinteticos(n_registros: int, n_estados: int = 3, semilla: int = 0, como_lista: bool = True):
+    """Pares [origen, destino] muestreados de generar_matriz_sintetica"""
+    rng = np.random.default_rng(semilla)
+    matriz = generar_matriz_sintetica(n_estados, semilla)
+    
+    # Una única tabla acumulada creciente: fila i desplazada en +i, muestreo con searchsorted
+    tabla = (np.cumsum(matriz, axis=1) + np.arange(n_estados)[:, None]).ravel()
+    origen = rng.integers(0, n_estados, size=n_registros)
+    destino = np.searchsorted(tabla, origen + rng.random(n_registros), side="right") - origen * n_estados
+    destino = np.minimum(destino, n_estados - 1)
+    
+    etiquetas = np.array(generar_estados(n_estados), dtype=object)
+    if not como_lista:
+        return etiquetas[origen], etiquetas[destino]
+    return np.stack([etiquetas[origen], etiquetas[destino]], axis=1).tolist()
+
+
+def generar_exposiciones(estados, semilla: int = 0):
+    """EAD y LGD por estado con el mismo esquema que EJEMPLO_EAD / EJEMPLO_LGD"""
+    rng = np.random.default_rng(semilla)
+    ead = {estado: float(1000.0 + 4000.0 * rng.random()) for estado in estados}
+    lgd = {estado: float(0.1 + 0.4 * rng.random()) for estado in estados}
+    ead[estados[-1]] = 0.0
+    lgd[estados[0]] = 0.0
+    return ead, lgd
+
+
 if __name__ == "__main__":
     import json
     print("Ejemplo de datos para usar en la API:")
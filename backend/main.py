@@ -1,15 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
 import numpy as np
 import pandas as pd
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import BrokenExecutor
+from concurrent.futures import TimeoutError as TimeoutFuturo
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
 try:
     from scipy import linalg
+    from scipy.linalg import expm
+    from scipy.sparse import csr_matrix, coo_matrix, diags, identity, issparse, vstack
+    from scipy.sparse.csgraph import connected_components
+    from scipy.sparse.linalg import eigs, spsolve, splu
+    from scipy.special import ndtr
     SCIPY_AVAILABLE = True
 except ImportError:
     SCIPY_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 app = FastAPI(
     title="Markov Credit Risk API",
@@ -25,475 +62,4297 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+SECCIONES_MATRIZ = ("algebra", "markov", "clasificacion")
+# Las secciones de /matriz se calculan en paralelo; una sección que supera su tiempo máximo
+# (contado desde el inicio del análisis) se devuelve marcada como parcial
+WORKERS_SECCIONES = int(os.environ.get("MARKOV_SECCIONES_WORKERS", "0")) or len(SECCIONES_MATRIZ)
+TIMEOUT_SECCION_S = float(os.environ.get("MARKOV_TIMEOUT_SECCION_S", "60"))
+TIMEOUTS_SECCIONES = {
+    seccion: float(os.environ.get(f"MARKOV_TIMEOUT_{seccion.upper()}_S", TIMEOUT_SECCION_S))
+    for seccion in SECCIONES_MATRIZ
+}
+LIMITE_MATRIZ_COMUNICACION = 500
+
+METODOS_ESTACIONARIO = ("auto", "directo", "gth", "krylov", "potencia")
+LIMITE_DENSO_ESTACIONARIO = 2000
+DENSIDAD_DISPERSA = 0.1
+RESIDUO_MAXIMO_ESTACIONARIO = 1e-8
+PASO_AITKEN = 10
+
+# Caché de resultados: límite en memoria y directorio opcional para el nivel en disco
+CACHE_MAX_BYTES = int(os.environ.get("MARKOV_CACHE_MB", "256")) * 1024 * 1024
+CACHE_DIRECTORIO = os.environ.get("MARKOV_CACHE_DIR") or None
+# Nivel en disco: tamaño máximo (se eliminan los archivos de uso más antiguo) y antigüedad máxima (0 = sin límite)
+CACHE_DISCO_MAX_BYTES = int(os.environ.get("MARKOV_CACHE_DISCO_MB", "1024")) * 1024 * 1024
+CACHE_DISCO_TTL_S = float(os.environ.get("MARKOV_CACHE_DISCO_TTL_S", "0"))
+
+# Elementos máximos (escenarios x n x n) de cada bloque apilado en el stress por lotes
+ELEMENTOS_BLOQUE_STRESS = 20_000_000
+
+# Stress: "exacto" re-resuelve el estacionario; "sensibilidad" usa la inversa de grupo (primer orden)
+MODOS_STRESS = ("exacto", "sensibilidad")
+MAX_FACTORIZACIONES_GRUPO = 8
+
+# Pipeline: tipos de paso, parámetros admitidos por tipo e hilos por solicitud
+PARAMETROS_PASO_PIPELINE = {
+    "estimar": {"include", "persistir"},
+    "estacionario": {"metodo"},
+    "stress": {"factor_moroso", "factor_incobrable", "incluir_matriz"},
+    "perdidas": {"ead", "lgd", "horizonte", "tasa_descuento"}
+}
+WORKERS_PIPELINE = int(os.environ.get("MARKOV_PIPELINE_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Simulación Monte Carlo: procesos por defecto y niveles de VaR / ES reportados
+WORKERS_SIMULACION = int(os.environ.get("MARKOV_SIM_WORKERS", os.cpu_count() or 1))
+# Cota de validación del campo workers de las solicitudes; el valor efectivo se limita además
+# a la configuración del servidor y al número de CPUs (limitar_workers)
+MAX_WORKERS_SOLICITUD = 64
+NIVELES_CUANTIL = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+# Almacén de modelos: directorio compartido por todos los workers (arrays .npy mapeados en memoria)
+MODELOS_DIRECTORIO = os.environ.get("MARKOV_MODELOS_DIR") or os.path.join(tempfile.gettempdir(), "markov_modelos")
+# Retención: máximo de modelos guardados (se eliminan los de uso más antiguo) y antigüedad máxima (0 = sin límite)
+MODELOS_MAX = int(os.environ.get("MARKOV_MODELOS_MAX", "100"))
+MODELOS_TTL_S = float(os.environ.get("MARKOV_MODELOS_TTL_S", "0"))
+
+# Sesiones de estimación incremental (en memoria del proceso): máximo abiertas e inactividad máxima (0 = sin límite)
+SESIONES_MAX = int(os.environ.get("MARKOV_SESIONES_MAX", "1000"))
+SESIONES_TTL_S = float(os.environ.get("MARKOV_SESIONES_TTL_S", "3600"))
+
+# Entrada binaria / columnar y codificación de respuestas
+FORMATOS_ARCHIVO = ("csv", "npy", "npz", "parquet", "arrow")
+FORMATOS_RESPUESTA = ("json", "rapido", "npz")
+TAMANO_BLOQUE_ARCHIVO = 1_000_000
+MIN_ELEMENTOS_BINARIO = 64
+
+# Pool de cálculo para los endpoints pesados: tipo ("hilos" o "procesos"), workers,
+# solicitudes en espera admitidas antes de responder 503 y timeout por solicitud (segundos)
+TIPOS_POOL = ("hilos", "procesos")
+TIPO_POOL = os.environ.get("MARKOV_POOL", "hilos")
+WORKERS_POOL = int(os.environ.get("MARKOV_POOL_WORKERS", os.cpu_count() or 1))
+COLA_POOL = int(os.environ.get("MARKOV_POOL_COLA", 2 * WORKERS_POOL))
+TIMEOUT_SOLICITUD = float(os.environ.get("MARKOV_TIMEOUT_S", "120"))
+# Los cuerpos JSON se validan en el event loop: por encima de este tamaño se responde 413 (0 = sin límite)
+MAX_CUERPO_JSON_BYTES = int(float(os.environ.get("MARKOV_MAX_JSON_MB", "64")) * 1024 * 1024)
+
+# Tiempo continuo: métodos para P(t) = expm(Qt) y condición máxima de la base de autovectores
+METODOS_EXPONENCIAL = ("auto", "autovalores", "expm")
+CONDICION_MAXIMA_AUTOVECTORES = 1e8
+TOLERANCIA_GENERADOR = 1e-8
+
+# Potencias T^h: métodos disponibles y horizontes por defecto de propiedades_algebra
+METODOS_POTENCIA = ("auto", "autovalores", "cadena")
+HORIZONTES_ALGEBRA = (2, 3, 5, 10)
+MAX_HORIZONTE_POTENCIA = 100_000
+# En "auto" se diagonaliza solo si la cadena de productos costaría más que la descomposición
+# (~COSTO_RELATIVO_EIG n^3) más la reconstrucción de cada horizonte
+COSTO_RELATIVO_EIG = 25
+
+# Bootstrap de la matriz estimada: réplicas por bloque (una semilla por bloque, así el
+# resultado no depende del número de workers) y elementos máximos (réplicas x n x n)
+# para devolver intervalos por celda de la matriz
+METODOS_BOOTSTRAP = ("multinomial", "dirichlet")
+REPLICAS_POR_BLOQUE = 500
+ELEMENTOS_INTERVALOS_MATRIZ = 50_000_000
+
+# Métricas: cubetas de los histogramas de latencia (segundos) y de tamaño de entrada
+CUBETAS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+CUBETAS_TAMANO = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Modo disperso: por debajo de N_MINIMO_DISPERSO estados siempre se usa la matriz densa
+N_MINIMO_DISPERSO = 500
+LIMITE_DENSO_ALGEBRA = 2000
+
+
 class TransicionRequest(BaseModel):
     registros: List[List[str]]
+    include: Optional[List[str]] = None
+    persistir: bool = False
 
 
-class StressRequest(BaseModel):
-    matriz_base: List[List[float]]
+class ModeloRequest(BaseModel):
+    """Registros [origen, destino] o una matriz de conteo ya agregada para guardar como modelo"""
+    registros: Optional[List[List[str]]] = None
+    estados: Optional[List[str]] = None
+    matriz_conteo: Optional[List[List[float]]] = None
+
+
+class ConteoParcial(BaseModel):
     estados: List[str]
+    matriz_conteo: List[List[int]]
+
+
+class MatrizDispersa(BaseModel):
+    """Matriz n x n en tripletes COO; los duplicados se suman"""
+    n: int
+    filas: List[int]
+    columnas: List[int]
+    valores: List[float]
+
+
+class EscenarioStress(BaseModel):
+    factor_moroso: float = 1.2
+    factor_incobrable: float = 1.3
+
+
+class GrillaStress(BaseModel):
+    """Producto cartesiano de factores"""
+    factores_moroso: List[float]
+    factores_incobrable: List[float]
+
+
+class SimulacionRequest(BaseModel):
+    matriz_transicion: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
+    estado: List[int]
+    ead: List[float]
+    lgd: List[float]
+    pasos: int = 12
+    simulaciones: int = 1000
+    semilla: Optional[int] = None
+    correlacion: float = 0.0
+    workers: Optional[int] = Field(None, ge=1, le=MAX_WORKERS_SOLICITUD)
+    stream: bool = False
+
+
+class StressRequest(BaseModel):
+    matriz_base: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
     factor_moroso: Optional[float] = 1.2
     factor_incobrable: Optional[float] = 1.3
+    escenarios: Optional[List[EscenarioStress]] = None
+    grilla: Optional[GrillaStress] = None
+    incluir_matrices: bool = False
+    modo: str = "exacto"
+    # Solo en modo sensibilidad: EL por estado y derivadas de pi respecto a celdas [i, j] concretas
+    ead: Optional[Dict[str, float]] = None
+    lgd: Optional[Dict[str, float]] = None
+    celdas: Optional[List[List[Union[int, str]]]] = None
+
+
+class PasoPipeline(BaseModel):
+    """Paso declarativo: tipo, matriz de entrada ("base" o el id de un paso de stress) y parámetros"""
+    id: str
+    tipo: str
+    entrada: str = "base"
+    parametros: Dict = {}
+
+
+class PipelineRequest(BaseModel):
+    """Matriz base (registros, model_id o matriz + estados) y pasos que se ejecutan sobre ella"""
+    registros: Optional[List[List[str]]] = None
+    matriz_transicion: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
+    pasos: List[PasoPipeline]
+    workers: Optional[int] = Field(None, ge=1, le=MAX_WORKERS_SOLICITUD)
+    stream: bool = True
 
 
 class PerdidasRequest(BaseModel):
-    matriz_transicion: List[List[float]]
-    estados: List[str]
+    matriz_transicion: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
     ead: Dict[str, float]
     lgd: Dict[str, float]
+    horizonte: Optional[int] = None
+    tasa_descuento: float = 0.0
 
 
-def estimar_matriz_transicion(registros: List[List[str]]) -> Dict:
-    if not registros or len(registros[0]) != 2:
-        raise ValueError("Los registros deben ser pares [origen, destino]")
-    
-    estados = sorted(set([item for sublist in registros for item in sublist]))
-    n_estados = len(estados)
-    
-    estado_idx = {estado: i for i, estado in enumerate(estados)}
+class ProductoPeriodos(BaseModel):
+    """Producto T_desde · ... · T_hasta de las matrices por periodo (extremos incluidos)"""
+    desde: Optional[Union[int, str]] = None
+    hasta: Optional[Union[int, str]] = None
+    acumulados: bool = False
+
+
+class PanelRequest(BaseModel):
+    """Panel longitudinal en columnas: una observación (préstamo, periodo, estado) por posición"""
+    prestamo: List[str]
+    periodo: List[Union[int, str]]
+    estado: List[str]
+    solo_contiguos: bool = True
+    include: Optional[List[str]] = None
+    producto: Optional[ProductoPeriodos] = None
+
+
+class GeneradorRequest(BaseModel):
+    """Observaciones con marca de tiempo (préstamo, tiempo, estado) de trayectorias en tiempo continuo"""
+    prestamo: List[str]
+    tiempo: List[float]
+    estado: List[str]
+    horizontes: Optional[List[float]] = None
+    metodo: str = "auto"
+
+
+class TransicionContinuaRequest(BaseModel):
+    """P(t) = expm(Qt) de un generador ya estimado y análisis opcionales sobre cada P(t)"""
+    generador: List[List[float]]
+    estados: List[str]
+    horizontes: List[float]
+    metodo: str = "auto"
+    incluir_estacionario: bool = False
+    ead: Optional[Dict[str, float]] = None
+    lgd: Optional[Dict[str, float]] = None
+    factor_moroso: Optional[float] = None
+    factor_incobrable: Optional[float] = None
+
+
+class BootstrapRequest(BaseModel):
+    """Registros [origen, destino], una matriz de conteo ya agregada o el model_id de una estimación"""
+    registros: Optional[List[List[str]]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
+    matriz_conteo: Optional[List[List[float]]] = None
+    replicas: int = 5000
+    metodo: str = "multinomial"
+    nivel: float = 0.95
+    concentracion_previa: float = 0.0
+    horizonte: Optional[int] = None
+    semilla: Optional[int] = None
+    workers: Optional[int] = Field(None, ge=1, le=MAX_WORKERS_SOLICITUD)
+
+
+class SegmentosRequest(BaseModel):
+    """Registros [origen, destino] con una clave de segmento por registro"""
+    registros: List[List[str]]
+    segmento: List[str]
+    minimo_observaciones: int = 0
+    incluir_conteos: bool = False
+
+
+class PotenciasRequest(BaseModel):
+    """T^h para cada horizonte, opcionalmente restringido a filas / columnas (índices o nombres de estado)"""
+    matriz_transicion: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    horizontes: List[int]
+    estados: Optional[List[str]] = None
+    filas: Optional[List[Union[int, str]]] = None
+    columnas: Optional[List[Union[int, str]]] = None
+    metodo: str = "auto"
+
+
+class CarteraRequest(BaseModel):
+    """Columnas por préstamo: código de estado (índice en estados), EAD, LGD y segmento opcional"""
+    matriz_transicion: Optional[Union[List[List[float]], MatrizDispersa]] = None
+    model_id: Optional[str] = None
+    estados: Optional[List[str]] = None
+    estado: List[int]
+    ead: List[float]
+    lgd: List[float]
+    segmento: Optional[List[str]] = None
+    horizonte: Optional[int] = None
+    incluir_prestamos: bool = False
+
+
+def es_dispersa(matriz) -> bool:
+    return SCIPY_AVAILABLE and issparse(matriz)
+
+
+def preparar_matriz(matriz) -> Union[np.ndarray, "csr_matrix"]:
+    """Elige representación densa o CSR según el tamaño y la densidad de la matriz"""
+    if es_dispersa(matriz):
+        matriz = matriz.tocsr()
+        n = matriz.shape[0]
+        densidad = matriz.nnz / max(n * n, 1)
+    else:
+        matriz = np.asarray(matriz, dtype=float)
+        n = matriz.shape[0] if matriz.ndim == 2 else 0
+        if not SCIPY_AVAILABLE or n < N_MINIMO_DISPERSO:
+            return matriz
+        densidad = np.count_nonzero(matriz) / (n * n)
     
-    matriz_conteo = np.zeros((n_estados, n_estados))
+    if n >= N_MINIMO_DISPERSO and densidad < DENSIDAD_DISPERSA:
+        return matriz if es_dispersa(matriz) else csr_matrix(matriz)
+    return matriz.toarray() if es_dispersa(matriz) else matriz
+
+
+def leer_matriz(datos) -> Union[np.ndarray, "csr_matrix"]:
+    """Convierte el formato de entrada (listas anidadas o tripletes COO) a la representación de cálculo"""
+    if isinstance(datos, MatrizDispersa):
+        datos = datos.model_dump()
     
-    for origen, destino in registros:
-        i = estado_idx[origen]
-        j = estado_idx[destino]
-        matriz_conteo[i, j] += 1
+    if isinstance(datos, dict):
+        n = int(datos["n"])
+        filas = np.asarray(datos["filas"], dtype=np.int64)
+        columnas = np.asarray(datos["columnas"], dtype=np.int64)
+        valores = np.asarray(datos["valores"], dtype=float)
+        if not (len(filas) == len(columnas) == len(valores)):
+            raise ValueError("filas, columnas y valores deben tener la misma longitud")
+        if len(filas) and (min(filas.min(), columnas.min()) < 0 or max(filas.max(), columnas.max()) >= n):
+            raise ValueError("Índices fuera de rango en la matriz dispersa")
+        
+        if not SCIPY_AVAILABLE:
+            matriz = np.zeros((n, n))
+            np.add.at(matriz, (filas, columnas), valores)
+            return matriz
+        return preparar_matriz(coo_matrix((valores, (filas, columnas)), shape=(n, n)).tocsr())
     
-    matriz_transicion = np.zeros((n_estados, n_estados))
-    for i in range(n_estados):
-        total_fila = matriz_conteo[i].sum()
-        if total_fila > 0:
-            matriz_transicion[i] = matriz_conteo[i] / total_fila
+    matriz = np.array(datos, dtype=float)
+    if matriz.ndim != 2 or matriz.shape[0] != matriz.shape[1]:
+        raise ValueError("La matriz de transición debe ser cuadrada")
+    return preparar_matriz(matriz)
+
+
+def matriz_a_json(matriz) -> Union[List[List[float]], Dict]:
+    """Listas anidadas para matrices densas, tripletes COO para matrices dispersas"""
+    if es_dispersa(matriz):
+        coo = matriz.tocoo()
+        return {
+            "n": int(matriz.shape[0]),
+            "filas": coo.row.tolist(),
+            "columnas": coo.col.tolist(),
+            "valores": coo.data.tolist()
+        }
+    return matriz.tolist()
+
+
+def a_densa(matriz) -> np.ndarray:
+    return matriz.toarray() if es_dispersa(matriz) else np.asarray(matriz, dtype=float)
+
+
+def sumar_filas(matriz) -> np.ndarray:
+    return np.asarray(matriz.sum(axis=1)).ravel()
+
+
+def columna(matriz, j: int) -> np.ndarray:
+    if es_dispersa(matriz):
+        return matriz[:, [j]].toarray().ravel()
+    return np.asarray(matriz)[:, j]
+
+
+def huella_contenido(*partes) -> str:
+    """Hash canónico de matrices (densas o CSR), listas de estados y parámetros"""
+    h = hashlib.blake2b(digest_size=20)
+    for parte in partes:
+        if es_dispersa(parte):
+            csr = parte.tocsr(copy=True)
+            csr.sum_duplicates()
+            csr.sort_indices()
+            h.update(b"csr" + np.asarray(csr.shape, dtype=np.int64).tobytes())
+            h.update(np.ascontiguousarray(csr.data, dtype=np.float64).tobytes())
+            h.update(np.ascontiguousarray(csr.indices, dtype=np.int64).tobytes())
+            h.update(np.ascontiguousarray(csr.indptr, dtype=np.int64).tobytes())
+        elif isinstance(parte, np.ndarray):
+            arreglo = np.ascontiguousarray(parte)
+            h.update(f"nd{arreglo.dtype.str}{arreglo.shape}".encode())
+            h.update(arreglo.tobytes())
         else:
-            matriz_transicion[i, i] = 1.0
+            h.update(json.dumps(parte, sort_keys=True, default=str).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def _desarmar_resultado(valor, arreglos: Dict[str, np.ndarray]):
+    """Estructura JSON + arrays numéricos de un resultado, para guardarlo en disco sin pickle"""
+    if isinstance(valor, dict):
+        if not all(isinstance(k, str) for k in valor):
+            raise TypeError("Solo se guardan en disco diccionarios con claves de texto")
+        return {"d": {k: _desarmar_resultado(v, arreglos) for k, v in valor.items()}}
+    if isinstance(valor, (list, tuple)):
+        return {"l" if isinstance(valor, list) else "t": [_desarmar_resultado(v, arreglos) for v in valor]}
+    if es_dispersa(valor):
+        csr = valor.tocsr()
+        partes = []
+        for parte in (csr.data, csr.indices, csr.indptr):
+            partes.append(f"a{len(arreglos)}")
+            arreglos[partes[-1]] = parte
+        return {"csr": partes, "forma": list(csr.shape)}
+    if isinstance(valor, np.ndarray):
+        if valor.dtype.kind not in "biufc":
+            raise TypeError(f"Tipo de array no admitido en disco: {valor.dtype}")
+        nombre = f"a{len(arreglos)}"
+        arreglos[nombre] = valor
+        return {"a": nombre}
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, complex):
+        return {"c": [valor.real, valor.imag]}
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return {"v": valor}
+    raise TypeError(f"Tipo no admitido en la caché en disco: {type(valor).__name__}")
+
+
+def _armar_resultado(nodo, arreglos) -> object:
+    if "d" in nodo:
+        return {k: _armar_resultado(v, arreglos) for k, v in nodo["d"].items()}
+    if "l" in nodo:
+        return [_armar_resultado(v, arreglos) for v in nodo["l"]]
+    if "t" in nodo:
+        return tuple(_armar_resultado(v, arreglos) for v in nodo["t"])
+    if "csr" in nodo:
+        return csr_matrix(tuple(arreglos[p] for p in nodo["csr"]), shape=tuple(nodo["forma"]))
+    if "a" in nodo:
+        return arreglos[nodo["a"]]
+    if "c" in nodo:
+        return complex(*nodo["c"])
+    return nodo["v"]
+
+
+class CacheResultados:
+    """Caché LRU direccionada por contenido, acotada en bytes, con nivel opcional en disco
     
-    estadisticas = {
-        "total_transiciones": len(registros),
-        "conteo_por_estado": {
-            estado: int(matriz_conteo[estado_idx[estado]].sum())
-            for estado in estados
-        }
-    }
+    El nivel en disco guarda .npz sin pickle (np.load con allow_pickle=False): quien pueda
+    escribir en el directorio no puede ejecutar código en el servidor. Está acotado en bytes
+    (LRU por fecha de modificación, que se renueva en cada acierto) y opcionalmente por antigüedad.
+    """
     
-    # Calcular propiedades de álgebra lineal
-    try:
-        propiedades_algebra = calcular_propiedades_algebra_lineal(matriz_transicion)
-    except Exception as e:
-        print(f"Error calculando propiedades de álgebra: {e}")
-        propiedades_algebra = {"error": str(e)}
+    def __init__(
+        self,
+        max_bytes: int,
+        directorio: Optional[str] = None,
+        max_bytes_disco: int = CACHE_DISCO_MAX_BYTES,
+        ttl_disco: float = CACHE_DISCO_TTL_S
+    ):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl_disco = ttl_disco
+        self.entradas: "OrderedDict[str, bytes]" = OrderedDict()
+        self.bytes = 0
+        self.bytes_disco = 0
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.desalojos_disco = 0
+        self.lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._podar_disco()
     
-    # Análisis de propiedades de Markov
-    try:
-        propiedades_markov = analizar_propiedades_markov(matriz_transicion, estados)
-    except Exception as e:
-        print(f"Error analizando propiedades de Markov: {e}")
-        propiedades_markov = {"error": str(e)}
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.npz")
     
-    # Clasificación de estados
-    try:
-        clasificacion_estados = clasificar_estados(matriz_transicion, estados)
-    except Exception as e:
-        print(f"Error clasificando estados: {e}")
-        clasificacion_estados = {"error": str(e)}
+    def _podar_disco(self) -> None:
+        """Elimina los archivos vencidos y, si se supera el límite, los de uso más antiguo"""
+        archivos = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.endswith(".npz"):
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+        archivos.sort()
+        total = sum(tamano for _, tamano, _ in archivos)
+        limite = time.time() - self.ttl_disco if self.ttl_disco > 0 else None
+        for mtime, tamano, ruta in archivos:
+            vencido = limite is not None and mtime < limite
+            if not vencido and (self.max_bytes_disco <= 0 or total <= self.max_bytes_disco):
+                break
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+            with self.lock:
+                self.desalojos_disco += 1
+        with self.lock:
+            self.bytes_disco = total
     
-    return {
-        "estados": estados,
-        "matriz_transicion": matriz_transicion.tolist(),
-        "matriz_conteo": matriz_conteo.astype(int).tolist(),
-        "estadisticas": estadisticas,
-        "propiedades_algebra": propiedades_algebra,
-        "propiedades_markov": propiedades_markov,
-        "clasificacion_estados": clasificacion_estados
-    }
-
-
-def calcular_vector_estacionario(matriz_transicion: np.ndarray, tolerancia: float = 1e-10, max_iter: int = 1000) -> Dict:
-    T = np.array(matriz_transicion)
-    n = T.shape[0]
+    def _leer_disco(self, clave: str) -> Optional[Dict]:
+        ruta = self._ruta(clave)
+        try:
+            if self.ttl_disco > 0 and os.path.getmtime(ruta) < time.time() - self.ttl_disco:
+                os.remove(ruta)
+                return None
+            with np.load(ruta, allow_pickle=False) as npz:
+                arreglos = {nombre: npz[nombre] for nombre in npz.files}
+            estructura = json.loads(arreglos.pop("__estructura__").tobytes().decode("utf-8"))
+            resultado = _armar_resultado(estructura, arreglos)
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error leyendo caché en disco: {e}")
+            return None
+        return resultado
     
-    pi_actual = np.ones(n) / n
+    def _escribir_disco(self, clave: str, resultado: Dict) -> None:
+        temporal = f"{self._ruta(clave)}.{uuid.uuid4().hex}.tmp"
+        try:
+            arreglos: Dict[str, np.ndarray] = {}
+            estructura = json.dumps(_desarmar_resultado(resultado, arreglos), separators=(",", ":"))
+            arreglos["__estructura__"] = np.frombuffer(estructura.encode("utf-8"), dtype=np.uint8)
+            with open(temporal, "wb") as f:
+                np.savez(f, **arreglos)
+            tamano = os.path.getsize(temporal)
+            if self.max_bytes_disco > 0 and tamano > self.max_bytes_disco:
+                os.remove(temporal)
+                return
+            os.replace(temporal, self._ruta(clave))
+        except Exception as e:
+            print(f"Error escribiendo caché en disco: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        with self.lock:
+            self.bytes_disco += tamano
+            podar = self.max_bytes_disco > 0 and self.bytes_disco > self.max_bytes_disco
+        if podar:
+            self._podar_disco()
     
-    for iteracion in range(max_iter):
-        pi_siguiente = pi_actual @ T
+    def _guardar_memoria(self, clave: str, datos: bytes) -> None:
+        if len(datos) > self.max_bytes:
+            return
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior)
+            self.entradas[clave] = datos
+            self.bytes += len(datos)
+            while self.bytes > self.max_bytes:
+                _, desalojado = self.entradas.popitem(last=False)
+                self.bytes -= len(desalojado)
+                self.desalojos += 1
+    
+    def obtener(self, clave: str) -> Optional[Dict]:
+        # Se guardan bytes serializados: cada acierto devuelve una copia independiente
+        with self.lock:
+            datos = self.entradas.get(clave)
+            if datos is not None:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return pickle.loads(datos)
         
-        if np.linalg.norm(pi_siguiente - pi_actual) < tolerancia:
-            return {
-                "vector_estacionario": pi_siguiente.tolist(),
-                "iteraciones": iteracion + 1,
-                "convergio": True
-            }
+        if self.directorio:
+            resultado = self._leer_disco(clave)
+            if resultado is not None:
+                with self.lock:
+                    self.aciertos_disco += 1
+                self._guardar_memoria(clave, pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL))
+                return resultado
         
-        pi_actual = pi_siguiente
+        with self.lock:
+            self.fallos += 1
+        return None
     
-    eigenvalores, eigenvectores = np.linalg.eig(T.T)
-    idx = np.argmax(np.real(eigenvalores))
-    pi_eigen = np.real(eigenvectores[:, idx])
-    pi_eigen = pi_eigen / pi_eigen.sum()
+    def guardar(self, clave: str, resultado: Dict) -> None:
+        # El nivel en memoria usa pickle: los bytes nunca salen del proceso
+        datos = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+        self._guardar_memoria(clave, datos)
+        if self.directorio:
+            self._escribir_disco(clave, resultado)
     
-    return {
-        "vector_estacionario": pi_eigen.tolist(),
-        "iteraciones": max_iter,
-        "convergio": False,
-        "metodo": "autovectores"
-    }
+    def obtener_o_calcular(self, clave: str, calcular: Callable[[], Dict]) -> Dict:
+        resultado = self.obtener(clave)
+        if resultado is None:
+            resultado = calcular()
+            self.guardar(clave, resultado)
+        return resultado
+    
+    def estadisticas(self) -> Dict:
+        with self.lock:
+            consultas = self.aciertos + self.aciertos_disco + self.fallos
+            return {
+                "entradas": len(self.entradas),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": (self.aciertos + self.aciertos_disco) / consultas if consultas else 0.0,
+                "directorio": self.directorio,
+                "bytes_disco": self.bytes_disco,
+                "max_bytes_disco": self.max_bytes_disco,
+                "ttl_disco_s": self.ttl_disco,
+                "desalojos_disco": self.desalojos_disco
+            }
+    
+    def limpiar(self) -> None:
+        """Vacía la memoria y, si hay nivel en disco, sus archivos"""
+        with self.lock:
+            self.entradas.clear()
+            self.bytes = 0
+        if self.directorio:
+            for entrada in os.scandir(self.directorio):
+                if entrada.name.endswith(".npz"):
+                    try:
+                        os.remove(entrada.path)
+                    except FileNotFoundError:
+                        pass
+            with self.lock:
+                self.bytes_disco = 0
 
 
-def calcular_perdidas_esperadas(
-    matriz_transicion: List[List[float]],
-    estados: List[str],
-    ead: Dict[str, float],
-    lgd: Dict[str, float]
-) -> Dict:
-    T = np.array(matriz_transicion)
-    n = len(estados)
+CACHE = CacheResultados(CACHE_MAX_BYTES, CACHE_DIRECTORIO)
+
+
+class Traza:
+    """Duración acumulada por etapa y tamaños de entrada de una solicitud"""
     
-    estado_default = None
-    for estado in ["Incobrable", "Default", "Perdida"]:
-        if estado in estados:
-            estado_default = estado
-            break
+    def __init__(self):
+        self.etapas: Dict[str, float] = {}
+        self.tamanos: Dict[str, int] = {}
     
-    if estado_default is None:
-        estado_default = estados[-1]
+    def sumar(self, etapa: str, segundos: float) -> None:
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
     
-    idx_default = estados.index(estado_default)
+    def combinar(self, otra: "Traza") -> None:
+        for etapa, segundos in otra.etapas.items():
+            self.sumar(etapa, segundos)
+        for dimension, valor in otra.tamanos.items():
+            self.tamanos[dimension] = max(self.tamanos.get(dimension, 0), valor)
+
+
+# Traza de la solicitud en curso; None fuera de una solicitud (p. ej. en benchmarks.py)
+TRAZA: ContextVar[Optional[Traza]] = ContextVar("traza", default=None)
+
+
+@contextmanager
+def etapa(nombre: str):
+    """Mide un bloque y lo suma a la traza de la solicitud en curso"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza = TRAZA.get()
+        if traza is not None:
+            traza.sumar(nombre, time.perf_counter() - inicio)
+
+
+def registrar_tamano(dimension: str, valor: int) -> None:
+    traza = TRAZA.get()
+    if traza is not None:
+        traza.tamanos[dimension] = max(traza.tamanos.get(dimension, 0), int(valor))
+
+
+class Metricas:
+    """Histogramas acumulados en memoria, exportados en formato de texto de Prometheus"""
     
-    pd_por_estado = {}
-    for i, estado in enumerate(estados):
-        pd_por_estado[estado] = float(T[i, idx_default])
+    def __init__(self):
+        # nombre -> (ayuda, cubetas, {etiquetas: [conteos por cubeta, suma, total]})
+        self.histogramas: Dict[str, Tuple[str, Tuple[float, ...], Dict]] = {}
+        self.lock = threading.Lock()
     
-    perdidas_por_estado = {}
-    for estado in estados:
-        ead_valor = ead.get(estado, 0.0)
-        lgd_valor = lgd.get(estado, 0.0)
-        pd_valor = pd_por_estado[estado]
-        
-        perdidas_por_estado[estado] = {
-            "EAD": ead_valor,
-            "PD": pd_valor,
-            "LGD": lgd_valor,
-            "EL": ead_valor * pd_valor * lgd_valor
-        }
+    def definir(self, nombre: str, ayuda: str, cubetas: Tuple[float, ...]) -> None:
+        self.histogramas[nombre] = (ayuda, cubetas, {})
     
-    perdida_total = sum([p["EL"] for p in perdidas_por_estado.values()])
+    def observar(self, nombre: str, valor: float, **etiquetas) -> None:
+        _, cubetas, series = self.histogramas[nombre]
+        clave = tuple(sorted(etiquetas.items()))
+        with self.lock:
+            serie = series.get(clave)
+            if serie is None:
+                serie = series[clave] = [[0] * len(cubetas), 0.0, 0]
+            for i, limite in enumerate(cubetas):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
     
-    return {
-        "perdidas_por_estado": perdidas_por_estado,
-        "perdida_total": perdida_total,
-        "estado_default": estado_default
-    }
+    def registrar_solicitud(self, endpoint: str, metodo: str, codigo: int, segundos: float, traza: Traza) -> None:
+        self.observar("markov_solicitud_segundos", segundos, endpoint=endpoint, metodo=metodo, codigo=str(codigo))
+        for nombre, duracion in traza.etapas.items():
+            self.observar("markov_etapa_segundos", duracion, endpoint=endpoint, etapa=nombre)
+        for dimension, valor in traza.tamanos.items():
+            self.observar("markov_tamano_entrada", valor, endpoint=endpoint, dimension=dimension)
+    
+    def exportar(self) -> str:
+        lineas = []
+        with self.lock:
+            for nombre, (ayuda, cubetas, series) in self.histogramas.items():
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for clave, (conteos, suma, total) in series.items():
+                    etiquetas = ",".join(f'{k}="{v}"' for k, v in clave)
+                    for limite, conteo in zip(cubetas, conteos):
+                        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite:g}"}} {conteo}')
+                    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {total}')
+                    lineas.append(f"{nombre}_sum{{{etiquetas}}} {suma:.6f}")
+                    lineas.append(f"{nombre}_count{{{etiquetas}}} {total}")
+        return "\n".join(lineas) + "\n"
 
 
-def calcular_propiedades_algebra_lineal(matriz: np.ndarray) -> Dict:
-    """Calcula propiedades de álgebra lineal de la matriz de transición"""
-    T = np.array(matriz)
-    n = T.shape[0]
+def exportar_contadores(prefijo: str, valores: Dict, contadores: Tuple[str, ...], indicadores: Tuple[str, ...]) -> str:
+    """Contadores y gauges de un diccionario de estadísticas (caché, pool) en formato Prometheus"""
+    lineas = []
+    for tipo, claves in (("counter", contadores), ("gauge", indicadores)):
+        for clave in claves:
+            sufijo = "_total" if tipo == "counter" else ""
+            lineas.append(f"# TYPE {prefijo}_{clave}{sufijo} {tipo}")
+            lineas.append(f"{prefijo}_{clave}{sufijo} {float(valores[clave]):g}")
+    return "\n".join(lineas) + "\n"
+
+
+def server_timing(traza: Traza, total: float, nombre_total: str = "total") -> str:
+    """Cabecera Server-Timing con cada etapa y el total, en milisegundos"""
+    partes = [f"{nombre};dur={segundos * 1000:.2f}" for nombre, segundos in traza.etapas.items()]
+    partes.append(f"{nombre_total};dur={total * 1000:.2f}")
+    return ", ".join(partes)
+
+
+class ModeloNoEncontrado(LookupError):
+    """model_id sin modelo en el almacén; excepción simple para que cruce el pool de procesos (404)"""
+
+
+class AlmacenModelos:
+    """Modelos estimados en disco: conteo, matriz y artefactos derivados como .npy de solo lectura"""
     
-    propiedades = {}
+    def __init__(self, directorio: str, max_modelos: int = MODELOS_MAX, ttl: float = MODELOS_TTL_S):
+        self.directorio = directorio
+        self.max_modelos = max_modelos
+        self.ttl = ttl
+        self.abiertos: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
     
-    # Determinante
-    try:
-        propiedades["determinante"] = float(np.linalg.det(T))
-    except:
-        propiedades["determinante"] = None
+    def _ruta(self, model_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", model_id or ""):
+            raise ValueError(f"model_id inválido: {model_id}")
+        return os.path.join(self.directorio, model_id)
     
-    # Traza
-    propiedades["traza"] = float(np.trace(T))
+    @staticmethod
+    def _guardar_matriz(ruta: str, nombre: str, matriz) -> str:
+        if es_dispersa(matriz):
+            csr = matriz.tocsr()
+            for parte in ("data", "indices", "indptr"):
+                np.save(os.path.join(ruta, f"{nombre}.{parte}.npy"), getattr(csr, parte))
+            return "disperso"
+        np.save(os.path.join(ruta, f"{nombre}.npy"), np.ascontiguousarray(matriz))
+        return "denso"
     
-    # Valores propios (eigenvalues) y vectores propios (eigenvectors)
-    try:
-        eigenvalores, eigenvectores = np.linalg.eig(T)
-        # Ordenar por valor absoluto descendente
-        idx = np.argsort(np.abs(eigenvalores))[::-1]
-        eigenvalores = eigenvalores[idx]
-        eigenvectores = eigenvectores[:, idx]
+    @staticmethod
+    def _cargar_matriz(ruta: str, nombre: str, formato: str, n: int):
+        # mmap_mode="r": las páginas se comparten entre procesos a través de la caché del sistema
+        if formato == "disperso":
+            partes = [np.load(os.path.join(ruta, f"{nombre}.{p}.npy"), mmap_mode="r") for p in ("data", "indices", "indptr")]
+            return csr_matrix(tuple(partes), shape=(n, n), copy=False)
+        return np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode="r")
+    
+    def registrar(self, estados: List[str], matriz_conteo) -> str:
+        """Guarda el modelo (si no existe) y devuelve su id, derivado del contenido"""
+        # Huella sobre una representación canónica: el mismo conteo en int, float, denso o CSR da el mismo id
+        canonico = csr_matrix(matriz_conteo, dtype=np.float64) if SCIPY_AVAILABLE else np.asarray(matriz_conteo, dtype=np.float64)
+        model_id = huella_contenido("modelo", canonico, estados)[:32]
+        ruta = self._ruta(model_id)
+        if os.path.isdir(ruta):
+            self._tocar(ruta)
+            return model_id
         
-        propiedades["eigenvalores"] = {
-            "valores": eigenvalores.tolist(),
-            "valores_reales": np.real(eigenvalores).tolist(),
-            "valores_imaginarios": np.imag(eigenvalores).tolist(),
-            "modulos": np.abs(eigenvalores).tolist(),
-            "dominante": float(eigenvalores[0]) if len(eigenvalores) > 0 else None
-        }
+        matriz = preparar_matriz(normalizar_conteos(matriz_conteo))
+        # El conteo se guarda con la misma representación que la matriz
+        matriz_conteo = csr_matrix(matriz_conteo) if es_dispersa(matriz) else a_densa(matriz_conteo)
+        estacionario = vector_estacionario_cacheado(matriz)
+        idx_default = estados.index(identificar_estado_default(estados))
         
-        propiedades["eigenvectores"] = {
-            "vectores": np.real(eigenvectores).tolist(),
-            "vector_dominante": np.real(eigenvectores[:, 0]).tolist() if eigenvectores.shape[1] > 0 else None
-        }
-    except Exception as e:
-        propiedades["eigenvalores"] = {"error": str(e)}
-        propiedades["eigenvectores"] = {"error": str(e)}
-    
-    # Rango
-    try:
-        propiedades["rango"] = int(np.linalg.matrix_rank(T))
-    except:
-        propiedades["rango"] = None
+        # Escritura en un directorio temporal y rename atómico: otro worker nunca ve un modelo a medias
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = tempfile.mkdtemp(prefix=f".{model_id}-", dir=self.directorio)
+        try:
+            formato = self._guardar_matriz(temporal, "matriz", matriz)
+            self._guardar_matriz(temporal, "conteo", matriz_conteo)
+            np.save(os.path.join(temporal, "estacionario.npy"), np.asarray(estacionario["vector_estacionario"]))
+            np.save(os.path.join(temporal, "pd.npy"), np.asarray(columna(matriz, idx_default), dtype=float))
+            metadatos = {
+                "model_id": model_id,
+                "estados": estados,
+                "formato": formato,
+                "n": len(estados),
+                "estado_default": estados[idx_default],
+                "total_transiciones": int(matriz_conteo.sum()),
+                "estacionario": {k: v for k, v in estacionario.items() if k != "vector_estacionario"},
+                "creado": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }
+            with open(os.path.join(temporal, "metadatos.json"), "w", encoding="utf-8") as f:
+                json.dump(metadatos, f, ensure_ascii=False)
+            os.rename(temporal, ruta)
+        except OSError:
+            # Otro worker registró el mismo modelo a la vez
+            shutil.rmtree(temporal, ignore_errors=True)
+            if not os.path.isdir(ruta):
+                raise
+        self.podar()
+        return model_id
     
-    # Normas
-    propiedades["normas"] = {
-        "frobenius": float(np.linalg.norm(T, 'fro')),
-        "espectral": float(np.linalg.norm(T, 2)) if n > 0 else None,
-        "infinito": float(np.linalg.norm(T, np.inf)),
-        "uno": float(np.linalg.norm(T, 1))
-    }
+    @staticmethod
+    def _tocar(ruta: str) -> None:
+        # La fecha de modificación del directorio marca el último uso (orden LRU de la poda)
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
     
-    # Número de condición
-    try:
-        propiedades["numero_condicion"] = float(np.linalg.cond(T))
-    except:
-        propiedades["numero_condicion"] = None
+    def podar(self) -> List[str]:
+        """Elimina los modelos que superan la antigüedad máxima y, por uso, los que exceden el máximo"""
+        if not os.path.isdir(self.directorio):
+            return []
+        usos = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if not nombre.startswith(".") and os.path.isdir(ruta):
+                try:
+                    usos.append((os.path.getmtime(ruta), nombre))
+                except OSError:
+                    continue
+        usos.sort()
+        ahora = time.time()
+        eliminados = [nombre for uso, nombre in usos if self.ttl > 0 and ahora - uso > self.ttl]
+        restantes = [nombre for _, nombre in usos if nombre not in eliminados]
+        if self.max_modelos > 0 and len(restantes) > self.max_modelos:
+            eliminados += restantes[:len(restantes) - self.max_modelos]
+        for nombre in eliminados:
+            # Los workers que ya lo tienen mapeado conservan sus páginas hasta cerrarlo
+            shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+            with self.lock:
+                self.abiertos.pop(nombre, None)
+        return eliminados
     
-    # Descomposición SVD
-    try:
-        U, s, Vt = np.linalg.svd(T)
-        propiedades["svd"] = {
-            "valores_singulares": s.tolist(),
-            "valor_singular_maximo": float(s[0]) if len(s) > 0 else None,
-            "valor_singular_minimo": float(s[-1]) if len(s) > 0 else None
+    def cargar(self, model_id: str) -> Dict:
+        """Metadatos y arrays mapeados (solo lectura) del modelo"""
+        ruta = self._ruta(model_id)
+        if self.ttl > 0 and os.path.isdir(ruta) and time.time() - os.path.getmtime(ruta) > self.ttl:
+            self.podar()
+        if not os.path.isdir(ruta):
+            # También si otro worker lo eliminó o lo podó después de abrirlo aquí
+            with self.lock:
+                self.abiertos.pop(model_id, None)
+            raise ModeloNoEncontrado(f"Modelo no encontrado: {model_id}")
+        with self.lock:
+            if model_id in self.abiertos:
+                return self.abiertos[model_id]
+        self._tocar(ruta)
+        
+        with open(os.path.join(ruta, "metadatos.json"), encoding="utf-8") as f:
+            metadatos = json.load(f)
+        n = metadatos["n"]
+        modelo = {
+            "metadatos": metadatos,
+            "estados": metadatos["estados"],
+            "matriz": self._cargar_matriz(ruta, "matriz", metadatos["formato"], n),
+            "conteo": self._cargar_matriz(ruta, "conteo", metadatos["formato"], n),
+            "estacionario": np.load(os.path.join(ruta, "estacionario.npy"), mmap_mode="r"),
+            "pd": np.load(os.path.join(ruta, "pd.npy"), mmap_mode="r")
         }
-    except Exception as e:
-        propiedades["svd"] = {"error": str(e)}
+        with self.lock:
+            self.abiertos[model_id] = modelo
+        return modelo
     
-    # Potencias de la matriz (T^2, T^3, T^5, T^10)
-    try:
-        T2 = np.linalg.matrix_power(T, 2)
-        T3 = np.linalg.matrix_power(T, 3)
-        T5 = np.linalg.matrix_power(T, 5)
-        T10 = np.linalg.matrix_power(T, 10)
-        
-        propiedades["potencias"] = {
-            "T2": T2.tolist(),
-            "T3": T3.tolist(),
-            "T5": T5.tolist(),
-            "T10": T10.tolist()
-        }
-    except Exception as e:
-        propiedades["potencias"] = {"error": str(e)}
+    def listar(self) -> List[Dict]:
+        self.podar()
+        if not os.path.isdir(self.directorio):
+            return []
+        modelos = []
+        for nombre in sorted(os.listdir(self.directorio)):
+            archivo = os.path.join(self.directorio, nombre, "metadatos.json")
+            if not nombre.startswith(".") and os.path.exists(archivo):
+                with open(archivo, encoding="utf-8") as f:
+                    metadatos = json.load(f)
+                modelos.append({k: metadatos[k] for k in ("model_id", "n", "formato", "total_transiciones", "creado")})
+        return modelos
     
-    return propiedades
+    def eliminar(self, model_id: str) -> None:
+        ruta = self._ruta(model_id)
+        if not os.path.isdir(ruta):
+            raise ModeloNoEncontrado(f"Modelo no encontrado: {model_id}")
+        with self.lock:
+            self.abiertos.pop(model_id, None)
+        shutil.rmtree(ruta)
 
 
-def analizar_propiedades_markov(matriz: np.ndarray, estados: List[str]) -> Dict:
-    """Analiza propiedades específicas de cadenas de Markov"""
-    T = np.array(matriz)
-    n = T.shape[0]
+MODELOS = AlmacenModelos(MODELOS_DIRECTORIO)
+
+
+def matriz_y_estados(matriz, model_id: Optional[str], estados: Optional[List[str]], requiere_estados: bool = True):
+    """Matriz del cuerpo de la solicitud o, con model_id, la del almacén de modelos"""
+    if model_id is not None:
+        modelo = MODELOS.cargar(model_id)
+        if estados is not None and list(estados) != modelo["estados"]:
+            raise ValueError("Los estados no coinciden con los del modelo")
+        return modelo["matriz"], modelo["estados"]
+    if matriz is None:
+        raise ValueError("Se requiere la matriz de transición o un model_id")
+    if estados is None and requiere_estados:
+        raise ValueError("Se requieren los estados")
+    return leer_matriz(matriz), estados
+
+
+METRICAS = Metricas()
+METRICAS.definir("markov_solicitud_segundos", "Latencia de las solicitudes por endpoint", CUBETAS_LATENCIA)
+METRICAS.definir("markov_etapa_segundos", "Duración de cada etapa de cálculo por endpoint", CUBETAS_LATENCIA)
+METRICAS.definir("markov_tamano_entrada", "Tamaño de la entrada (registros, estados)", CUBETAS_TAMANO)
+
+
+def factorizar_registros(registros: List[List[str]]) -> Tuple[List[str], np.ndarray]:
+    """Convierte los pares [origen, destino] en códigos enteros (orden de aparición) en una sola pasada"""
+    if not registros:
+        raise ValueError("Los registros deben ser pares [origen, destino]")
     
-    propiedades = {}
+    n_registros = len(registros)
+    longitudes = np.fromiter(map(len, registros), dtype=np.int64, count=n_registros)
+    invalidos = np.flatnonzero(longitudes != 2)
+    if len(invalidos):
+        i = int(invalidos[0])
+        raise ValueError(
+            f"Los registros deben ser pares [origen, destino]: el registro {i + 1} "
+            f"tiene {int(longitudes[i])} elementos"
+        )
     
-    # Verificar si es estocástica (cada fila suma 1)
-    sumas_filas = T.sum(axis=1)
-    propiedades["es_estocastica"] = bool(np.allclose(sumas_filas, 1.0, atol=1e-6))
-    propiedades["sumas_filas"] = sumas_filas.tolist()
-    propiedades["desviacion_estocastica"] = float(np.max(np.abs(sumas_filas - 1.0)))
+    plano = np.fromiter(chain.from_iterable(registros), dtype=object, count=2 * n_registros)
+    codigos, etiquetas = pd.factorize(plano, sort=False)
+    return etiquetas.tolist(), codigos.reshape(n_registros, 2)
+
+
+def factorizar_columnas(
+    origen: np.ndarray,
+    destino: np.ndarray,
+    desplazamiento: int = 0
+) -> Tuple[List[str], np.ndarray]:
+    """Como factorizar_registros, pero a partir de columnas (arrays) de origen y destino"""
+    if len(origen) != len(destino):
+        raise ValueError("Las columnas de origen y destino deben tener la misma longitud")
     
-    # Verificar si es doblemente estocástica (filas y columnas suman 1)
-    sumas_columnas = T.sum(axis=0)
-    propiedades["es_doblemente_estocastica"] = bool(
-        np.allclose(sumas_filas, 1.0, atol=1e-6) and 
-        np.allclose(sumas_columnas, 1.0, atol=1e-6)
-    )
+    plano = np.concatenate([np.asarray(origen, dtype=object), np.asarray(destino, dtype=object)])
+    codigos, etiquetas = pd.factorize(plano, sort=False)
+    codigos = codigos.reshape(2, len(origen)).T
     
-    # Verificar si es irreducible (todos los estados se comunican)
-    # Usar el grafo de comunicación
-    comunicacion = np.zeros((n, n), dtype=bool)
-    T_bool = T > 1e-10  # Considerar transiciones no nulas
-    
-    # Inicializar: cada estado se comunica consigo mismo
-    for i in range(n):
-        comunicacion[i, i] = True
-    
-    # Búsqueda de caminos (algoritmo de Warshall simplificado)
-    for k in range(n):
-        for i in range(n):
-            for j in range(n):
-                if T_bool[i, k] and T_bool[k, j]:
-                    T_bool[i, j] = True
-                    comunicacion[i, j] = True
-    
-    propiedades["es_irreducible"] = bool(np.all(comunicacion))
-    propiedades["matriz_comunicacion"] = comunicacion.tolist()
-    
-    # Verificar periodicidad
-    # Un estado es periódico si el máximo común divisor de los tiempos de retorno es > 1
-    periodos = []
-    for i in range(n):
-        tiempos_retorno = []
-        # Buscar ciclos simples
-        if T[i, i] > 1e-10:
-            tiempos_retorno.append(1)
-        # Buscar ciclos de longitud 2
-        for j in range(n):
-            if i != j and T[i, j] > 1e-10 and T[j, i] > 1e-10:
-                tiempos_retorno.append(2)
-        # Buscar ciclos de longitud 3
-        for j in range(n):
-            for k in range(n):
-                if i != j and j != k and k != i:
-                    if T[i, j] > 1e-10 and T[j, k] > 1e-10 and T[k, i] > 1e-10:
-                        tiempos_retorno.append(3)
-        
-        if tiempos_retorno:
-            from math import gcd
-            from functools import reduce
-            periodo = reduce(gcd, tiempos_retorno) if len(tiempos_retorno) > 1 else tiempos_retorno[0]
-        else:
-            periodo = 0
-        periodos.append(periodo)
+    # pd.factorize codifica vacíos y NaN como -1, que indexaría la última etiqueta
+    vacios = np.flatnonzero((codigos < 0).any(axis=1))
+    if len(vacios):
+        raise ValueError(
+            f"Registro {desplazamiento + int(vacios[0]) + 1} con origen o destino vacío "
+            f"({len(vacios)} registros vacíos en el bloque)"
+        )
+    return [str(e) for e in etiquetas], codigos
+
+
+def codificar_registros(registros: List[List[str]]) -> Tuple[List[str], np.ndarray]:
+    """Estados en orden alfabético y códigos (m, 2) de origen y destino"""
+    etiquetas, codigos = factorizar_registros(registros)
     
-    propiedades["periodos_estados"] = periodos
+    # Reordenar los códigos a orden alfabético de estados
+    estados = sorted(etiquetas)
+    orden = {estado: i for i, estado in enumerate(estados)}
+    rango = np.fromiter((orden[e] for e in etiquetas), dtype=np.int64, count=len(estados))
+    return estados, rango[codigos]
+
+
+def contar_transiciones(registros: List[List[str]]) -> Tuple[List[str], np.ndarray]:
+    """Factoriza las etiquetas de estado y construye la matriz de conteo con un único bincount"""
+    estados, codigos = codificar_registros(registros)
+    n_estados = len(estados)
+    
+    dispersa = n_estados >= N_MINIMO_DISPERSO
+    matriz_conteo = contar_codigos(codigos[:, 0], codigos[:, 1], n_estados, dispersa)
+    
+    return estados, matriz_conteo
+
+
+def contar_codigos(origen: np.ndarray, destino: np.ndarray, n_estados: int, dispersa: bool = False):
+    """Matriz de conteo n x n a partir de códigos enteros de origen y destino"""
+    if dispersa and SCIPY_AVAILABLE:
+        # coo -> csr suma las transiciones repetidas sin materializar n x n
+        unos = np.ones(len(origen), dtype=np.int64)
+        return coo_matrix((unos, (origen, destino)), shape=(n_estados, n_estados)).tocsr()
+    return np.bincount(
+        origen * n_estados + destino, minlength=n_estados * n_estados
+    ).reshape(n_estados, n_estados)
+
+
+def normalizar_conteos(matriz_conteo):
+    """Normaliza por filas (matriz n x n o pila k x n x n); las filas sin observaciones quedan absorbentes"""
+    if es_dispersa(matriz_conteo):
+        conteo = matriz_conteo.tocsr().astype(float)
+        totales = sumar_filas(conteo)
+        con_datos = totales > 0
+        escala = np.zeros_like(totales)
+        escala[con_datos] = 1.0 / totales[con_datos]
+        return (diags(escala) @ conteo + diags((~con_datos).astype(float))).tocsr()
+    
+    conteo = np.asarray(matriz_conteo, dtype=float)
+    totales = conteo.sum(axis=-1)
+    con_datos = totales > 0
+    
+    matriz_transicion = np.zeros_like(conteo)
+    matriz_transicion[con_datos] = conteo[con_datos] / totales[con_datos, None]
+    sin_datos = np.nonzero(~con_datos)
+    matriz_transicion[sin_datos + (sin_datos[-1],)] = 1.0
+    
+    return matriz_transicion
+
+
+def estimar_matriz_transicion(
+    registros: List[List[str]],
+    include: Optional[List[str]] = None,
+    persistir: bool = False
+) -> Dict:
+    registrar_tamano("registros", len(registros))
+    with etapa("conteo"):
+        estados, matriz_conteo = contar_transiciones(registros)
+    return construir_resultado_matriz(estados, matriz_conteo, include, persistir)
+
+
+def normalizar_secciones(include: Optional[List[str]]) -> List[str]:
+    """Valida la selección include=; None equivale a todas las secciones"""
+    if include is None:
+        return list(SECCIONES_MATRIZ)
+    
+    desconocidas = sorted(set(include) - set(SECCIONES_MATRIZ))
+    if desconocidas:
+        raise ValueError(
+            f"Secciones desconocidas: {', '.join(desconocidas)}. "
+            f"Disponibles: {', '.join(SECCIONES_MATRIZ)}"
+        )
+    return [seccion for seccion in SECCIONES_MATRIZ if seccion in include]
+
+
+def construir_resultado_matriz(
+    estados: List[str],
+    matriz_conteo: np.ndarray,
+    include: Optional[List[str]] = None,
+    persistir: bool = False
+) -> Dict:
+    """Resultado de /matriz para una matriz de conteo, reutilizando la caché si ya se analizó"""
+    secciones = normalizar_secciones(include)
+    clave = huella_contenido("matriz", matriz_conteo, estados, secciones)
+    resultado = CACHE.obtener(clave)
+    if resultado is None:
+        resultado = analizar_matriz_conteo(estados, matriz_conteo, secciones)
+        # Un resultado con secciones parciales no se guarda: la próxima solicitud lo reintenta
+        if not resultado.get("secciones_parciales"):
+            CACHE.guardar(clave, resultado)
+    if persistir:
+        with etapa("registro_modelo"):
+            resultado["model_id"] = MODELOS.registrar(estados, matriz_conteo)
+    return resultado
+
+
+# Sección de /matriz -> (clave en el resultado, función de análisis que rellena destino)
+ANALISIS_SECCIONES = {
+    "algebra": (
+        "propiedades_algebra",
+        lambda T, estados, destino: calcular_propiedades_algebra_lineal(T, destino=destino)
+    ),
+    "markov": (
+        "propiedades_markov",
+        lambda T, estados, destino: analizar_propiedades_markov(T, estados, destino)
+    ),
+    "clasificacion": (
+        "clasificacion_estados",
+        lambda T, estados, destino: clasificar_estados(T, estados, destino)
+    )
+}
+
+
+# Secciones vencidas que siguen corriendo en este proceso hijo del pool (ver retener_secciones)
+_SECCIONES_PENDIENTES: List[Future] = []
+_SECCIONES_PENDIENTES_LOCK = threading.Lock()
+
+
+def retener_secciones(futuros: List[Future]) -> None:
+    """Cuenta contra la admisión las secciones que siguen corriendo después de responder"""
+    pendientes = [f for f in futuros if not f.done()]
+    if not pendientes:
+        return
+    if multiprocessing.parent_process() is None:
+        # Hilos (o flujos en el proceso principal): ocupan un cupo del pool hasta terminar
+        POOL.retener(pendientes)
+    else:
+        # Proceso hijo: el cupo vive en el padre; la siguiente tarea de este proceso las espera
+        with _SECCIONES_PENDIENTES_LOCK:
+            _SECCIONES_PENDIENTES.extend(pendientes)
+
+
+def esperar_secciones_pendientes() -> None:
+    """En un proceso hijo, espera a las secciones vencidas de tareas anteriores antes de calcular"""
+    with _SECCIONES_PENDIENTES_LOCK:
+        pendientes = list(_SECCIONES_PENDIENTES)
+        _SECCIONES_PENDIENTES.clear()
+    if pendientes:
+        with etapa("espera_secciones"):
+            wait(pendientes)
+
+
+def _ejecutar_seccion(seccion: str, matriz_transicion, estados: List[str], destino: Dict) -> Traza:
+    # Traza propia del hilo de la sección; se combina con la de la solicitud al terminar
+    traza = Traza()
+    token = TRAZA.set(traza)
+    try:
+        with etapa(seccion):
+            ANALISIS_SECCIONES[seccion][1](matriz_transicion, estados, destino)
+    finally:
+        TRAZA.reset(token)
+    return traza
+
+
+def calcular_secciones(matriz_transicion, estados: List[str], secciones: List[str]) -> Dict:
+    """Secciones de análisis de /matriz en paralelo, cada una con su tiempo máximo"""
+    resultado = {}
+    parciales = []
+    destinos = {seccion: {} for seccion in secciones}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(WORKERS_SECCIONES, len(secciones))))
+    inicio = time.perf_counter()
+    futuros = {
+        seccion: executor.submit(_ejecutar_seccion, seccion, matriz_transicion, estados, destinos[seccion])
+        for seccion in secciones
+    }
+    traza = TRAZA.get()
+    try:
+        for seccion, futuro in futuros.items():
+            clave = ANALISIS_SECCIONES[seccion][0]
+            limite = TIMEOUTS_SECCIONES[seccion]
+            try:
+                traza_seccion = futuro.result(timeout=max(0.0, inicio + limite - time.perf_counter()))
+            except TimeoutFuturo:
+                # El hilo no se puede interrumpir: se devuelve lo calculado hasta ahora
+                futuro.cancel()
+                parciales.append(seccion)
+                resultado[clave] = {
+                    **dict(destinos[seccion]),
+                    "parcial": True,
+                    "error": f"La sección {seccion} superó el tiempo máximo de {limite:g} s"
+                }
+                if traza is not None:
+                    traza.sumar(seccion, time.perf_counter() - inicio)
+                continue
+            except Exception as e:
+                print(f"Error en la sección {seccion}: {e}")
+                resultado[clave] = {"error": str(e)}
+                continue
+            resultado[clave] = destinos[seccion]
+            if traza is not None:
+                traza.combinar(traza_seccion)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Los hilos no se interrumpen: las secciones vencidas siguen ocupando capacidad del pool
+        retener_secciones(list(futuros.values()))
+    
+    if parciales:
+        resultado["secciones_parciales"] = parciales
+    return resultado
+
+
+def analizar_matriz_conteo(estados: List[str], matriz_conteo, secciones: List[str]) -> Dict:
+    """Normaliza una matriz de conteo y ejecuta los análisis seleccionados de /matriz"""
+    registrar_tamano("estados", len(estados))
+    with etapa("normalizacion"):
+        matriz_transicion = preparar_matriz(normalizar_conteos(matriz_conteo))
+    if es_dispersa(matriz_transicion):
+        matriz_conteo = csr_matrix(matriz_conteo)
+    elif es_dispersa(matriz_conteo):
+        matriz_conteo = matriz_conteo.toarray()
+    
+    estadisticas = {
+        "total_transiciones": int(matriz_conteo.sum()),
+        "conteo_por_estado": dict(zip(estados, sumar_filas(matriz_conteo).astype(np.int64).tolist()))
+    }
+    
+    resultado = {
+        "estados": estados,
+        "formato": "disperso" if es_dispersa(matriz_transicion) else "denso",
+        "matriz_transicion": matriz_a_json(matriz_transicion),
+        "matriz_conteo": matriz_a_json(matriz_conteo),
+        "estadisticas": estadisticas
+    }
+    
+    if secciones:
+        resultado.update(calcular_secciones(matriz_transicion, estados, secciones))
+    
+    return resultado
+
+
+def emparejar_panel(
+    prestamo: np.ndarray,
+    periodo: np.ndarray,
+    estado: np.ndarray,
+    solo_contiguos: bool = True
+) -> Dict:
+    """Ordena el panel por (préstamo, periodo) y empareja observaciones consecutivas sin bucles"""
+    m = len(prestamo)
+    if len(periodo) != m or len(estado) != m:
+        raise ValueError("Las columnas prestamo, periodo y estado deben tener la misma longitud")
+    if m == 0:
+        raise ValueError("El panel está vacío")
+    
+    codigo_prestamo, prestamos = pd.factorize(prestamo)
+    codigo_estado, estados = pd.factorize(np.asarray(estado, dtype=object), sort=True)
+    periodo = np.asarray(periodo)
+    if periodo.dtype.kind in "iu":
+        periodos, codigo_periodo = np.unique(periodo, return_inverse=True)
+        valor_periodo = periodo.astype(np.int64)
+    else:
+        # Periodos como texto (p. ej. "2024-01"): orden lexicográfico y contigüidad por posición
+        periodos, codigo_periodo = np.unique(periodo.astype(str), return_inverse=True)
+        valor_periodo = codigo_periodo
+    
+    orden = np.lexsort((valor_periodo, codigo_prestamo))
+    p = codigo_prestamo[orden]
+    t = valor_periodo[orden]
+    
+    mismo_prestamo = p[1:] == p[:-1]
+    if np.any(mismo_prestamo & (t[1:] == t[:-1])):
+        raise ValueError("Hay préstamos con más de una observación en el mismo periodo")
+    pares = mismo_prestamo & (t[1:] == t[:-1] + 1) if solo_contiguos else mismo_prestamo
+    
+    s = codigo_estado[orden]
+    return {
+        "estados": [str(e) for e in estados],
+        "periodos": periodos.tolist(),
+        "origen": s[:-1][pares],
+        "destino": s[1:][pares],
+        "periodo_origen": codigo_periodo[orden][:-1][pares],
+        "n_prestamos": len(prestamos),
+        "n_observaciones": m,
+        "pares_descartados": int(np.count_nonzero(mismo_prestamo & ~pares))
+    }
+
+
+def contar_por_grupo(origen: np.ndarray, destino: np.ndarray, grupo: np.ndarray, n_grupos: int, n_estados: int) -> np.ndarray:
+    """Pila (n_grupos, n, n) de conteos en una única pasada de bincount"""
+    n = n_estados
+    return np.bincount(
+        (grupo * n + origen) * n + destino, minlength=n_grupos * n * n
+    ).reshape(n_grupos, n, n)
+
+
+def producto_periodos(T_lote: np.ndarray, acumulados: bool = False) -> np.ndarray:
+    """T_1 · T_2 · ... · T_k (o todos los productos parciales si acumulados)"""
+    producto = T_lote[0].copy()
+    parciales = [producto]
+    for T in T_lote[1:]:
+        producto = producto @ T
+        parciales.append(producto)
+    return np.stack(parciales) if acumulados else producto
+
+
+def estimar_panel(
+    prestamo: List[str],
+    periodo: List[Union[int, str]],
+    estado: List[str],
+    solo_contiguos: bool = True,
+    include: Optional[List[str]] = None,
+    producto: Optional[Dict] = None
+) -> Dict:
+    """Matriz global y una matriz por periodo de origen a partir de un panel (préstamo, periodo, estado)"""
+    registrar_tamano("registros", len(prestamo))
+    with etapa("emparejamiento"):
+        panel = emparejar_panel(
+            np.asarray(prestamo, dtype=object), np.asarray(periodo), np.asarray(estado, dtype=object), solo_contiguos
+        )
+    estados, periodos = panel["estados"], panel["periodos"]
+    n = len(estados)
+    if len(panel["origen"]) == 0:
+        raise ValueError("El panel no contiene pares de observaciones consecutivas")
+    
+    with etapa("conteo"):
+        conteos = contar_por_grupo(panel["origen"], panel["destino"], panel["periodo_origen"], len(periodos), n)
+        matrices = normalizar_conteos(conteos)
+    
+    # El último periodo no tiene transiciones de salida: solo se reportan periodos con pares
+    con_pares = np.flatnonzero(conteos.sum(axis=(1, 2)) > 0)
+    resultado = {
+        "estados": estados,
+        "n_prestamos": panel["n_prestamos"],
+        "n_observaciones": panel["n_observaciones"],
+        "n_transiciones": int(len(panel["origen"])),
+        "pares_descartados": panel["pares_descartados"],
+        "global": construir_resultado_matriz(estados, conteos.sum(axis=0), include),
+        "por_periodo": [
+            {
+                "periodo": periodos[g],
+                "total_transiciones": int(conteos[g].sum()),
+                "matriz_transicion": matrices[g].tolist(),
+                "matriz_conteo": conteos[g].tolist()
+            }
+            for g in con_pares
+        ]
+    }
+    
+    if producto is not None:
+        etiquetas = [periodos[g] for g in con_pares]
+        desde = etiquetas[0] if producto.get("desde") is None else producto["desde"]
+        hasta = etiquetas[-1] if producto.get("hasta") is None else producto["hasta"]
+        if desde not in etiquetas or hasta not in etiquetas:
+            raise ValueError(f"Periodos del producto fuera del panel. Disponibles: {etiquetas}")
+        i, j = etiquetas.index(desde), etiquetas.index(hasta)
+        if i > j:
+            raise ValueError("El periodo inicial del producto debe ser anterior al final")
+        
+        seleccion = con_pares[i:j + 1]
+        with etapa("producto"):
+            acumulados = producto_periodos(matrices[seleccion], acumulados=True)
+        resultado["producto"] = {
+            "periodos": [periodos[g] for g in seleccion],
+            "matriz": acumulados[-1].tolist()
+        }
+        if producto.get("acumulados"):
+            resultado["producto"]["acumulados"] = acumulados.tolist()
+    
+    return resultado
+
+
+def estimar_generador(
+    prestamo: np.ndarray,
+    tiempo: np.ndarray,
+    estado: np.ndarray
+) -> Dict:
+    """Estimador de duraciones (MLE / Aalen-Johansen con trayectorias observadas): Q_ij = N_ij / R_i"""
+    m = len(prestamo)
+    if len(tiempo) != m or len(estado) != m:
+        raise ValueError("Las columnas prestamo, tiempo y estado deben tener la misma longitud")
+    if m == 0:
+        raise ValueError("No hay observaciones")
+    
+    codigo_prestamo, prestamos = pd.factorize(prestamo)
+    codigo_estado, estados = pd.factorize(estado, sort=True)
+    tiempo = np.asarray(tiempo, dtype=float)
+    if not np.all(np.isfinite(tiempo)):
+        raise ValueError("Los tiempos deben ser finitos")
+    n = len(estados)
+    
+    orden = np.lexsort((tiempo, codigo_prestamo))
+    p = codigo_prestamo[orden]
+    t = tiempo[orden]
+    s = codigo_estado[orden]
+    
+    # Cada par consecutivo del mismo préstamo es un tramo: tiempo en el estado de origen
+    # y, si el estado cambia, una transición al final del tramo; la última observación queda censurada
+    mismo_prestamo = p[1:] == p[:-1]
+    origen = s[:-1][mismo_prestamo]
+    destino = s[1:][mismo_prestamo]
+    duracion = (t[1:] - t[:-1])[mismo_prestamo]
+    
+    exposicion = np.bincount(origen, weights=duracion, minlength=n)
+    cambia = origen != destino
+    conteo = contar_codigos(origen[cambia], destino[cambia], n)
+    
+    # Estados sin tiempo de exposición quedan con tasa cero (absorbentes)
+    generador = np.zeros((n, n))
+    con_exposicion = exposicion > 0
+    generador[con_exposicion] = conteo[con_exposicion] / exposicion[con_exposicion, None]
+    np.fill_diagonal(generador, -generador.sum(axis=1))
+    
+    return {
+        "estados": [str(e) for e in estados],
+        "generador": generador,
+        "exposicion": exposicion,
+        "conteo": conteo,
+        "n_prestamos": len(prestamos),
+        "n_tramos": int(len(origen)),
+        "n_transiciones": int(np.count_nonzero(cambia))
+    }
+
+
+def validar_generador(generador) -> np.ndarray:
+    Q = np.asarray(generador, dtype=float)
+    if Q.ndim != 2 or Q.shape[0] != Q.shape[1]:
+        raise ValueError("El generador debe ser una matriz cuadrada")
+    fuera_diagonal = Q - np.diag(np.diag(Q))
+    if np.any(fuera_diagonal < -TOLERANCIA_GENERADOR):
+        raise ValueError("Las tasas fuera de la diagonal del generador deben ser no negativas")
+    if np.any(np.abs(Q.sum(axis=1)) > TOLERANCIA_GENERADOR * max(1.0, np.abs(Q).max())):
+        raise ValueError("Las filas del generador deben sumar 0")
+    return Q
+
+
+def _limpiar_estocastica(P: np.ndarray) -> np.ndarray:
+    """Recorta el ruido numérico negativo y renormaliza filas de una o varias matrices P(t)"""
+    P = np.clip(np.real(P), 0.0, None)
+    return P / P.sum(axis=-1, keepdims=True)
+
+
+def exponencial_autovalores(Q: np.ndarray, horizontes: np.ndarray) -> Optional[np.ndarray]:
+    """P(t) = V diag(e^{λt}) V^-1 para todos los horizontes con una sola descomposición; None si V está mal condicionada"""
+    autovalores, V = np.linalg.eig(Q)
+    if np.linalg.cond(V) > CONDICION_MAXIMA_AUTOVECTORES:
+        return None
+    V_inv = np.linalg.inv(V)
+    if not np.iscomplexobj(autovalores) or np.abs(autovalores.imag).max(initial=0.0) == 0.0:
+        # Espectro real: se evita la aritmética compleja (4 veces más cara en el producto por lotes)
+        autovalores, V, V_inv = autovalores.real, V.real, V_inv.real
+    P = (V[None, :, :] * np.exp(np.outer(horizontes, autovalores))[:, None, :]) @ V_inv
+    
+    # Verificación: la parte imaginaria y el error en las sumas por fila deben ser despreciables
+    if np.abs(np.imag(P)).max(initial=0.0) > 1e-8 or np.abs(np.real(P).sum(axis=-1) - 1.0).max(initial=0.0) > 1e-8:
+        return None
+    return _limpiar_estocastica(P)
+
+
+def incrementos_horizonte(horizontes: np.ndarray) -> set:
+    """Incrementos distintos entre horizontes ordenados (redondeados para reutilizar expm)"""
+    ordenados = np.sort(horizontes)
+    return set(np.round(np.diff(ordenados, prepend=0.0), 12).tolist()) - {0.0}
+
+
+def exponencial_incremental(Q: np.ndarray, horizontes: np.ndarray) -> np.ndarray:
+    """P(t_k) = P(t_{k-1}) · expm(Q Δ_k) en orden creciente, reutilizando expm de incrementos repetidos"""
+    if not SCIPY_AVAILABLE:
+        raise ValueError("El método expm requiere scipy")
+    n = Q.shape[0]
+    orden = np.argsort(horizontes)
+    resultado = np.empty((len(horizontes), n, n))
+    
+    # Con horizontes equiespaciados solo se calcula una exponencial (escalado y elevación al cuadrado)
+    exponenciales: Dict[float, np.ndarray] = {}
+    P = np.eye(n)
+    anterior = 0.0
+    for k in orden:
+        delta = float(np.round(float(horizontes[k]) - anterior, 12))
+        if delta > 0:
+            if delta not in exponenciales:
+                exponenciales[delta] = expm(Q * delta)
+            P = P @ exponenciales[delta]
+        resultado[k] = P
+        anterior = float(horizontes[k])
+    return _limpiar_estocastica(resultado)
+
+
+def matrices_horizonte(generador, horizontes: List[float], metodo: str = "auto") -> Tuple[np.ndarray, str]:
+    """Pila (h, n, n) de P(t) para cada horizonte y el método usado"""
+    if metodo not in METODOS_EXPONENCIAL:
+        raise ValueError(f"Método desconocido: {metodo}. Disponibles: {', '.join(METODOS_EXPONENCIAL)}")
+    Q = validar_generador(generador)
+    t = np.asarray(horizontes, dtype=float)
+    if t.ndim != 1 or len(t) == 0 or np.any(t < 0) or not np.all(np.isfinite(t)):
+        raise ValueError("Los horizontes deben ser una lista no vacía de tiempos no negativos")
+    
+    # Con pocos incrementos distintos (p. ej. horizontes equiespaciados) basta una expm y productos;
+    # con horizontes irregulares una sola descomposición espectral sirve para todos
+    if metodo == "auto" and SCIPY_AVAILABLE and len(incrementos_horizonte(t)) * 2 <= len(t):
+        return exponencial_incremental(Q, t), "expm"
+    
+    if metodo in ("auto", "autovalores"):
+        P = exponencial_autovalores(Q, t)
+        if P is not None:
+            return P, "autovalores"
+        if metodo == "autovalores":
+            raise ValueError("El generador no es diagonalizable de forma estable; use metodo='expm'")
+    return exponencial_incremental(Q, t), "expm"
+
+
+def analizar_transicion_continua(
+    generador,
+    estados: List[str],
+    horizontes: List[float],
+    metodo: str = "auto",
+    incluir_estacionario: bool = False,
+    ead: Optional[Dict[str, float]] = None,
+    lgd: Optional[Dict[str, float]] = None,
+    factor_moroso: Optional[float] = None,
+    factor_incobrable: Optional[float] = None
+) -> Dict:
+    """P(t) para cada horizonte y, sobre cada una, estacionario, pérdidas y stress sin reestimar"""
+    if len(estados) != len(generador):
+        raise ValueError("El número de estados no coincide con la dimensión del generador")
+    
+    with etapa("exponencial"):
+        P, metodo_usado = CACHE.obtener_o_calcular(
+            huella_contenido("expm", np.asarray(generador, dtype=float), list(horizontes), metodo),
+            lambda: matrices_horizonte(generador, horizontes, metodo)
+        )
+    
+    stress = factor_moroso is not None or factor_incobrable is not None
+    resultados = []
+    for t, P_t in zip(horizontes, P):
+        entrada = {"horizonte": t, "matriz_transicion": P_t.tolist()}
+        if incluir_estacionario:
+            entrada["estacionario"] = vector_estacionario_cacheado(P_t)
+        if ead is not None and lgd is not None:
+            entrada["perdidas"] = calcular_perdidas_esperadas(P_t, estados, ead, lgd)
+        if stress:
+            entrada["stress"] = aplicar_stress(
+                P_t, estados,
+                1.0 if factor_moroso is None else factor_moroso,
+                1.0 if factor_incobrable is None else factor_incobrable
+            )
+        resultados.append(entrada)
+    
+    return {"estados": estados, "metodo": metodo_usado, "horizontes": resultados}
+
+
+def resolver_generador(
+    prestamo: List[str],
+    tiempo: List[float],
+    estado: List[str],
+    horizontes: Optional[List[float]] = None,
+    metodo: str = "auto"
+) -> Dict:
+    registrar_tamano("registros", len(prestamo))
+    with etapa("estimacion"):
+        estimacion = estimar_generador(
+            np.asarray(prestamo, dtype=object), np.asarray(tiempo, dtype=float), np.asarray(estado, dtype=object)
+        )
+    estados = estimacion["estados"]
+    registrar_tamano("estados", len(estados))
+    
+    exposicion = estimacion["exposicion"]
+    resultado = {
+        "estados": estados,
+        "generador": estimacion["generador"].tolist(),
+        "exposicion": dict(zip(estados, exposicion.tolist())),
+        "conteo_transiciones": estimacion["conteo"].tolist(),
+        "tasa_salida": dict(zip(estados, (-np.diag(estimacion["generador"])).tolist())),
+        "n_prestamos": estimacion["n_prestamos"],
+        "n_tramos": estimacion["n_tramos"],
+        "n_transiciones": estimacion["n_transiciones"]
+    }
+    if horizontes:
+        continuo = analizar_transicion_continua(estimacion["generador"], estados, horizontes, metodo)
+        resultado["metodo"] = continuo["metodo"]
+        resultado["horizontes"] = continuo["horizontes"]
+    return resultado
+
+
+def agrupar_hacia_global(conteos: np.ndarray, minimo_observaciones: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Completa con pseudo-observaciones de la fila global las filas con menos de minimo_observaciones"""
+    total = conteos.sum(axis=0)
+    global_ = normalizar_conteos(total)
+    observadas = conteos.sum(axis=2)
+    
+    # Peso de credibilidad por fila: faltan k = minimo - N_si observaciones, tomadas de la matriz global
+    faltantes = np.clip(minimo_observaciones - observadas, 0, None)
+    faltantes[:, total.sum(axis=1) == 0] = 0
+    return conteos + faltantes[:, :, None] * global_[None, :, :], faltantes > 0
+
+
+def estimar_segmentos(
+    registros: List[List[str]],
+    segmento: List[str],
+    minimo_observaciones: int = 0,
+    incluir_conteos: bool = False
+) -> Dict:
+    """Una matriz por segmento con un único scatter-add 3-D, y estacionarios y PD por lotes"""
+    if len(segmento) != len(registros):
+        raise ValueError("Se requiere una clave de segmento por registro")
+    if minimo_observaciones < 0:
+        raise ValueError("minimo_observaciones no puede ser negativo")
+    registrar_tamano("registros", len(registros))
+    
+    with etapa("conteo"):
+        estados, codigos = codificar_registros(registros)
+        codigo_segmento, segmentos = pd.factorize(np.asarray(segmento, dtype=object), sort=True)
+        n, k = len(estados), len(segmentos)
+        conteos = contar_por_grupo(codigos[:, 0], codigos[:, 1], codigo_segmento, k, n)
+    registrar_tamano("estados", n)
+    
+    if minimo_observaciones > 0:
+        ajustados, agrupadas = agrupar_hacia_global(conteos, minimo_observaciones)
+    else:
+        ajustados, agrupadas = conteos, np.zeros((k, n), dtype=bool)
+    
+    # Segmentos y matriz global apilados: un solo solve estacionario por lotes
+    with etapa("estacionario"):
+        T = normalizar_conteos(np.concatenate([ajustados, conteos.sum(axis=0)[None]]))
+        pis, metodos = vectores_estacionarios_lote(T)
+    idx_default = estados.index(identificar_estado_default(estados))
+    
+    def resumen(g: int) -> Dict:
+        return {
+            "matriz_transicion": T[g].tolist(),
+            "vector_estacionario": pis[g].tolist(),
+            "pd": T[g, :, idx_default].tolist(),
+            "metodo": metodos[g]
+        }
+    
+    por_segmento = {}
+    for g, nombre in enumerate(segmentos):
+        por_segmento[str(nombre)] = {
+            "total_transiciones": int(conteos[g].sum()),
+            "filas_agrupadas": [estados[i] for i in np.flatnonzero(agrupadas[g])],
+            **resumen(g)
+        }
+        if incluir_conteos:
+            por_segmento[str(nombre)]["matriz_conteo"] = conteos[g].tolist()
+    
+    return {
+        "estados": estados,
+        "estado_default": estados[idx_default],
+        "n_segmentos": k,
+        "minimo_observaciones": minimo_observaciones,
+        "global": {"total_transiciones": int(conteos.sum()), **resumen(k)},
+        "segmentos": por_segmento
+    }
+
+
+def _bloque_bootstrap(
+    semilla: np.random.SeedSequence,
+    conteo: np.ndarray,
+    replicas: int,
+    metodo: str,
+    concentracion: float,
+    idx_default: int,
+    horizonte: Optional[int],
+    conservar_matrices: bool
+) -> Dict[str, np.ndarray]:
+    """Un bloque de réplicas: matrices remuestreadas por filas, estacionarios y PD por lotes"""
+    rng = np.random.default_rng(semilla)
+    n = conteo.shape[0]
+    totales = conteo.sum(axis=1)
+    con_datos = totales > 0
+    
+    if metodo == "multinomial":
+        # Cada fila i se remuestrea con N_i ensayos y las probabilidades estimadas
+        muestras = rng.multinomial(totales.astype(np.int64), normalizar_conteos(conteo), size=(replicas, n))
+    else:
+        # Posterior Dirichlet(conteo + previa) por fila vía gammas normalizadas
+        muestras = rng.standard_gamma(conteo + concentracion, size=(replicas, n, n))
+        muestras[:, ~con_datos] = 0.0
+    T = normalizar_conteos(muestras)
+    
+    pis, _ = vectores_estacionarios_lote(T)
+    if horizonte is None:
+        pd_default = T[:, :, idx_default]
+    else:
+        # Columna de default de T^h con el default absorbente, como en proyectar_pd
+        v = np.zeros((replicas, n))
+        v[:, idx_default] = 1.0
+        for _ in range(horizonte):
+            v = np.einsum("rij,rj->ri", T, v)
+            v[:, idx_default] = 1.0
+        pd_default = np.clip(v, 0.0, 1.0)
+    
+    bloque = {"estacionario": pis, "pd": pd_default}
+    if conservar_matrices:
+        bloque["matrices"] = T
+    return bloque
+
+
+def intervalos_percentil(muestras: np.ndarray, nivel: float) -> Dict[str, list]:
+    """Intervalos de percentil (y mediana) sobre el eje de réplicas"""
+    alfa = (1.0 - nivel) / 2.0
+    inferior, mediana, superior = np.percentile(muestras, [100 * alfa, 50.0, 100 * (1 - alfa)], axis=0)
+    return {"inferior": inferior.tolist(), "mediana": mediana.tolist(), "superior": superior.tolist()}
+
+
+def bootstrap_matriz(
+    estados: List[str],
+    matriz_conteo: np.ndarray,
+    replicas: int = 5000,
+    metodo: str = "multinomial",
+    nivel: float = 0.95,
+    concentracion_previa: float = 0.0,
+    horizonte: Optional[int] = None,
+    semilla: Optional[int] = None,
+    workers: Optional[int] = None
+) -> Dict:
+    """Intervalos de confianza bootstrap / posteriores para la matriz, el vector estacionario y las PD"""
+    if metodo not in METODOS_BOOTSTRAP:
+        raise ValueError(f"Método desconocido: {metodo}. Disponibles: {', '.join(METODOS_BOOTSTRAP)}")
+    if replicas < 2:
+        raise ValueError("Se requieren al menos 2 réplicas")
+    if not 0.0 < nivel < 1.0:
+        raise ValueError("El nivel de confianza debe estar entre 0 y 1")
+    if concentracion_previa < 0:
+        raise ValueError("La concentración previa no puede ser negativa")
+    if horizonte is not None and horizonte < 1:
+        raise ValueError("El horizonte debe ser un entero positivo")
+    
+    conteo = np.asarray(a_densa(matriz_conteo), dtype=float)
+    n = len(estados)
+    if conteo.shape != (n, n):
+        raise ValueError("La matriz de conteo debe ser cuadrada y coincidir con los estados")
+    if np.any(conteo < 0):
+        raise ValueError("Los conteos no pueden ser negativos")
+    if metodo == "multinomial" and not np.allclose(conteo, np.round(conteo)):
+        raise ValueError("El bootstrap multinomial requiere conteos enteros")
+    
+    idx_default = estados.index(identificar_estado_default(estados))
+    conservar_matrices = replicas * n * n <= ELEMENTOS_INTERVALOS_MATRIZ
+    
+    # Bloques de tamaño fijo con semillas derivadas: reproducible con cualquier número de workers
+    raiz = np.random.SeedSequence(semilla)
+    tamanos = [min(REPLICAS_POR_BLOQUE, replicas - i) for i in range(0, replicas, REPLICAS_POR_BLOQUE)]
+    semillas = raiz.spawn(len(tamanos))
+    workers = min(limitar_workers(workers, WORKERS_SIMULACION), len(tamanos))
+    argumentos = [
+        (s, conteo, r, metodo, concentracion_previa, idx_default, horizonte, conservar_matrices)
+        for s, r in zip(semillas, tamanos)
+    ]
+    with etapa("bootstrap"):
+        if workers == 1:
+            bloques = [_bloque_bootstrap(*a) for a in argumentos]
+        else:
+            # Hilos: los muestreos de numpy y el solve por lotes liberan el GIL
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                bloques = list(executor.map(lambda a: _bloque_bootstrap(*a), argumentos))
+    
+    estacionario = np.concatenate([b["estacionario"] for b in bloques])
+    pd_default = np.concatenate([b["pd"] for b in bloques])
+    puntual = normalizar_conteos(conteo)
+    
+    resultado = {
+        "estados": estados,
+        "metodo": metodo,
+        "replicas": replicas,
+        "nivel": nivel,
+        "semilla": raiz.entropy,
+        "estado_default": estados[idx_default],
+        "horizonte_pd": horizonte or 1,
+        "vector_estacionario": {
+            "estimado": calcular_vector_estacionario(puntual)["vector_estacionario"],
+            **intervalos_percentil(estacionario, nivel)
+        },
+        "pd": {
+            "estimado": (
+                puntual[:, idx_default] if horizonte is None else proyectar_pd(puntual, idx_default, horizonte)[-1]
+            ).tolist(),
+            **intervalos_percentil(pd_default, nivel)
+        }
+    }
+    if conservar_matrices:
+        matrices = np.concatenate([b["matrices"] for b in bloques])
+        resultado["matriz_transicion"] = {"estimado": puntual.tolist(), **intervalos_percentil(matrices, nivel)}
+    else:
+        resultado["matriz_transicion"] = {
+            "error": f"Intervalos por celda omitidos: réplicas x n x n supera {ELEMENTOS_INTERVALOS_MATRIZ}"
+        }
+    return resultado
+
+
+def resolver_bootstrap(request: "BootstrapRequest") -> Dict:
+    if request.registros is not None:
+        registrar_tamano("registros", len(request.registros))
+        estados, conteo = contar_transiciones(request.registros)
+    elif request.model_id is not None:
+        modelo = MODELOS.cargar(request.model_id)
+        estados, conteo = modelo["estados"], modelo["conteo"]
+    elif request.estados is not None and request.matriz_conteo is not None:
+        estados, conteo = request.estados, np.array(request.matriz_conteo, dtype=float)
+    else:
+        raise ValueError("Se requieren registros o estados y matriz_conteo")
+    registrar_tamano("estados", len(estados))
+    return bootstrap_matriz(
+        estados,
+        conteo,
+        request.replicas,
+        request.metodo,
+        request.nivel,
+        request.concentracion_previa,
+        request.horizonte,
+        request.semilla,
+        request.workers
+    )
+
+
+class AcumuladorTransiciones:
+    """Estadísticos suficientes (índice de estados y matriz de conteo) de una estimación incremental"""
+    
+    def __init__(self):
+        self.estados: List[str] = []
+        self.estado_idx: Dict[str, int] = {}
+        self.conteo = np.zeros((0, 0), dtype=np.int64)
+        self.lock = threading.Lock()
+    
+    def _indices(self, etiquetas: List[str]) -> np.ndarray:
+        """Índices internos de las etiquetas, registrando las nuevas y ampliando el conteo"""
+        for etiqueta in etiquetas:
+            if etiqueta not in self.estado_idx:
+                self.estado_idx[etiqueta] = len(self.estados)
+                self.estados.append(etiqueta)
+        
+        n_nuevo = len(self.estados)
+        n_actual = self.conteo.shape[0]
+        if n_nuevo > n_actual:
+            extra = n_nuevo - n_actual
+            self.conteo = np.pad(self.conteo, ((0, extra), (0, extra)))
+        
+        return np.fromiter(
+            (self.estado_idx[e] for e in etiquetas), dtype=np.int64, count=len(etiquetas)
+        )
+    
+    def agregar(self, registros: List[List[str]]) -> int:
+        """Suma un bloque de pares [origen, destino] al conteo acumulado"""
+        etiquetas, codigos = factorizar_registros(registros)
+        return self.agregar_codigos(etiquetas, codigos[:, 0], codigos[:, 1])
+    
+    def agregar_codigos(self, etiquetas: List[str], origen: np.ndarray, destino: np.ndarray) -> int:
+        """Suma transiciones dadas como códigos enteros sobre una lista de etiquetas"""
+        with self.lock:
+            idx = self._indices(etiquetas)
+            n = len(self.estados)
+            self.conteo += contar_codigos(idx[origen], idx[destino], n)
+        return len(origen)
+    
+    def combinar(self, estados: List[str], matriz_conteo: np.ndarray) -> None:
+        """Suma un conteo parcial (p. ej. de otro worker) con su propio índice de estados"""
+        matriz_conteo = np.asarray(matriz_conteo, dtype=np.int64)
+        if matriz_conteo.shape != (len(estados), len(estados)):
+            raise ValueError("La matriz de conteo debe ser cuadrada y coincidir con los estados")
+        if len(set(estados)) != len(estados):
+            raise ValueError("Los estados del conteo parcial deben ser únicos")
+        if (matriz_conteo < 0).any():
+            raise ValueError("Los conteos no pueden ser negativos")
+        
+        with self.lock:
+            idx = self._indices(estados)
+            self.conteo[np.ix_(idx, idx)] += matriz_conteo
+    
+    def exportar(self) -> Tuple[List[str], np.ndarray]:
+        """Conteo acumulado en orden alfabético de estados, como en /matriz"""
+        with self.lock:
+            estados = sorted(self.estados)
+            idx = np.array([self.estado_idx[e] for e in estados], dtype=np.int64)
+            conteo = self.conteo[np.ix_(idx, idx)]
+        return estados, conteo
+
+
+def conteo_parcial_registros(registros: List[List[str]]) -> Tuple[List[str], np.ndarray, int]:
+    """Conteo de un bloque de pares (estados, matriz de conteo, registros), calculado en el pool"""
+    etiquetas, codigos = factorizar_registros(registros)
+    return etiquetas, contar_codigos(codigos[:, 0], codigos[:, 1], len(etiquetas)), len(codigos)
+
+
+def conteo_parcial_archivo(
+    fuente,
+    formato_entrada: str,
+    columna_origen: str,
+    columna_destino: str
+) -> Tuple[List[str], np.ndarray, int]:
+    """Conteo de un archivo completo leído por bloques, calculado en el pool"""
+    acumulador = AcumuladorTransiciones()
+    registros = 0
+    for etiquetas, origen, destino in leer_bloques_archivo(fuente, formato_entrada, columna_origen, columna_destino):
+        registros += acumulador.agregar_codigos(etiquetas, origen, destino)
+    estados, conteo = acumulador.exportar()
+    return estados, conteo, registros
+
+
+def conteo_parcial_matriz(estados: List[str], matriz_conteo: List[List[int]]) -> Tuple[List[str], np.ndarray, int]:
+    """Conteo parcial enviado como lista de listas, convertido a array en el pool"""
+    conteo = np.array(matriz_conteo, dtype=np.int64)
+    return estados, conteo, int(conteo.sum())
+
+
+class AlmacenSesiones:
+    """Sesiones abiertas en memoria, con expiración por inactividad y límite LRU"""
+    
+    def __init__(self, max_sesiones: int = SESIONES_MAX, ttl: float = SESIONES_TTL_S):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self.sesiones: "OrderedDict[str, Tuple[AcumuladorTransiciones, float]]" = OrderedDict()
+        self.expiradas = 0
+        self.desalojadas = 0
+        self.lock = threading.Lock()
+    
+    def _podar(self, ahora: float) -> None:
+        # Orden LRU: las de uso más antiguo están al principio
+        if self.ttl > 0:
+            while self.sesiones:
+                _, (_, uso) = next(iter(self.sesiones.items()))
+                if ahora - uso <= self.ttl:
+                    break
+                self.sesiones.popitem(last=False)
+                self.expiradas += 1
+        if self.max_sesiones > 0:
+            while len(self.sesiones) > self.max_sesiones:
+                self.sesiones.popitem(last=False)
+                self.desalojadas += 1
+    
+    def crear(self) -> str:
+        sesion_id = uuid.uuid4().hex
+        with self.lock:
+            ahora = time.monotonic()
+            self.sesiones[sesion_id] = (AcumuladorTransiciones(), ahora)
+            self._podar(ahora)
+        return sesion_id
+    
+    def obtener(self, sesion_id: str) -> Optional[AcumuladorTransiciones]:
+        with self.lock:
+            ahora = time.monotonic()
+            self._podar(ahora)
+            entrada = self.sesiones.get(sesion_id)
+            if entrada is None:
+                return None
+            self.sesiones[sesion_id] = (entrada[0], ahora)
+            self.sesiones.move_to_end(sesion_id)
+            return entrada[0]
+    
+    def eliminar(self, sesion_id: str) -> bool:
+        with self.lock:
+            return self.sesiones.pop(sesion_id, None) is not None
+    
+    def estadisticas(self) -> Dict:
+        with self.lock:
+            self._podar(time.monotonic())
+            return {
+                "abiertas": len(self.sesiones),
+                "max_sesiones": self.max_sesiones,
+                "ttl_s": self.ttl,
+                "expiradas": self.expiradas,
+                "desalojadas": self.desalojadas
+            }
+
+
+SESIONES = AlmacenSesiones()
+
+
+def _bloques_columnas(
+    origen: np.ndarray,
+    destino: np.ndarray,
+    etiquetas: Optional[List[str]] = None,
+    desplazamiento: int = 0
+):
+    """Parte columnas en bloques de códigos (etiquetas, origen, destino); desplazamiento numera los registros"""
+    enteros = origen.dtype.kind in "iu" and destino.dtype.kind in "iu"
+    if enteros and etiquetas is None:
+        maximo = int(max(origen.max(initial=-1), destino.max(initial=-1)))
+        etiquetas = [str(i) for i in range(maximo + 1)]
+    
+    for inicio in range(0, len(origen), TAMANO_BLOQUE_ARCHIVO):
+        o = origen[inicio:inicio + TAMANO_BLOQUE_ARCHIVO]
+        d = destino[inicio:inicio + TAMANO_BLOQUE_ARCHIVO]
+        if enteros:
+            if len(o) and (min(o.min(), d.min()) < 0 or max(o.max(), d.max()) >= len(etiquetas)):
+                raise ValueError("Códigos de estado fuera de rango en el archivo")
+            yield etiquetas, o.astype(np.int64), d.astype(np.int64)
+        else:
+            etiquetas_bloque, codigos = factorizar_columnas(o, d, desplazamiento + inicio)
+            yield etiquetas_bloque, codigos[:, 0], codigos[:, 1]
+
+
+def leer_bloques_archivo(
+    archivo,
+    formato: str,
+    columna_origen: str = "origen",
+    columna_destino: str = "destino"
+) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray]]:
+    """Lee transiciones de un archivo columnar por bloques, sin materializar listas Python por registro"""
+    if formato not in FORMATOS_ARCHIVO:
+        raise ValueError(f"Formato desconocido: {formato}. Disponibles: {', '.join(FORMATOS_ARCHIVO)}")
+    
+    if formato == "csv":
+        leidos = 0
+        for bloque in pd.read_csv(archivo, chunksize=TAMANO_BLOQUE_ARCHIVO, dtype=str):
+            if columna_origen in bloque.columns and columna_destino in bloque.columns:
+                bloque = bloque[[columna_origen, columna_destino]]
+            if bloque.shape[1] < 2:
+                raise ValueError("El CSV debe tener columnas de origen y destino")
+            yield from _bloques_columnas(
+                bloque.iloc[:, 0].to_numpy(), bloque.iloc[:, 1].to_numpy(), desplazamiento=leidos
+            )
+            leidos += len(bloque)
+    
+    elif formato == "npy":
+        arreglo = np.load(archivo, allow_pickle=False)
+        if arreglo.ndim != 2 or arreglo.shape[1] != 2:
+            raise ValueError("El archivo .npy debe tener forma (n_registros, 2)")
+        yield from _bloques_columnas(arreglo[:, 0], arreglo[:, 1])
+    
+    elif formato == "npz":
+        with np.load(archivo, allow_pickle=False) as datos:
+            if columna_origen not in datos or columna_destino not in datos:
+                raise ValueError(f"El archivo .npz debe contener '{columna_origen}' y '{columna_destino}'")
+            etiquetas = [str(e) for e in datos["estados"]] if "estados" in datos else None
+            yield from _bloques_columnas(datos[columna_origen], datos[columna_destino], etiquetas)
+    
+    else:
+        if not PYARROW_AVAILABLE:
+            raise ValueError(f"El formato {formato} requiere pyarrow")
+        if formato == "parquet":
+            lotes = pyarrow.parquet.ParquetFile(archivo).iter_batches(
+                batch_size=TAMANO_BLOQUE_ARCHIVO, columns=[columna_origen, columna_destino]
+            )
+        else:
+            try:
+                lector = pa.ipc.open_file(archivo)
+                lotes = (lector.get_batch(i) for i in range(lector.num_record_batches))
+            except pa.ArrowInvalid:
+                archivo.seek(0)
+                lotes = pa.ipc.open_stream(archivo)
+        leidos = 0
+        for lote in lotes:
+            origen = lote.column(columna_origen).to_numpy(zero_copy_only=False)
+            destino = lote.column(columna_destino).to_numpy(zero_copy_only=False)
+            yield from _bloques_columnas(origen, destino, desplazamiento=leidos)
+            leidos += len(origen)
+
+
+def inferir_formato_archivo(nombre: Optional[str], formato: Optional[str]) -> str:
+    if formato:
+        return formato.lower()
+    extension = os.path.splitext(nombre or "")[1].lower().lstrip(".")
+    return {"feather": "arrow", "ipc": "arrow", "pq": "parquet"}.get(extension, extension or "csv")
+
+
+def _extraer_arreglos(valor, ruta: str, arreglos: Dict[str, np.ndarray]):
+    """Sustituye las matrices y vectores numéricos grandes por referencias a arrays del npz"""
+    if isinstance(valor, dict):
+        return {
+            clave: _extraer_arreglos(v, f"{ruta}.{clave}" if ruta else str(clave), arreglos)
+            for clave, v in valor.items()
+        }
+    if isinstance(valor, list) and valor and (isinstance(valor[0], list) or len(valor) >= MIN_ELEMENTOS_BINARIO):
+        try:
+            arreglo = np.asarray(valor)
+        except ValueError:
+            return valor
+        if arreglo.dtype.kind in "biufc" and arreglo.ndim in (1, 2):
+            arreglos[ruta] = arreglo
+            return {"__npz__": ruta}
+    return valor
+
+
+def codificar_respuesta(resultado: Dict, formato: str = "json") -> Tuple[bytes, str]:
+    """Codifica la respuesta: JSON estándar, JSON rápido (orjson) o npz binario para las matrices"""
+    if formato not in FORMATOS_RESPUESTA:
+        raise ValueError(f"Formato de respuesta desconocido: {formato}. Disponibles: {', '.join(FORMATOS_RESPUESTA)}")
+    
+    # Se omite jsonable_encoder: el resultado ya contiene solo tipos JSON nativos
+    if formato == "json" or (formato == "rapido" and not ORJSON_AVAILABLE):
+        contenido = json.dumps(resultado, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+        return contenido.encode("utf-8"), "application/json"
+    
+    if formato == "rapido":
+        return orjson.dumps(resultado, option=orjson.OPT_SERIALIZE_NUMPY), "application/json"
+    
+    arreglos: Dict[str, np.ndarray] = {}
+    metadatos = _extraer_arreglos(resultado, "", arreglos)
+    buffer = io.BytesIO()
+    np.savez(buffer, metadatos=np.array(json.dumps(metadatos)), **arreglos)
+    return buffer.getvalue(), "application/x-npz"
+
+
+def _calcular_codificado(formato: str, funcion: Callable, *args) -> Tuple[bytes, str, Traza]:
+    """Calcula y serializa dentro del worker, para no bloquear el event loop con el JSON"""
+    # Traza propia del worker (hilo o proceso); se devuelve y se combina con la de la solicitud
+    traza = Traza()
+    token = TRAZA.set(traza)
+    try:
+        esperar_secciones_pendientes()
+        with etapa("calculo"):
+            resultado = funcion(*args)
+        with etapa("serializacion"):
+            contenido, tipo = codificar_respuesta(resultado, formato)
+    finally:
+        TRAZA.reset(token)
+    return contenido, tipo, traza
+
+
+def parsear_include(include: Optional[str]) -> Optional[List[str]]:
+    """include=a,b como parámetro de consulta o de formulario"""
+    return None if include is None else [x for x in include.split(",") if x]
+
+
+def obtener_sesion(sesion_id: str) -> AcumuladorTransiciones:
+    sesion = SESIONES.obtener(sesion_id)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada: {sesion_id}")
+    return sesion
+
+
+def estacionario_directo(T: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Resuelve pi (T - I) = 0 con sum(pi) = 1 sustituyendo una ecuación por la normalización"""
+    n = T.shape[0]
+    b = np.zeros(n)
+    b[-1] = 1.0
+    if es_dispersa(T):
+        A = (T.T - identity(n, format='csr')).tocsr()
+        A = vstack([A[:-1], csr_matrix(np.ones((1, n)))]).tocsc()
+        return spsolve(A, b), 0
+    
+    A = T.T - np.eye(n)
+    A[-1, :] = 1.0
+    return np.linalg.solve(A, b), 0
+
+
+def estacionario_gth(T: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Algoritmo de Grassmann-Taksar-Heyman: eliminación sin restas, estable para matrices estocásticas"""
+    P = np.array(a_densa(T), dtype=float)
+    n = P.shape[0]
+    
+    for k in range(n - 1, 0, -1):
+        s = P[k, :k].sum()
+        if s <= 0:
+            raise ValueError("GTH requiere una cadena irreducible")
+        P[:k, k] /= s
+        P[:k, :k] += np.outer(P[:k, k], P[k, :k])
+    
+    pi = np.zeros(n)
+    pi[0] = 1.0
+    for k in range(1, n):
+        pi[k] = pi[:k] @ P[:k, k]
+    return pi / pi.sum(), 0
+
+
+def estacionario_krylov(T: np.ndarray, tolerancia: float, pi_inicial: Optional[np.ndarray]) -> Tuple[np.ndarray, int]:
+    """Autovector dominante de T^T con Arnoldi (ARPACK)"""
+    if not SCIPY_AVAILABLE:
+        raise ValueError("El método krylov requiere scipy")
+    if T.shape[0] < 3:
+        return estacionario_directo(T)
+    
+    _, vectores = eigs(T.T, k=1, which='LM', v0=pi_inicial, tol=tolerancia)
+    pi = np.real(vectores[:, 0])
+    return pi / pi.sum(), 0
+
+
+def estacionario_potencia(
+    T: np.ndarray,
+    tolerancia: float,
+    max_iter: int,
+    pi_inicial: Optional[np.ndarray]
+) -> Tuple[np.ndarray, int]:
+    """Iteración de potencia con arranque en caliente y extrapolación de Aitken vectorial periódica"""
+    n = T.shape[0]
+    pi_actual = np.ones(n) / n if pi_inicial is None else pi_inicial / pi_inicial.sum()
+    historial = deque(maxlen=3)
+    
+    for iteracion in range(max_iter):
+        pi_siguiente = pi_actual @ T
+        residuo = np.abs(pi_siguiente - pi_actual).sum()
+        if residuo < tolerancia:
+            return pi_siguiente, iteracion + 1
+        
+        historial.append(pi_siguiente)
+        if len(historial) == 3 and (iteracion + 1) % PASO_AITKEN == 0:
+            # Aitken vectorial: estima el segundo autovalor y extrapola el modo lento
+            x0, x1, x2 = historial
+            d1 = x1 - x0
+            d2 = x2 - x1
+            denominador = d1 @ d1
+            lambda_2 = (d2 @ d1) / denominador if denominador > 0 else 0.0
+            if 0.0 < lambda_2 < 1.0:
+                extrapolado = np.clip(x2 + d2 * lambda_2 / (1.0 - lambda_2), 0.0, None)
+                extrapolado /= extrapolado.sum()
+                # Solo se acepta la extrapolación si reduce el residuo
+                if np.abs(extrapolado @ T - extrapolado).sum() < residuo:
+                    pi_siguiente = extrapolado
+                    historial.clear()
+        
+        pi_actual = pi_siguiente
+    
+    raise ValueError(f"La iteración de potencia no convergió en {max_iter} iteraciones")
+
+
+def elegir_metodo_estacionario(T: np.ndarray) -> str:
+    """Modo auto: solución directa en tamaños densos moderados, Krylov en matrices grandes y dispersas"""
+    n = T.shape[0]
+    if n <= LIMITE_DENSO_ESTACIONARIO:
+        return "directo"
+    densidad = (T.nnz if es_dispersa(T) else np.count_nonzero(T)) / (n * n)
+    if SCIPY_AVAILABLE and densidad < DENSIDAD_DISPERSA:
+        return "krylov"
+    return "potencia"
+
+
+def calcular_vector_estacionario(
+    matriz_transicion: np.ndarray,
+    tolerancia: float = 1e-10,
+    max_iter: int = 1000,
+    metodo: str = "auto",
+    pi_inicial: Optional[List[float]] = None
+) -> Dict:
+    T = matriz_transicion if es_dispersa(matriz_transicion) else np.array(matriz_transicion, dtype=float)
+    n = T.shape[0]
+    
+    if metodo not in METODOS_ESTACIONARIO:
+        raise ValueError(
+            f"Método desconocido: {metodo}. Disponibles: {', '.join(METODOS_ESTACIONARIO)}"
+        )
+    if pi_inicial is not None:
+        pi_inicial = np.array(pi_inicial, dtype=float)
+        if pi_inicial.shape != (n,) or pi_inicial.sum() <= 0:
+            raise ValueError("El vector inicial debe tener un valor no negativo por estado")
+    
+    solicitado = elegir_metodo_estacionario(T) if metodo == "auto" else metodo
+    # Con varias clases cerradas la solución directa es singular: se conserva el
+    # límite de la iteración de potencia desde el vector inicial
+    if metodo == "auto" and solicitado != "potencia" and n_clases_cerradas(T) > 1:
+        solicitado = "potencia"
+    
+    # Si el método elegido falla (p. ej. cadena reducible) se prueba la iteración de potencia
+    candidatos = [solicitado] + (["potencia"] if solicitado != "potencia" else [])
+    for candidato in candidatos:
+        try:
+            if candidato == "directo":
+                pi, iteraciones = estacionario_directo(T)
+            elif candidato == "gth":
+                pi, iteraciones = estacionario_gth(T)
+            elif candidato == "krylov":
+                pi, iteraciones = estacionario_krylov(T, tolerancia, pi_inicial)
+            else:
+                pi, iteraciones = estacionario_potencia(T, tolerancia, max_iter, pi_inicial)
+        except Exception as e:
+            print(f"Método estacionario {candidato} falló: {e}")
+            continue
+        
+        if not np.all(np.isfinite(pi)) or pi.min() < -RESIDUO_MAXIMO_ESTACIONARIO:
+            continue
+        pi = np.clip(pi, 0.0, None)
+        pi = pi / pi.sum()
+        residuo = float(np.abs(pi @ T - pi).sum())
+        if candidato != "potencia" and residuo > RESIDUO_MAXIMO_ESTACIONARIO:
+            continue
+        
+        return {
+            "vector_estacionario": pi.tolist(),
+            "iteraciones": iteraciones,
+            "convergio": True,
+            "metodo": candidato,
+            "metodo_solicitado": metodo,
+            "residuo": residuo
+        }
+    
+    eigenvalores, eigenvectores = np.linalg.eig(a_densa(T).T)
+    idx = np.argmax(np.real(eigenvalores))
+    pi_eigen = np.real(eigenvectores[:, idx])
+    pi_eigen = pi_eigen / pi_eigen.sum()
+    
+    return {
+        "vector_estacionario": pi_eigen.tolist(),
+        "iteraciones": max_iter,
+        "convergio": False,
+        "metodo": "autovectores",
+        "metodo_solicitado": metodo,
+        "residuo": float(np.abs(pi_eigen @ T - pi_eigen).sum())
+    }
+
+
+def vector_estacionario_cacheado(
+    matriz_transicion,
+    metodo: str = "auto",
+    pi_inicial: Optional[List[float]] = None
+) -> Dict:
+    """calcular_vector_estacionario con la caché de resultados (compartida por /estacionario y /stress)"""
+    clave = huella_contenido(
+        "estacionario", matriz_transicion, {"metodo": metodo, "vector_inicial": pi_inicial}
+    )
+    with etapa("estacionario"):
+        return CACHE.obtener_o_calcular(
+            clave,
+            lambda: calcular_vector_estacionario(matriz_transicion, metodo=metodo, pi_inicial=pi_inicial)
+        )
+
+
+def vectores_estacionarios_lote(T_lote: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """Vectores estacionarios de una pila (k, n, n) con un único solve LAPACK por lotes"""
+    k, n, _ = T_lote.shape
+    
+    # Patrones de ceros distintos (en stress suele haber uno solo) con varias clases cerradas
+    patrones = np.packbits((T_lote > 1e-10).reshape(k, -1), axis=1)
+    reducible_por_patron: Dict[bytes, bool] = {}
+    reducibles = np.zeros(k, dtype=bool)
+    for i in range(k):
+        clave = patrones[i].tobytes()
+        if clave not in reducible_por_patron:
+            reducible_por_patron[clave] = n_clases_cerradas(T_lote[i]) > 1
+        reducibles[i] = reducible_por_patron[clave]
+    
+    A = np.swapaxes(T_lote, 1, 2) - np.eye(n)
+    A[:, -1, :] = 1.0
+    b = np.zeros((k, n, 1))
+    b[:, -1, 0] = 1.0
+    
+    try:
+        with np.errstate(all='ignore'):
+            pis = np.linalg.solve(A, b)[..., 0]
+    except np.linalg.LinAlgError:
+        pis = np.full((k, n), np.nan)
+    
+    # Los escenarios singulares o con residuo alto se resuelven uno a uno
+    residuos = np.abs(np.einsum('ki,kij->kj', pis, T_lote) - pis).sum(axis=1)
+    validos = (
+        ~reducibles
+        & np.isfinite(residuos)
+        & (residuos <= RESIDUO_MAXIMO_ESTACIONARIO)
+        & (pis.min(axis=1) >= -RESIDUO_MAXIMO_ESTACIONARIO)
+    )
+    metodos = ["directo"] * k
+    for i in np.flatnonzero(~validos):
+        resultado = calcular_vector_estacionario(T_lote[i])
+        pis[i] = resultado["vector_estacionario"]
+        metodos[i] = resultado["metodo"]
+    
+    pis = np.clip(pis, 0.0, None)
+    return pis / pis.sum(axis=1, keepdims=True), metodos
+
+
+def identificar_estado_default(estados: List[str]) -> str:
+    """Estado de incumplimiento: el primero de los nombres conocidos o, si no hay, el último estado"""
+    for estado in ["Incobrable", "Default", "Perdida"]:
+        if estado in estados:
+            return estado
+    return estados[-1]
+
+
+def proyectar_pd(matriz_transicion, idx_default: int, horizonte: int) -> np.ndarray:
+    """PD acumulada (H, n) para t = 1..H con el default tratado como absorbente"""
+    # Solo hace falta la columna de default de T^t: se propaga v_t = T v_{t-1},
+    # O(n^2) por horizonte en lugar de una potencia de matriz por horizonte
+    T = matriz_transicion
+    n = T.shape[0]
+    
+    # Una vez en default se permanece en default
+    v = np.zeros(n)
+    v[idx_default] = 1.0
+    acumulada = np.empty((horizonte, n))
+    for t in range(horizonte):
+        v = T @ v
+        v[idx_default] = 1.0
+        acumulada[t] = v
+    return np.clip(acumulada, 0.0, 1.0)
+
+
+def calcular_perdidas_esperadas(
+    matriz_transicion: List[List[float]],
+    estados: List[str],
+    ead: Dict[str, float],
+    lgd: Dict[str, float],
+    horizonte: Optional[int] = None,
+    tasa_descuento: float = 0.0
+) -> Dict:
+    T = matriz_transicion if es_dispersa(matriz_transicion) else np.array(matriz_transicion)
+    n = len(estados)
+    
+    estado_default = identificar_estado_default(estados)
+    idx_default = estados.index(estado_default)
+    
+    pd_por_estado = dict(zip(estados, columna(T, idx_default).tolist()))
+    
+    perdidas_por_estado = {}
+    for estado in estados:
+        ead_valor = ead.get(estado, 0.0)
+        lgd_valor = lgd.get(estado, 0.0)
+        pd_valor = pd_por_estado[estado]
+        
+        perdidas_por_estado[estado] = {
+            "EAD": ead_valor,
+            "PD": pd_valor,
+            "LGD": lgd_valor,
+            "EL": ead_valor * pd_valor * lgd_valor
+        }
+    
+    perdida_total = sum([p["EL"] for p in perdidas_por_estado.values()])
+    
+    resultado = {
+        "perdidas_por_estado": perdidas_por_estado,
+        "perdida_total": perdida_total,
+        "estado_default": estado_default
+    }
+    
+    # Proyección multi-horizonte (pérdida a vida estilo IFRS 9 / CECL)
+    if horizonte is not None:
+        if horizonte < 1:
+            raise ValueError("El horizonte debe ser un entero positivo")
+        if tasa_descuento <= -1.0:
+            raise ValueError("La tasa de descuento debe ser mayor que -1")
+        
+        pd_acumulada = proyectar_pd(T, idx_default, horizonte)
+        pd_marginal = np.diff(pd_acumulada, axis=0, prepend=0.0)
+        
+        exposicion = np.array([ead.get(e, 0.0) * lgd.get(e, 0.0) for e in estados])
+        descuento = (1.0 + tasa_descuento) ** -np.arange(1, horizonte + 1)
+        el_marginal = pd_marginal * exposicion * descuento[:, None]
+        el_acumulada = np.cumsum(el_marginal, axis=0)
+        
+        resultado["proyeccion"] = {
+            "horizontes": list(range(1, horizonte + 1)),
+            "factor_descuento": descuento.tolist(),
+            "pd_marginal": dict(zip(estados, pd_marginal.T.tolist())),
+            "pd_acumulada": dict(zip(estados, pd_acumulada.T.tolist())),
+            "el_marginal": dict(zip(estados, el_marginal.T.tolist())),
+            "el_acumulada": dict(zip(estados, el_acumulada.T.tolist())),
+            "el_total_marginal": el_marginal.sum(axis=1).tolist(),
+            "el_total_acumulada": el_acumulada.sum(axis=1).tolist(),
+            "perdida_vida": float(el_acumulada[-1].sum())
+        }
+    
+    return resultado
+
+
+def calcular_perdidas_cartera(
+    matriz_transicion,
+    estados: List[str],
+    codigos_estado: np.ndarray,
+    ead: np.ndarray,
+    lgd: np.ndarray,
+    segmentos: Optional[List[str]] = None,
+    horizonte: Optional[int] = None,
+    incluir_prestamos: bool = False
+) -> Dict:
+    """EL por préstamo con un gather vectorizado sobre el vector de PD y subtotales por estado y segmento"""
+    T = matriz_transicion if es_dispersa(matriz_transicion) else np.asarray(matriz_transicion, dtype=float)
+    n = len(estados)
+    codigos_estado = np.asarray(codigos_estado, dtype=np.int64)
+    ead = np.asarray(ead, dtype=float)
+    lgd = np.asarray(lgd, dtype=float)
+    
+    n_prestamos = len(codigos_estado)
+    if not (len(ead) == len(lgd) == n_prestamos):
+        raise ValueError("estado, ead y lgd deben tener la misma longitud")
+    if segmentos is not None and len(segmentos) != n_prestamos:
+        raise ValueError("segmento debe tener un valor por préstamo")
+    if n_prestamos and (codigos_estado.min() < 0 or codigos_estado.max() >= n):
+        raise ValueError(f"Los códigos de estado deben estar entre 0 y {n - 1}")
+    
+    estado_default = identificar_estado_default(estados)
+    idx_default = estados.index(estado_default)
+    if horizonte is None:
+        pd_estado = columna(T, idx_default)
+    else:
+        if horizonte < 1:
+            raise ValueError("El horizonte debe ser un entero positivo")
+        pd_estado = proyectar_pd(T, idx_default, horizonte)[-1]
+    
+    # Gather: PD de cada préstamo según su estado actual
+    pd_prestamo = pd_estado[codigos_estado]
+    el = ead * lgd * pd_prestamo
+    
+    el_estado = np.bincount(codigos_estado, weights=el, minlength=n)
+    ead_estado = np.bincount(codigos_estado, weights=ead, minlength=n)
+    prestamos_estado = np.bincount(codigos_estado, minlength=n)
+    
+    resultado = {
+        "estado_default": estado_default,
+        "horizonte": horizonte if horizonte is not None else 1,
+        "n_prestamos": n_prestamos,
+        "ead_total": float(ead.sum()),
+        "perdida_total": float(el.sum()),
+        "pd_por_estado": dict(zip(estados, pd_estado.tolist())),
+        "por_estado": {
+            estado: {
+                "prestamos": int(prestamos_estado[i]),
+                "EAD": float(ead_estado[i]),
+                "EL": float(el_estado[i])
+            }
+            for i, estado in enumerate(estados)
+        }
+    }
+    
+    if segmentos is not None:
+        codigos_segmento, nombres = pd.factorize(np.asarray(segmentos, dtype=object), sort=True)
+        k = len(nombres)
+        el_segmento = np.bincount(codigos_segmento, weights=el, minlength=k)
+        ead_segmento = np.bincount(codigos_segmento, weights=ead, minlength=k)
+        prestamos_segmento = np.bincount(codigos_segmento, minlength=k)
+        resultado["por_segmento"] = {
+            str(nombre): {
+                "prestamos": int(prestamos_segmento[i]),
+                "EAD": float(ead_segmento[i]),
+                "EL": float(el_segmento[i])
+            }
+            for i, nombre in enumerate(nombres)
+        }
+    
+    if incluir_prestamos:
+        resultado["prestamos"] = {"PD": pd_prestamo.tolist(), "EL": el.tolist()}
+    
+    return resultado
+
+
+def tablas_acumuladas(
+    matriz_transicion,
+    idx_default: int,
+    severidad: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Tablas de probabilidad acumulada por fila sobre las entradas no nulas (default absorbente)"""
+    # Cada fila i ocupa el tramo [i, i + 1] de un único arreglo creciente: el siguiente
+    # estado de todos los préstamos sale de un solo searchsorted con clave estado + u.
+    # Dentro de cada fila los destinos van del más severo (default primero) al menos severo,
+    # de modo que un u bajo (shock sistémico malo) lleva hacia el default sea cual sea el
+    # orden alfabético de los estados
+    T = csr_matrix(matriz_transicion) if SCIPY_AVAILABLE else None
+    if T is not None:
+        T = T.tolil()
+        T[idx_default, :] = 0
+        T[idx_default, idx_default] = 1.0
+        T = T.tocsr()
+        T.eliminate_zeros()
+        T.sort_indices()
+        indptr, indices, datos = T.indptr, T.indices, T.data
+    else:
+        densa = np.array(matriz_transicion, dtype=float)
+        densa[idx_default] = 0.0
+        densa[idx_default, idx_default] = 1.0
+        filas, indices = np.nonzero(densa)
+        datos = densa[filas, indices]
+        indptr = np.zeros(densa.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(filas, minlength=densa.shape[0]), out=indptr[1:])
+    
+    n = len(indptr) - 1
+    conteo_fila = np.diff(indptr)
+    if (conteo_fila == 0).any():
+        raise ValueError("Todas las filas de la matriz deben tener alguna transición")
+    fila = np.repeat(np.arange(n), conteo_fila)
+    
+    # Rango de severidad de cada columna: default, luego severidad descendente (empates por índice)
+    clave = np.zeros(n) if severidad is None else -np.asarray(severidad, dtype=float)
+    clave = clave.copy()
+    clave[idx_default] = -np.inf
+    rango = np.empty(n, dtype=np.int64)
+    rango[np.lexsort((np.arange(n), clave))] = np.arange(n)
+    orden = np.lexsort((rango[indices], fila))
+    datos = np.asarray(datos)[orden]
+    indices = np.asarray(indices)[orden]
+    
+    # Suma acumulada por fila, normalizada para que cada fila termine exactamente en 1
+    acumulada = np.cumsum(datos)
+    inicio_fila = np.concatenate(([0.0], acumulada[indptr[1:-1] - 1]))
+    acumulada = acumulada - inicio_fila[fila]
+    totales = acumulada[indptr[1:] - 1]
+    acumulada = acumulada / totales[fila]
+    acumulada[indptr[1:] - 1] = 1.0
+    
+    return fila + acumulada, np.asarray(indices, dtype=np.int64)
+
+
+def limitar_workers(solicitados: Optional[int], maximo: int) -> int:
+    """Workers efectivos de una solicitud: nunca más que la configuración del servidor ni que las CPUs"""
+    return max(1, min(solicitados or maximo, maximo, os.cpu_count() or 1))
+
+
+# Pool de procesos de la simulación, compartido por todas las solicitudes (creación perezosa)
+_POOL_SIMULACION: Optional[ProcessPoolExecutor] = None
+_POOL_SIMULACION_LOCK = threading.Lock()
+
+
+def pool_simulacion(reiniciar: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """Devuelve el pool de simulación; con reiniciar descarta ese pool si está roto"""
+    global _POOL_SIMULACION
+    with _POOL_SIMULACION_LOCK:
+        if reiniciar is not None and _POOL_SIMULACION is reiniciar:
+            _POOL_SIMULACION = None
+            reiniciar.shutdown(wait=False, cancel_futures=True)
+        if _POOL_SIMULACION is None:
+            _POOL_SIMULACION = ProcessPoolExecutor(max_workers=limitar_workers(None, WORKERS_SIMULACION))
+        return _POOL_SIMULACION
+
+
+def _simular_bloque(semillas: List[np.random.SeedSequence], datos: Dict) -> np.ndarray:
+    """Pérdida de cartera de cada simulación del bloque (un flujo RNG independiente por simulación)"""
+    tabla, destinos = datos["tabla"], datos["destinos"]
+    estado_inicial, perdida = datos["estado_inicial"], datos["perdida"]
+    idx_default, pasos, correlacion = datos["idx_default"], datos["pasos"], datos["correlacion"]
+    m = len(estado_inicial)
+    
+    perdidas = np.empty(len(semillas))
+    for k, semilla in enumerate(semillas):
+        rng = np.random.default_rng(semilla)
+        estado = estado_inicial.copy()
+        for _ in range(pasos):
+            if correlacion > 0:
+                # Cópula gaussiana de un factor: mismo shock sistémico para todos los préstamos
+                z = rng.standard_normal()
+                u = ndtr(np.sqrt(correlacion) * z + np.sqrt(1.0 - correlacion) * rng.standard_normal(m))
+                u = np.minimum(u, np.nextafter(1.0, 0.0))
+            else:
+                u = rng.random(m)
+            estado = destinos[np.searchsorted(tabla, estado + u, side='right')]
+        
+        nuevos_default = (estado == idx_default) & (estado_inicial != idx_default)
+        perdidas[k] = perdida[nuevos_default].sum()
+    return perdidas
+
+
+def resumir_perdidas(perdidas: np.ndarray) -> Dict:
+    """Media, cuantiles, VaR y expected shortfall de una muestra de pérdidas"""
+    cuantiles = np.quantile(perdidas, NIVELES_CUANTIL)
+    resumen = {
+        "simulaciones_completadas": int(len(perdidas)),
+        "perdida_media": float(perdidas.mean()),
+        "desviacion": float(perdidas.std()),
+        "cuantiles": {str(nivel): float(q) for nivel, q in zip(NIVELES_CUANTIL, cuantiles)}
+    }
+    for nivel, var in zip(NIVELES_CUANTIL, cuantiles):
+        if nivel >= 0.99:
+            etiqueta = str(nivel).replace("0.", "")
+            resumen[f"VaR_{etiqueta}"] = float(var)
+            resumen[f"ES_{etiqueta}"] = float(perdidas[perdidas >= var].mean())
+    return resumen
+
+
+def simular_perdidas(
+    matriz_transicion,
+    estados: List[str],
+    codigos_estado: np.ndarray,
+    ead: np.ndarray,
+    lgd: np.ndarray,
+    pasos: int = 12,
+    simulaciones: int = 1000,
+    semilla: Optional[int] = None,
+    correlacion: float = 0.0,
+    workers: Optional[int] = None
+):
+    """Generador: simula trayectorias de la cartera en paralelo y emite resúmenes parciales"""
+    n = len(estados)
+    codigos_estado = np.asarray(codigos_estado, dtype=np.int64)
+    ead = np.asarray(ead, dtype=float)
+    lgd = np.asarray(lgd, dtype=float)
+    if not (len(ead) == len(lgd) == len(codigos_estado)):
+        raise ValueError("estado, ead y lgd deben tener la misma longitud")
+    if len(codigos_estado) and (codigos_estado.min() < 0 or codigos_estado.max() >= n):
+        raise ValueError(f"Los códigos de estado deben estar entre 0 y {n - 1}")
+    if pasos < 1 or simulaciones < 1:
+        raise ValueError("pasos y simulaciones deben ser enteros positivos")
+    if not 0.0 <= correlacion < 1.0:
+        raise ValueError("La correlación debe estar en [0, 1)")
+    if correlacion > 0 and not SCIPY_AVAILABLE:
+        raise ValueError("La simulación con correlación requiere scipy")
+    
+    estado_default = identificar_estado_default(estados)
+    idx_default = estados.index(estado_default)
+    # PD al horizonte de cada estado: fija el orden de severidad de las tablas y la EL de referencia
+    pd_horizonte = proyectar_pd(
+        matriz_transicion if es_dispersa(matriz_transicion) else np.asarray(matriz_transicion, dtype=float),
+        idx_default,
+        pasos
+    )[-1]
+    tabla, destinos = tablas_acumuladas(matriz_transicion, idx_default, pd_horizonte)
+    datos = {
+        "tabla": tabla,
+        "destinos": destinos,
+        "estado_inicial": codigos_estado,
+        "perdida": ead * lgd,
+        "idx_default": idx_default,
+        "pasos": pasos,
+        "correlacion": correlacion
+    }
+    
+    # Una semilla hija por simulación: el resultado no depende del número de procesos
+    raiz = np.random.SeedSequence(semilla)
+    semillas = raiz.spawn(simulaciones)
+    workers = min(limitar_workers(workers, WORKERS_SIMULACION), simulaciones)
+    tamano_bloque = max(1, -(-simulaciones // (workers * 4)))
+    bloques = [
+        (inicio, semillas[inicio:inicio + tamano_bloque])
+        for inicio in range(0, simulaciones, tamano_bloque)
+    ]
+    
+    # Pérdida esperada analítica al mismo horizonte, como referencia de validación
+    el_analitica = float((datos["perdida"] * pd_horizonte[codigos_estado])[codigos_estado != idx_default].sum())
+    cabecera = {
+        "estado_default": estado_default,
+        "n_prestamos": int(len(codigos_estado)),
+        "pasos": pasos,
+        "simulaciones": simulaciones,
+        "semilla": raiz.entropy,
+        "workers": workers,
+        "perdida_esperada_analitica": el_analitica
+    }
+    
+    perdidas = np.empty(simulaciones)
+    completadas = np.zeros(simulaciones, dtype=bool)
+    
+    def resumen_parcial(final: bool) -> Dict:
+        return {**cabecera, **resumir_perdidas(perdidas[completadas]), "final": final}
+    
+    if workers == 1:
+        for inicio, bloque in bloques:
+            perdidas[inicio:inicio + len(bloque)] = _simular_bloque(bloque, datos)
+            completadas[inicio:inicio + len(bloque)] = True
+            if not completadas.all():
+                yield resumen_parcial(False)
+    else:
+        # Pool compartido: como mucho `workers` bloques de esta solicitud en vuelo a la vez
+        pool = pool_simulacion()
+        pendientes = iter(bloques)
+        en_vuelo = {}
+        
+        def enviar():
+            for inicio, bloque in pendientes:
+                en_vuelo[pool.submit(_simular_bloque, bloque, datos)] = (inicio, len(bloque))
+                return
+        
+        try:
+            for _ in range(workers):
+                enviar()
+            while en_vuelo:
+                terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    inicio, tamano = en_vuelo.pop(futuro)
+                    perdidas[inicio:inicio + tamano] = futuro.result()
+                    completadas[inicio:inicio + tamano] = True
+                    enviar()
+                    if not completadas.all():
+                        yield resumen_parcial(False)
+        except BrokenExecutor:
+            pool_simulacion(reiniciar=pool)
+            raise RuntimeError("Un proceso de la simulación terminó inesperadamente, reintente")
+    
+    yield resumen_parcial(True)
+
+
+def _potencias_autovalores(
+    T: np.ndarray,
+    horizontes: np.ndarray,
+    filas: Optional[np.ndarray],
+    columnas: Optional[np.ndarray]
+) -> Optional[np.ndarray]:
+    """T^h = V diag(λ^h) V^-1 con una única descomposición; None si V está mal condicionada"""
+    autovalores, V = np.linalg.eig(T)
+    if not np.all(np.isfinite(autovalores)) or np.linalg.cond(V) > CONDICION_MAXIMA_AUTOVECTORES:
+        return None
+    V_inv = np.linalg.inv(V)
+    if np.abs(V @ (autovalores[:, None] * V_inv) - T).max() > 1e-10:
+        return None
+    if np.abs(autovalores.imag).max(initial=0.0) == 0.0:
+        autovalores, V, V_inv = autovalores.real, V.real, V_inv.real
+    
+    # Solo las filas de V y las columnas de V^-1 pedidas: (r x n)(n x c) por horizonte
+    V_f = V if filas is None else V[filas]
+    V_inv_c = V_inv if columnas is None else V_inv[:, columnas]
+    potencias = autovalores[None, :] ** horizontes[:, None]
+    P = (V_f[None, :, :] * potencias[:, None, :]) @ V_inv_c
+    if np.abs(np.imag(P)).max(initial=0.0) > 1e-8:
+        return None
+    return np.real(P)
+
+
+def _potencias_cadena(
+    T,
+    horizontes: np.ndarray,
+    filas: Optional[np.ndarray],
+    columnas: Optional[np.ndarray]
+) -> np.ndarray:
+    """Cadena de sumas: T^{h_k} = T^{h_{k-1}} · T^{Δ}, con T^{Δ} armada a partir de cuadrados sucesivos"""
+    n = T.shape[0]
+    dispersa = es_dispersa(T)
+    cuadrados = [T]  # T^(2^k), compartidos por todos los incrementos
+    
+    def potencia(delta: int):
+        resultado = None
+        k = 0
+        while delta:
+            if k == len(cuadrados):
+                cuadrados.append(cuadrados[-1] @ cuadrados[-1])
+            if delta & 1:
+                resultado = cuadrados[k] if resultado is None else resultado @ cuadrados[k]
+            delta >>= 1
+            k += 1
+        return resultado
+    
+    # Se propaga solo el bloque pedido: filas (X · T^Δ) o columnas (T^Δ · X)
+    por_columnas = columnas is not None and (filas is None or len(columnas) < len(filas))
+    identidad = np.eye(n)
+    if por_columnas:
+        X = identidad[:, columnas]
+    else:
+        X = identidad if filas is None else identidad[filas]
+    
+    incrementos: Dict[int, object] = {}
+    orden = np.argsort(horizontes)
+    salida = np.empty((len(horizontes),) + (
+        (n if filas is None else len(filas)), (n if columnas is None else len(columnas))
+    ))
+    anterior = 0
+    for k in orden:
+        delta = int(horizontes[k]) - anterior
+        if delta > 0:
+            if dispersa:
+                # Elevar al cuadrado una CSR la densifica: se propaga con Δ productos dispersos
+                for _ in range(delta):
+                    X = T @ X if por_columnas else (T.T @ X.T).T
+            else:
+                if delta not in incrementos:
+                    incrementos[delta] = potencia(delta)
+                X = incrementos[delta] @ X if por_columnas else X @ incrementos[delta]
+        anterior = int(horizontes[k])
+        bloque = X
+        if por_columnas and filas is not None:
+            bloque = X[filas]
+        elif not por_columnas and columnas is not None:
+            bloque = X[:, columnas]
+        salida[k] = bloque
+    return salida
+
+
+def _costo_cadena(n: int, horizontes: np.ndarray, filas, columnas) -> float:
+    """Flops aproximados de la cadena: cuadrados e incrementos (n^3) más la propagación del bloque"""
+    deltas = set(np.diff(np.sort(horizontes), prepend=0).tolist()) - {0}
+    bloque = min([n] + [len(x) for x in (filas, columnas) if x is not None])
+    return (int(max(deltas, default=1)).bit_length() + len(deltas)) * n ** 3 + len(horizontes) * bloque * n * n
+
+
+def _indices_estados(seleccion: Optional[List[Union[int, str]]], estados: Optional[List[str]], n: int) -> Optional[np.ndarray]:
+    if seleccion is None:
+        return None
+    indices = []
+    for valor in seleccion:
+        if isinstance(valor, str):
+            if estados is None or valor not in estados:
+                raise ValueError(f"Estado desconocido: {valor}")
+            indices.append(estados.index(valor))
+        else:
+            if not 0 <= valor < n:
+                raise ValueError(f"Índice de estado fuera de rango: {valor}")
+            indices.append(valor)
+    return np.array(indices, dtype=np.int64)
+
+
+def potencias_matriz(
+    matriz,
+    horizontes: List[int],
+    filas: Optional[np.ndarray] = None,
+    columnas: Optional[np.ndarray] = None,
+    metodo: str = "auto"
+) -> Tuple[np.ndarray, str]:
+    """Pila (h, filas, columnas) de T^h para cada horizonte y el método usado"""
+    if metodo not in METODOS_POTENCIA:
+        raise ValueError(f"Método desconocido: {metodo}. Disponibles: {', '.join(METODOS_POTENCIA)}")
+    h = np.asarray(horizontes, dtype=np.int64)
+    if h.ndim != 1 or len(h) == 0 or np.any(h < 0) or np.any(h > MAX_HORIZONTE_POTENCIA):
+        raise ValueError(f"Los horizontes deben ser enteros entre 0 y {MAX_HORIZONTE_POTENCIA}")
+    
+    if es_dispersa(matriz):
+        if filas is not None or columnas is not None:
+            return np.clip(_potencias_cadena(matriz, h, filas, columnas), 0.0, 1.0), "cadena"
+        if matriz.shape[0] > LIMITE_DENSO_ALGEBRA:
+            raise ValueError(
+                f"Las potencias completas requieren una matriz de hasta {LIMITE_DENSO_ALGEBRA} estados; "
+                f"restrinja filas o columnas"
+            )
+    T = a_densa(matriz)
+    
+    n = T.shape[0]
+    r = n if filas is None else len(filas)
+    c = n if columnas is None else len(columnas)
+    if metodo == "auto" and _costo_cadena(n, h, filas, columnas) <= COSTO_RELATIVO_EIG * n ** 3 + len(h) * r * n * c:
+        metodo = "cadena"
+    if metodo in ("auto", "autovalores"):
+        P = _potencias_autovalores(T, h.astype(float), filas, columnas)
+        if P is not None:
+            return np.clip(P, 0.0, 1.0), "autovalores"
+        if metodo == "autovalores":
+            raise ValueError("La matriz no es diagonalizable de forma estable; use metodo='cadena'")
+    return np.clip(_potencias_cadena(T, h, filas, columnas), 0.0, 1.0), "cadena"
+
+
+def resolver_potencias(request: "PotenciasRequest") -> Dict:
+    matriz, estados = matriz_y_estados(request.matriz_transicion, request.model_id, request.estados, False)
+    n = matriz.shape[0]
+    registrar_tamano("estados", n)
+    if estados is not None and len(estados) != n:
+        raise ValueError("El número de estados no coincide con la dimensión de la matriz")
+    filas = _indices_estados(request.filas, estados, n)
+    columnas = _indices_estados(request.columnas, estados, n)
+    
+    with etapa("potencias"):
+        P, metodo = CACHE.obtener_o_calcular(
+            huella_contenido(
+                "potencias", matriz, request.horizontes,
+                [None if filas is None else filas.tolist(), None if columnas is None else columnas.tolist()],
+                request.metodo
+            ),
+            lambda: potencias_matriz(matriz, request.horizontes, filas, columnas, request.metodo)
+        )
+    return {
+        "metodo": metodo,
+        "horizontes": request.horizontes,
+        "filas": list(range(n)) if filas is None else filas.tolist(),
+        "columnas": list(range(n)) if columnas is None else columnas.tolist(),
+        "potencias": P.tolist()
+    }
+
+
+def calcular_propiedades_algebra_lineal(
+    matriz: np.ndarray,
+    horizontes: Tuple[int, ...] = HORIZONTES_ALGEBRA,
+    destino: Optional[Dict] = None
+) -> Dict:
+    """Calcula propiedades de álgebra lineal de la matriz de transición"""
+    if es_dispersa(matriz) and matriz.shape[0] > LIMITE_DENSO_ALGEBRA:
+        raise ValueError(
+            f"Las propiedades de álgebra lineal requieren una matriz densa de hasta "
+            f"{LIMITE_DENSO_ALGEBRA} estados"
+        )
+    T = a_densa(matriz)
+    n = T.shape[0]
+    
+    # destino se rellena a medida que avanza el cálculo (permite devolver una sección parcial)
+    propiedades = {} if destino is None else destino
+    
+    # Determinante
+    try:
+        propiedades["determinante"] = float(np.linalg.det(T))
+    except:
+        propiedades["determinante"] = None
+    
+    # Traza
+    propiedades["traza"] = float(np.trace(T))
+    
+    # Valores propios (eigenvalues) y vectores propios (eigenvectors)
+    try:
+        with etapa("algebra.eig"):
+            eigenvalores, eigenvectores = np.linalg.eig(T)
+        # Ordenar por valor absoluto descendente
+        idx = np.argsort(np.abs(eigenvalores))[::-1]
+        eigenvalores = eigenvalores[idx]
+        eigenvectores = eigenvectores[:, idx]
+        
+        propiedades["eigenvalores"] = {
+            "valores": eigenvalores.tolist(),
+            "valores_reales": np.real(eigenvalores).tolist(),
+            "valores_imaginarios": np.imag(eigenvalores).tolist(),
+            "modulos": np.abs(eigenvalores).tolist(),
+            "dominante": float(eigenvalores[0]) if len(eigenvalores) > 0 else None
+        }
+        
+        propiedades["eigenvectores"] = {
+            "vectores": np.real(eigenvectores).tolist(),
+            "vector_dominante": np.real(eigenvectores[:, 0]).tolist() if eigenvectores.shape[1] > 0 else None
+        }
+    except Exception as e:
+        propiedades["eigenvalores"] = {"error": str(e)}
+        propiedades["eigenvectores"] = {"error": str(e)}
+    
+    # Un único SVD compartido por rango, norma espectral, número de condición y SVD
+    try:
+        with etapa("algebra.svd"):
+            s = np.linalg.svd(T, compute_uv=False)
+        svd_error = None
+    except Exception as e:
+        s = None
+        svd_error = str(e)
+    
+    # Rango (misma tolerancia que np.linalg.matrix_rank)
+    if s is not None and len(s) > 0:
+        tolerancia_rango = s.max() * max(T.shape) * np.finfo(s.dtype).eps
+        propiedades["rango"] = int(np.count_nonzero(s > tolerancia_rango))
+    else:
+        propiedades["rango"] = None
+    
+    # Normas
+    propiedades["normas"] = {
+        "frobenius": float(np.linalg.norm(T, 'fro')),
+        "espectral": float(s[0]) if s is not None and n > 0 else None,
+        "infinito": float(np.linalg.norm(T, np.inf)),
+        "uno": float(np.linalg.norm(T, 1))
+    }
+    
+    # Número de condición (norma 2: cociente de valores singulares extremos)
+    if s is not None and len(s) > 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            propiedades["numero_condicion"] = float(s[0] / s[-1])
+    else:
+        propiedades["numero_condicion"] = None
+    
+    # Descomposición SVD
+    if s is not None:
+        propiedades["svd"] = {
+            "valores_singulares": s.tolist(),
+            "valor_singular_maximo": float(s[0]) if len(s) > 0 else None,
+            "valor_singular_minimo": float(s[-1]) if len(s) > 0 else None
+        }
+    else:
+        propiedades["svd"] = {"error": svd_error}
+    
+    # Potencias de la matriz (por defecto T^2, T^3, T^5, T^10) con una cadena de productos compartida
+    try:
+        with etapa("algebra.potencias"):
+            P, _ = potencias_matriz(T, list(horizontes), metodo="cadena")
+        propiedades["potencias"] = {f"T{h}": P_h.tolist() for h, P_h in zip(horizontes, P)}
+    except Exception as e:
+        propiedades["potencias"] = {"error": str(e)}
+    
+    return propiedades
+
+
+def adyacencia_transiciones(matriz: np.ndarray, umbral: float = 1e-10) -> Tuple[np.ndarray, np.ndarray]:
+    """Grafo de transiciones no nulas de T en formato CSR (indptr, indices)"""
+    if es_dispersa(matriz):
+        T = matriz.tocsr()
+        filas = np.repeat(np.arange(T.shape[0]), np.diff(T.indptr))
+        mascara = T.data > umbral
+        T = csr_matrix(
+            (T.data[mascara], (filas[mascara], T.indices[mascara])), shape=T.shape
+        )
+        T.sort_indices()
+        return T.indptr.astype(np.int64), T.indices.astype(np.int64)
+    
+    T = np.asarray(matriz)
+    n = T.shape[0]
+    filas, columnas = np.nonzero(T > umbral)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(filas, minlength=n), out=indptr[1:])
+    return indptr, columnas.astype(np.int64)
+
+
+def componentes_fuertes(grafo: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """Etiqueta las componentes fuertemente conexas (Tarjan, lineal en aristas)"""
+    indptr, indices = grafo
+    n = len(indptr) - 1
+    
+    if SCIPY_AVAILABLE:
+        adyacencia = csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n)
+        )
+        _, etiquetas = connected_components(adyacencia, directed=True, connection='strong')
+        return etiquetas.astype(np.int64)
+    
+    # Tarjan iterativo (sin recursión para no agotar la pila con n grande)
+    etiquetas = np.full(n, -1, dtype=np.int64)
+    orden = np.full(n, -1, dtype=np.int64)
+    bajo = np.zeros(n, dtype=np.int64)
+    en_pila = np.zeros(n, dtype=bool)
+    pila = []
+    contador = 0
+    n_componentes = 0
+    
+    for raiz in range(n):
+        if orden[raiz] >= 0:
+            continue
+        llamadas = [(raiz, indptr[raiz])]
+        orden[raiz] = bajo[raiz] = contador
+        contador += 1
+        pila.append(raiz)
+        en_pila[raiz] = True
+        
+        while llamadas:
+            v, k = llamadas[-1]
+            if k < indptr[v + 1]:
+                llamadas[-1] = (v, k + 1)
+                w = indices[k]
+                if orden[w] < 0:
+                    orden[w] = bajo[w] = contador
+                    contador += 1
+                    pila.append(w)
+                    en_pila[w] = True
+                    llamadas.append((w, indptr[w]))
+                elif en_pila[w]:
+                    bajo[v] = min(bajo[v], orden[w])
+                continue
+            
+            llamadas.pop()
+            if llamadas:
+                padre = llamadas[-1][0]
+                bajo[padre] = min(bajo[padre], bajo[v])
+            if bajo[v] == orden[v]:
+                while True:
+                    w = pila.pop()
+                    en_pila[w] = False
+                    etiquetas[w] = n_componentes
+                    if w == v:
+                        break
+                n_componentes += 1
+    
+    return etiquetas
+
+
+def analizar_clases_comunicantes(
+    grafo: Tuple[np.ndarray, np.ndarray],
+    etiquetas: np.ndarray
+) -> Tuple[List[Dict], np.ndarray]:
+    """Clases comunicantes con indicador de clase cerrada y periodo (mcd de niveles BFS)"""
+    indptr, indices = grafo
+    n = len(indptr) - 1
+    origen = np.repeat(np.arange(n), np.diff(indptr))
+    interna = etiquetas[origen] == etiquetas[indices]
+    
+    # Una clase es abierta si alguna arista sale de ella
+    n_clases = int(etiquetas.max()) + 1 if n > 0 else 0
+    abiertas = np.zeros(n_clases, dtype=bool)
+    abiertas[etiquetas[origen[~interna]]] = True
+    
+    # BFS dentro de cada clase desde su primer estado para asignar niveles
+    nivel = np.full(n, -1, dtype=np.int64)
+    primer_estado = np.full(n_clases, n, dtype=np.int64)
+    np.minimum.at(primer_estado, etiquetas, np.arange(n))
+    for raiz in primer_estado:
+        nivel[raiz] = 0
+        cola = deque([raiz])
+        while cola:
+            v = cola.popleft()
+            for w in indices[indptr[v]:indptr[v + 1]]:
+                if nivel[w] < 0 and etiquetas[w] == etiquetas[v]:
+                    nivel[w] = nivel[v] + 1
+                    cola.append(w)
+    
+    # Periodo: mcd de nivel(u) + 1 - nivel(v) sobre las aristas internas u -> v
+    periodos = np.zeros(n_clases, dtype=np.int64)
+    desfase = np.abs(nivel[origen[interna]] + 1 - nivel[indices[interna]])
+    np.gcd.at(periodos, etiquetas[origen[interna]], desfase)
+    tiene_ciclo = np.zeros(n_clases, dtype=bool)
+    tiene_ciclo[etiquetas[origen[interna]]] = True
+    
+    miembros = np.argsort(etiquetas, kind='stable')
+    cortes = np.cumsum(np.bincount(etiquetas, minlength=n_clases))[:-1]
+    clases = []
+    for c, indices_clase in zip(range(n_clases), np.split(miembros, cortes)):
+        clases.append({
+            "indices": indices_clase.tolist(),
+            "cerrada": not bool(abiertas[c]),
+            "periodo": int(periodos[c]) if tiene_ciclo[c] else 0
+        })
+    
+    # Orden estable: por el primer estado de cada clase
+    orden_clases = np.argsort(primer_estado, kind='stable')
+    clases = [clases[c] for c in orden_clases]
+    reetiquetado = np.empty(n_clases, dtype=np.int64)
+    reetiquetado[orden_clases] = np.arange(n_clases)
+    
+    return clases, reetiquetado[etiquetas]
+
+
+def n_clases_cerradas(matriz) -> int:
+    """Número de clases comunicantes cerradas (más de una => distribución estacionaria no única)"""
+    grafo = adyacencia_transiciones(matriz)
+    indptr, indices = grafo
+    etiquetas = componentes_fuertes(grafo)
+    if len(etiquetas) == 0:
+        return 0
+    origen = np.repeat(np.arange(len(etiquetas)), np.diff(indptr))
+    salientes = etiquetas[origen] != etiquetas[indices]
+    return int(etiquetas.max()) + 1 - len(np.unique(etiquetas[origen[salientes]]))
+
+
+def cierre_alcanzabilidad(grafo: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """Cierre reflexivo-transitivo del grafo: R[i, j] si j es alcanzable desde i (por cuadrados sucesivos)"""
+    indptr, indices = grafo
+    n = len(indptr) - 1
+    R = np.eye(n, dtype=np.float32)
+    R[np.repeat(np.arange(n), np.diff(indptr)), indices] = 1.0
+    for _ in range(max(1, int(np.ceil(np.log2(max(n, 2)))))):
+        siguiente = ((R @ R) > 0).astype(np.float32)
+        if np.array_equal(siguiente, R):
+            break
+        R = siguiente
+    return R > 0
+
+
+def analizar_propiedades_markov(matriz: np.ndarray, estados: List[str], destino: Optional[Dict] = None) -> Dict:
+    """Analiza propiedades específicas de cadenas de Markov"""
+    T = matriz if es_dispersa(matriz) else np.array(matriz)
+    n = T.shape[0]
+    
+    propiedades = {} if destino is None else destino
+    
+    # Verificar si es estocástica (cada fila suma 1)
+    sumas_filas = sumar_filas(T)
+    propiedades["es_estocastica"] = bool(np.allclose(sumas_filas, 1.0, atol=1e-6))
+    propiedades["sumas_filas"] = sumas_filas.tolist()
+    propiedades["desviacion_estocastica"] = float(np.max(np.abs(sumas_filas - 1.0)))
+    
+    # Verificar si es doblemente estocástica (filas y columnas suman 1)
+    sumas_columnas = np.asarray(T.sum(axis=0)).ravel()
+    propiedades["es_doblemente_estocastica"] = bool(
+        np.allclose(sumas_filas, 1.0, atol=1e-6) and 
+        np.allclose(sumas_columnas, 1.0, atol=1e-6)
+    )
+    
+    # Clases comunicantes: componentes fuertemente conexas del grafo de T
+    grafo = adyacencia_transiciones(T)
+    clases, etiquetas = analizar_clases_comunicantes(grafo, componentes_fuertes(grafo))
+    
+    propiedades["es_irreducible"] = len(clases) == 1
+    propiedades["n_clases"] = len(clases)
+    propiedades["clases_comunicantes"] = [
+        {
+            "estados": [estados[i] for i in clase["indices"]],
+            "cerrada": clase["cerrada"],
+            "periodo": clase["periodo"]
+        }
+        for clase in clases
+    ]
+    if n <= LIMITE_MATRIZ_COMUNICACION:
+        # matriz_comunicacion[i][j]: j es alcanzable desde i; matriz_misma_clase: i y j se comunican
+        propiedades["matriz_comunicacion"] = cierre_alcanzabilidad(grafo).tolist()
+        propiedades["matriz_misma_clase"] = (etiquetas[:, None] == etiquetas[None, :]).tolist()
+    else:
+        propiedades["matriz_comunicacion"] = None
+        propiedades["matriz_misma_clase"] = None
+    
+    # Periodo de cada estado = periodo de su clase (0 si no puede volver a sí mismo)
+    periodo_clase = np.array([clase["periodo"] for clase in clases], dtype=np.int64)
+    periodos = periodo_clase[etiquetas].tolist()
+    
+    propiedades["periodos_estados"] = periodos
     propiedades["es_aperiodica"] = bool(all(p == 1 or p == 0 for p in periodos))
     
     # Verificar si es ergódica (irreducible y aperiódica)
     propiedades["es_ergodica"] = propiedades["es_irreducible"] and propiedades["es_aperiodica"]
     
-    # Estados absorbentes (probabilidad de quedarse = 1)
-    estados_absorbentes = []
-    for i in range(n):
-        if T[i, i] >= 1.0 - 1e-6:
-            estados_absorbentes.append(i)
-    propiedades["estados_absorbentes"] = [estados[i] for i in estados_absorbentes]
-    propiedades["tiene_estados_absorbentes"] = len(estados_absorbentes) > 0
+    # Estados absorbentes (probabilidad de quedarse = 1)
+    estados_absorbentes = np.flatnonzero(T.diagonal() >= 1.0 - 1e-6).tolist()
+    propiedades["estados_absorbentes"] = [estados[i] for i in estados_absorbentes]
+    propiedades["tiene_estados_absorbentes"] = len(estados_absorbentes) > 0
+    
+    return propiedades
+
+
+def alcanzables_hacia(grafo: Tuple[np.ndarray, np.ndarray], destinos: np.ndarray) -> np.ndarray:
+    """Estados desde los que se alcanza algún destino (un único BFS sobre el grafo inverso)"""
+    indptr, indices = grafo
+    n = len(indptr) - 1
+    origen = np.repeat(np.arange(n), np.diff(indptr))
+    
+    # Grafo inverso en CSR: predecesores de cada estado
+    orden = np.argsort(indices, kind='stable')
+    predecesores = origen[orden]
+    indptr_inv = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n), out=indptr_inv[1:])
+    
+    alcanza = np.zeros(n, dtype=bool)
+    alcanza[destinos] = True
+    cola = deque(destinos.tolist())
+    while cola:
+        v = cola.popleft()
+        for u in predecesores[indptr_inv[v]:indptr_inv[v + 1]]:
+            if not alcanza[u]:
+                alcanza[u] = True
+                cola.append(u)
+    return alcanza
+
+
+def analizar_absorcion(T: np.ndarray, transitorios: np.ndarray, absorbentes: np.ndarray) -> Dict:
+    """Tiempos medios, varianzas y probabilidades de absorción con una única factorización LU de I - Q"""
+    if es_dispersa(T):
+        # LU dispersa (SuperLU) de I - Q; B tiene solo tantas columnas como absorbentes
+        filas = T[transitorios]
+        A = (identity(len(transitorios), format='csc') - filas[:, transitorios]).tocsc()
+        R = filas[:, absorbentes].toarray()
+        factorizacion = splu(A)
+        resolver = factorizacion.solve
+    elif SCIPY_AVAILABLE:
+        Q = T[np.ix_(transitorios, transitorios)]
+        R = T[np.ix_(transitorios, absorbentes)]
+        A = np.eye(len(transitorios)) - Q
+
+        factorizacion = linalg.lu_factor(A)
+        resolver = lambda b: linalg.lu_solve(factorizacion, b)
+    else:
+        Q = T[np.ix_(transitorios, transitorios)]
+        R = T[np.ix_(transitorios, absorbentes)]
+        A = np.eye(len(transitorios)) - Q
+        resolver = lambda b: np.linalg.solve(A, b)
+    
+    # N = (I - Q)^-1 sin invertir: t = N·1, B = N·R, Var = (2N - I)t - t²
+    t = resolver(np.ones(len(transitorios)))
+    B = resolver(R)
+    varianza = 2 * resolver(t) - t - t * t
+    
+    return {"tiempos": t, "varianzas": varianza, "probabilidades": B}
+
+
+def clasificar_estados(matriz: np.ndarray, estados: List[str], destino: Optional[Dict] = None) -> Dict:
+    """Clasifica los estados de la cadena de Markov"""
+    T = matriz if es_dispersa(matriz) else np.array(matriz)
+    n = T.shape[0]
+    
+    clasificacion = {} if destino is None else destino
+    
+    # Estados absorbentes
+    indices_absorbentes = np.flatnonzero(T.diagonal() >= 1.0 - 1e-6)
+    absorbentes = [
+        {
+            "indice": int(i),
+            "estado": estados[i],
+            "probabilidad_absorcion": float(T[i, i])
+        }
+        for i in indices_absorbentes
+    ]
+    clasificacion["absorbentes"] = absorbentes
+    
+    # Estados transitorios (no absorbentes que pueden llegar a absorbentes):
+    # un solo recorrido hacia atrás desde el conjunto absorbente
+    alcanza = alcanzables_hacia(adyacencia_transiciones(T), indices_absorbentes)
+    no_absorbente = np.ones(n, dtype=bool)
+    no_absorbente[indices_absorbentes] = False
+    indices_transitorios = np.flatnonzero(no_absorbente & alcanza)
+    indices_recurrentes = np.flatnonzero(no_absorbente & ~alcanza)
+    
+    transitorios = [{"indice": int(i), "estado": estados[i]} for i in indices_transitorios]
+    recurrentes = [{"indice": int(i), "estado": estados[i]} for i in indices_recurrentes]
+    
+    clasificacion["transitorios"] = transitorios
+    clasificacion["recurrentes"] = recurrentes
+    
+    # Tiempo medio de absorción, varianza y probabilidades B = N·R (para estados transitorios)
+    if absorbentes and transitorios:
+        try:
+            absorcion = analizar_absorcion(T, indices_transitorios, indices_absorbentes)
+            nombres_absorbentes = [estados[i] for i in indices_absorbentes]
+            
+            for idx, t in enumerate(transitorios):
+                t["tiempo_medio_absorcion"] = float(absorcion["tiempos"][idx])
+                t["varianza_tiempo_absorcion"] = float(absorcion["varianzas"][idx])
+                t["probabilidades_absorcion"] = dict(
+                    zip(nombres_absorbentes, absorcion["probabilidades"][idx].tolist())
+                )
+            
+            clasificacion["matriz_absorcion"] = {
+                "filas": [t["estado"] for t in transitorios],
+                "columnas": nombres_absorbentes,
+                "valores": absorcion["probabilidades"].tolist()
+            }
+        except Exception as e:
+            print(f"Error calculando la matriz fundamental: {e}")
+    
+    return clasificacion
+
+
+def indices_stress(estados: List[str]) -> Tuple[Optional[int], Optional[int]]:
+    """Índices de los estados moroso e incobrable a los que se aplican los factores"""
+    idx_moroso = None
+    idx_incobrable = None
+    
+    for i, estado in enumerate(estados):
+        if "Moroso" in estado or "moroso" in estado.lower():
+            idx_moroso = i
+        if "Incobrable" in estado or "incobrable" in estado.lower() or "Default" in estado:
+            idx_incobrable = i
+    
+    return idx_moroso, idx_incobrable
+
+
+def factores_stress(
+    n: int,
+    indices: Tuple[Optional[int], Optional[int]],
+    factor_moroso: np.ndarray,
+    factor_incobrable: np.ndarray
+) -> np.ndarray:
+    """Multiplicadores por columna (k, n) para k pares de factores"""
+    idx_moroso, idx_incobrable = indices
+    factor_moroso = np.atleast_1d(np.asarray(factor_moroso, dtype=float))
+    factor_incobrable = np.atleast_1d(np.asarray(factor_incobrable, dtype=float))
+    
+    factores = np.ones((len(factor_moroso), n))
+    if idx_moroso is not None:
+        factores[:, idx_moroso] *= factor_moroso
+    if idx_incobrable is not None:
+        factores[:, idx_incobrable] *= factor_incobrable
+    return factores
+
+
+def estresar_matriz(T, estados: List[str], factor_moroso: float, factor_incobrable: float):
+    """Escala las columnas de moroso e incobrable y renormaliza las filas (densa o CSR)"""
+    n = len(estados)
+    factores = factores_stress(n, indices_stress(estados), factor_moroso, factor_incobrable)[0]
+    
+    if es_dispersa(T):
+        T_stress = T @ diags(factores)
+    else:
+        T_stress = np.asarray(T) * factores
+    sumas = sumar_filas(T_stress)
+    escala = np.ones(n)
+    escala[sumas > 0] = 1.0 / sumas[sumas > 0]
+    return (diags(escala) @ T_stress).tocsr() if es_dispersa(T) else T_stress * escala[:, None]
+
+
+def aplicar_stress(
+    matriz_base: List[List[float]],
+    estados: List[str],
+    factor_moroso: float = 1.2,
+    factor_incobrable: float = 1.3
+) -> Dict:
+    T = matriz_base if es_dispersa(matriz_base) else np.array(matriz_base)
+    T_stress = estresar_matriz(T, estados, factor_moroso, factor_incobrable)
+    
+    pi_base = vector_estacionario_cacheado(T)["vector_estacionario"]
+    pi_stress = calcular_vector_estacionario(T_stress)["vector_estacionario"]
+    
+    return {
+        "matriz_stress": matriz_a_json(T_stress),
+        "vector_estacionario_base": pi_base,
+        "vector_estacionario_stress": pi_stress,
+        "cambios": {
+            "factor_moroso": factor_moroso,
+            "factor_incobrable": factor_incobrable
+        }
+    }
+
+
+def aplicar_stress_lote(
+    matriz_base,
+    estados: List[str],
+    escenarios: List[Tuple[float, float]],
+    incluir_matrices: bool = False
+) -> Dict:
+    """Aplica muchos pares de factores: matrices apiladas (k, n, n) y solve estacionario por lotes"""
+    if not escenarios:
+        raise ValueError("Se requiere al menos un escenario de stress")
+    
+    n = len(estados)
+    indices = indices_stress(estados)
+    idx_moroso, idx_incobrable = indices
+    fm, fi = (np.array(columna, dtype=float) for columna in zip(*escenarios))
+    factores = factores_stress(n, indices, fm, fi)
+    
+    # El vector base no depende del escenario: se calcula una sola vez
+    base = vector_estacionario_cacheado(matriz_base)
+    pi_base = np.array(base["vector_estacionario"])
+    
+    if es_dispersa(matriz_base):
+        # Sin pila densa en modo disperso: un solve disperso por escenario
+        pis, metodos, matrices = [], [], []
+        for fm_k, fi_k in escenarios:
+            resultado = aplicar_stress(matriz_base, estados, fm_k, fi_k)
+            pis.append(resultado["vector_estacionario_stress"])
+            metodos.append("disperso")
+            matrices.append(resultado["matriz_stress"])
+        pis = np.array(pis)
+    else:
+        T = np.asarray(matriz_base, dtype=float)
+        bloque = max(1, ELEMENTOS_BLOQUE_STRESS // max(n * n, 1))
+        pis, metodos, matrices = [], [], []
+        for inicio in range(0, len(escenarios), bloque):
+            # (k, n, n): escalado de columnas y renormalización de filas vectorizados
+            T_lote = T[None, :, :] * factores[inicio:inicio + bloque, None, :]
+            sumas = T_lote.sum(axis=2, keepdims=True)
+            np.divide(T_lote, sumas, out=T_lote, where=sumas > 0)
+            
+            pis_bloque, metodos_bloque = vectores_estacionarios_lote(T_lote)
+            pis.append(pis_bloque)
+            metodos.extend(metodos_bloque)
+            if incluir_matrices:
+                matrices.extend(T_lote.tolist())
+        pis = np.vstack(pis)
+    
+    masa = lambda v, idx: v[..., idx] if idx is not None else np.zeros(v.shape[:-1])
+    masa_morosa = masa(pis, idx_moroso)
+    masa_incobrable = masa(pis, idx_incobrable)
+    
+    tabla = [
+        {
+            "factor_moroso": float(fm[k]),
+            "factor_incobrable": float(fi[k]),
+            "vector_estacionario_stress": pis[k].tolist(),
+            "masa_morosa": float(masa_morosa[k]),
+            "masa_incobrable": float(masa_incobrable[k]),
+            "delta_masa_incobrable": float(masa_incobrable[k] - masa(pi_base, idx_incobrable)),
+            "metodo": metodos[k]
+        }
+        for k in range(len(escenarios))
+    ]
+    if incluir_matrices:
+        for fila, matriz in zip(tabla, matrices):
+            fila["matriz_stress"] = matriz
+    
+    return {
+        "vector_estacionario_base": base["vector_estacionario"],
+        "n_escenarios": len(escenarios),
+        "escenarios": tabla
+    }
+
+
+class FactorizacionGrupo:
+    """Inversa de grupo A# de A = I - T aplicada con una única LU, sin formarla explícitamente"""
+    
+    def __init__(self, T, pi: np.ndarray):
+        n = T.shape[0]
+        self.pi = pi
+        # M = (I - T)^T con la última ecuación sustituida por sum(y) = 0; M^T sirve para las columnas
+        if es_dispersa(T):
+            A = (identity(n, format='csr') - T.T).tocsr()
+            M = vstack([A[:-1], csr_matrix(np.ones((1, n)))]).tocsc()
+            factorizacion = splu(M)
+            self._resolver = lambda b, trans: factorizacion.solve(b, trans="T" if trans else "N")
+        else:
+            M = np.eye(n) - a_densa(T).T
+            M[-1, :] = 1.0
+            if SCIPY_AVAILABLE:
+                factorizacion = linalg.lu_factor(M)
+                self._resolver = lambda b, trans: linalg.lu_solve(factorizacion, b, trans=int(trans))
+            else:
+                self._resolver = lambda b, trans: np.linalg.solve(M.T if trans else M, b)
+    
+    def filas(self, r: np.ndarray) -> np.ndarray:
+        """r A#: y (I - T) = r - (r·1) pi con y·1 = 0"""
+        r0 = r - r.sum() * self.pi
+        b = r0.copy()
+        b[-1] = 0.0
+        return self._resolver(b, False)
+    
+    def columnas(self, c: np.ndarray) -> np.ndarray:
+        """A# c: (I - T) x = c - (pi·c) 1 con pi·x = 0"""
+        z = self._resolver(c - self.pi @ c, True)
+        z[-1] = 0.0
+        return z - self.pi @ z
+
+
+FACTORIZACIONES_GRUPO: "OrderedDict[str, FactorizacionGrupo]" = OrderedDict()
+LOCK_FACTORIZACIONES = threading.Lock()
+
+
+def factorizacion_grupo(T, pi: np.ndarray) -> FactorizacionGrupo:
+    """FactorizacionGrupo reutilizada entre solicitudes (LRU en memoria por proceso)"""
+    clave = huella_contenido("grupo", T)
+    with LOCK_FACTORIZACIONES:
+        if clave in FACTORIZACIONES_GRUPO:
+            FACTORIZACIONES_GRUPO.move_to_end(clave)
+            return FACTORIZACIONES_GRUPO[clave]
+    with etapa("factorizacion_grupo"):
+        factorizacion = FactorizacionGrupo(T, pi)
+    with LOCK_FACTORIZACIONES:
+        FACTORIZACIONES_GRUPO[clave] = factorizacion
+        while len(FACTORIZACIONES_GRUPO) > MAX_FACTORIZACIONES_GRUPO:
+            FACTORIZACIONES_GRUPO.popitem(last=False)
+    return factorizacion
+
+
+def linealizar_stress(
+    matriz_base,
+    estados: List[str],
+    ead: Optional[Dict[str, float]] = None,
+    lgd: Optional[Dict[str, float]] = None
+) -> Dict:
+    """Derivadas de pi, de la masa en default y de la EL respecto a los factores de stress en f = 1"""
+    T = matriz_base
+    n = len(estados)
+    # Con varias clases cerradas pi no es única y (I - T)^T con la fila de normalización es singular
+    cerradas = n_clases_cerradas(T)
+    if cerradas != 1:
+        raise ValueError(
+            f"Las sensibilidades requieren una distribución estacionaria única: "
+            f"la matriz tiene {cerradas} clases cerradas"
+        )
+    idx_default = estados.index(identificar_estado_default(estados))
+    pi = np.array(vector_estacionario_cacheado(T)["vector_estacionario"])
+    factorizacion = factorizacion_grupo(T, pi)
+    columna_default = columna(T, idx_default)
+    exposicion = None
+    if ead is not None and lgd is not None:
+        exposicion = np.array([ead.get(e, 0.0) * lgd.get(e, 0.0) for e in estados])
     
-    return propiedades
+    derivadas = {}
+    for nombre, idx in zip(("factor_moroso", "factor_incobrable"), indices_stress(estados)):
+        if idx is None:
+            dpi = np.zeros(n)
+            dpd = np.zeros(n)
+        else:
+            # dT/df = t e_idx^T - diag(t) T con t = T[:, idx] (filas suman cero); dpi = pi (dT/df) A#
+            t = columna(T, idx)
+            r = -(T.T @ (pi * t))
+            r[idx] += pi @ t
+            dpi = factorizacion.filas(r)
+            dpd = t * (float(idx == idx_default) - columna_default)
+        derivadas[nombre] = {
+            "vector_estacionario": dpi.tolist(),
+            "masa_default": float(dpi[idx_default]),
+            "pd": dict(zip(estados, dpd.tolist()))
+        }
+        if exposicion is not None:
+            derivadas[nombre]["perdida_total"] = float(exposicion @ dpd)
+    
+    # d pi_d / d T_ij = pi_i A#_jd: se devuelven los dos factores del producto exterior
+    e_default = np.zeros(n)
+    e_default[idx_default] = 1.0
+    resultado = {
+        "estado_default": estados[idx_default],
+        "vector_estacionario_base": pi.tolist(),
+        "masa_default_base": float(pi[idx_default]),
+        "derivadas": derivadas,
+        "derivada_masa_default_T": {
+            "factor_fila": pi.tolist(),
+            "factor_columna": factorizacion.columnas(e_default).tolist()
+        }
+    }
+    if exposicion is not None:
+        resultado["perdida_total_base"] = float(exposicion @ columna_default)
+    return resultado
 
 
-def clasificar_estados(matriz: np.ndarray, estados: List[str]) -> Dict:
-    """Clasifica los estados de la cadena de Markov"""
-    T = np.array(matriz)
-    n = T.shape[0]
+def sensibilidad_stress(
+    matriz_base,
+    estados: List[str],
+    escenarios: List[Tuple[float, float]],
+    ead: Optional[Dict[str, float]] = None,
+    lgd: Optional[Dict[str, float]] = None,
+    celdas: Optional[List[List[Union[int, str]]]] = None
+) -> Dict:
+    """Aproximación de primer orden de cada escenario a partir de la linealización cacheada"""
+    clave = huella_contenido("sensibilidad", matriz_base, estados, ead, lgd)
+    resultado = CACHE.obtener_o_calcular(clave, lambda: linealizar_stress(matriz_base, estados, ead, lgd))
     
-    clasificacion = {}
+    pi = np.array(resultado["vector_estacionario_base"])
+    derivadas = resultado["derivadas"]
+    dpi_m = np.array(derivadas["factor_moroso"]["vector_estacionario"])
+    dpi_i = np.array(derivadas["factor_incobrable"]["vector_estacionario"])
+    idx_default = estados.index(resultado["estado_default"])
     
-    # Estados absorbentes
-    absorbentes = []
-    for i in range(n):
-        if T[i, i] >= 1.0 - 1e-6:
-            absorbentes.append({
-                "indice": i,
-                "estado": estados[i],
-                "probabilidad_absorcion": float(T[i, i])
+    tabla = []
+    for fm, fi in escenarios:
+        delta_m, delta_i = fm - 1.0, fi - 1.0
+        pi_aprox = pi + delta_m * dpi_m + delta_i * dpi_i
+        fila = {
+            "factor_moroso": fm,
+            "factor_incobrable": fi,
+            "vector_estacionario_aproximado": pi_aprox.tolist(),
+            "masa_default_aproximada": float(pi_aprox[idx_default])
+        }
+        if "perdida_total_base" in resultado:
+            fila["perdida_total_aproximada"] = (
+                resultado["perdida_total_base"]
+                + delta_m * derivadas["factor_moroso"]["perdida_total"]
+                + delta_i * derivadas["factor_incobrable"]["perdida_total"]
+            )
+        tabla.append(fila)
+    resultado["escenarios"] = tabla
+    
+    if celdas:
+        # d pi / d T_ij = pi_i A#[j, :] (perturbación de una sola celda, sin renormalizar la fila)
+        factorizacion = factorizacion_grupo(matriz_base, pi)
+        n = len(estados)
+        derivadas_celdas = []
+        for celda in celdas:
+            if len(celda) != 2:
+                raise ValueError("Cada celda debe ser un par [origen, destino]")
+            i, j = _indices_estados(list(celda), estados, n)
+            e_j = np.zeros(n)
+            e_j[j] = 1.0
+            derivadas_celdas.append({
+                "origen": estados[i],
+                "destino": estados[j],
+                "derivada_vector_estacionario": (pi[i] * factorizacion.filas(e_j)).tolist()
             })
-    clasificacion["absorbentes"] = absorbentes
+        resultado["celdas"] = derivadas_celdas
+    return resultado
+
+
+@app.middleware("http")
+async def limitar_cuerpo_json(request: Request, call_next):
+    """413 para cuerpos JSON mayores que MARKOV_MAX_JSON_MB (su validación bloquea el event loop)"""
+    longitud = request.headers.get("content-length")
+    if (
+        MAX_CUERPO_JSON_BYTES > 0
+        and longitud is not None
+        and longitud.isdigit()
+        and int(longitud) > MAX_CUERPO_JSON_BYTES
+        and request.headers.get("content-type", "").startswith("application/json")
+    ):
+        return JSONResponse(
+            {
+                "detail": f"Cuerpo JSON mayor que {MAX_CUERPO_JSON_BYTES / (1024 * 1024):g} MB: "
+                "use /matriz/archivo o /matriz/sesiones/{id}/archivo"
+            },
+            status_code=413
+        )
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def instrumentar_solicitud(request: Request, call_next):
+    """Latencia por endpoint y por etapa, tamaños de entrada y cabecera Server-Timing"""
+    traza = Traza()
+    token = TRAZA.set(traza)
+    inicio = time.perf_counter()
+    try:
+        respuesta = await call_next(request)
+    finally:
+        TRAZA.reset(token)
+    total = time.perf_counter() - inicio
     
-    # Estados transitorios (no absorbentes que pueden llegar a absorbentes)
-    transitorios = []
-    recurrentes = []
-    
-    # Calcular probabilidades de absorción
-    for i in range(n):
-        if i not in [a["indice"] for a in absorbentes]:
-            # Verificar si puede llegar a un estado absorbente
-            puede_absorber = False
-            for abs_idx in [a["indice"] for a in absorbentes]:
-                # Búsqueda de caminos
-                visitados = set()
-                cola = [i]
-                while cola:
-                    actual = cola.pop(0)
-                    if actual == abs_idx:
-                        puede_absorber = True
-                        break
-                    if actual in visitados:
-                        continue
-                    visitados.add(actual)
-                    for j in range(n):
-                        if T[actual, j] > 1e-10 and j not in visitados:
-                            cola.append(j)
-            
-            if puede_absorber:
-                transitorios.append({
-                    "indice": i,
-                    "estado": estados[i]
-                })
-            else:
-                recurrentes.append({
-                    "indice": i,
-                    "estado": estados[i]
-                })
+    # Plantilla de la ruta (no la URL) para no crear una serie por id de sesión
+    ruta = request.scope.get("route")
+    endpoint = getattr(ruta, "path", "desconocido")
     
-    clasificacion["transitorios"] = transitorios
-    clasificacion["recurrentes"] = recurrentes
+    if respuesta.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # Flujo NDJSON: las cabeceras salen con el primer elemento; la latencia y las etapas
+        # se registran cuando termina el cuerpo, y Server-Timing solo informa el primer elemento
+        respuesta.headers["Server-Timing"] = server_timing(traza, total, "primer_elemento")
+        cuerpo = respuesta.body_iterator
+        
+        async def cuerpo_medido():
+            try:
+                async for parte in cuerpo:
+                    yield parte
+            finally:
+                METRICAS.registrar_solicitud(
+                    endpoint, request.method, respuesta.status_code, time.perf_counter() - inicio, traza
+                )
+        
+        respuesta.body_iterator = cuerpo_medido()
+        return respuesta
     
-    # Tiempo medio de absorción (para estados transitorios)
-    if absorbentes and transitorios:
+    METRICAS.registrar_solicitud(endpoint, request.method, respuesta.status_code, total, traza)
+    respuesta.headers["Server-Timing"] = server_timing(traza, total)
+    return respuesta
+
+
+class PoolCalculo:
+    """Pool de CPU para los cálculos pesados, con control de admisión, cola acotada y timeout"""
+    
+    def __init__(self, tipo: str, workers: int, max_cola: int, timeout: float):
+        if tipo not in TIPOS_POOL:
+            raise ValueError(f"Tipo de pool desconocido: {tipo}. Disponibles: {', '.join(TIPOS_POOL)}")
+        self.tipo = tipo
+        self.workers = max(1, workers)
+        self.max_cola = max(0, max_cola)
+        self.timeout = timeout
+        self.executor = None
+        self.executor_flujos = None
+        self.en_curso = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.vencidas = 0
+        self.reinicios = 0
+        self.lock = threading.Lock()
+    
+    def _obtener_executor(self):
+        # Creación perezosa: importar el módulo (p. ej. en los procesos hijos) no abre el pool
+        with self.lock:
+            if self.executor is None:
+                clase = ProcessPoolExecutor if self.tipo == "procesos" else ThreadPoolExecutor
+                self.executor = clase(max_workers=self.workers)
+            return self.executor
+    
+    def _obtener_executor_flujos(self):
+        # Los generadores no cruzan procesos: los flujos avanzan en hilos del proceso principal
+        if self.tipo == "hilos":
+            return self._obtener_executor()
+        with self.lock:
+            if self.executor_flujos is None:
+                self.executor_flujos = ThreadPoolExecutor(max_workers=self.workers)
+            return self.executor_flujos
+    
+    def _reiniciar_executor(self, roto) -> None:
+        """Descarta un executor roto (p. ej. un proceso hijo que murió); el siguiente envío crea otro"""
+        with self.lock:
+            if self.executor is roto:
+                self.executor = None
+                self.reinicios += 1
+        roto.shutdown(wait=False, cancel_futures=True)
+    
+    def _enviar(self, funcion: Callable, *args):
+        executor = self._obtener_executor()
         try:
-            # Construir matriz Q (transitorios a transitorios)
-            indices_transitorios = [t["indice"] for t in transitorios]
-            Q = T[np.ix_(indices_transitorios, indices_transitorios)]
-            I = np.eye(len(indices_transitorios))
-            N = np.linalg.inv(I - Q)  # Matriz fundamental
-            tiempos_absorcion = N.sum(axis=1)
-            
-            for idx, t in enumerate(transitorios):
-                t["tiempo_medio_absorcion"] = float(tiempos_absorcion[idx])
-        except:
-            pass
+            return executor, executor.submit(funcion, *args)
+        except BrokenExecutor:
+            self._reiniciar_executor(executor)
+            executor = self._obtener_executor()
+            return executor, executor.submit(funcion, *args)
     
-    return clasificacion
+    def _admitir(self) -> bool:
+        with self.lock:
+            if self.en_curso >= self.workers + self.max_cola:
+                self.rechazadas += 1
+                return False
+            self.en_curso += 1
+            self.admitidas += 1
+            return True
+    
+    def _liberar(self, _futuro=None) -> None:
+        with self.lock:
+            self.en_curso -= 1
+    
+    def retener(self, futuros: List[Future]) -> None:
+        """Ocupa un cupo (sin control de admisión) hasta que terminen todos los futuros"""
+        with self.lock:
+            self.en_curso += 1
+        restantes = [len(futuros)]
+        
+        def terminado(_futuro) -> None:
+            with self.lock:
+                restantes[0] -= 1
+                if restantes[0] == 0:
+                    self.en_curso -= 1
+        
+        for futuro in futuros:
+            futuro.add_done_callback(terminado)
+    
+    async def ejecutar(self, funcion: Callable, *args, timeout: Optional[float] = None):
+        """Envía funcion(*args) al pool; 503 si la cola está llena, 504 si vence el timeout"""
+        if not self._admitir():
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor saturado, reintente más tarde",
+                headers={"Retry-After": "1"}
+            )
+        try:
+            executor, futuro = self._enviar(funcion, *args)
+        except Exception:
+            self._liberar()
+            raise
+        # El cupo se libera cuando el cálculo termina de verdad, no cuando vence el timeout
+        futuro.add_done_callback(self._liberar)
+        
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self.lock:
+                self.vencidas += 1
+            raise HTTPException(
+                status_code=504,
+                detail=f"El cálculo superó el tiempo máximo de {timeout or self.timeout:g} s"
+            )
+        except BrokenExecutor:
+            self._reiniciar_executor(executor)
+            raise HTTPException(
+                status_code=503,
+                detail="El worker de cálculo terminó inesperadamente, reintente",
+                headers={"Retry-After": "1"}
+            )
+    
+    async def flujo(self, crear: Callable[..., Iterator], *args, timeout: Optional[float] = None) -> AsyncIterator:
+        """Abre crear(*args) ocupando un cupo del pool hasta que el flujo termina
+        
+        El primer elemento se obtiene antes de devolver (errores de entrada, 503 y 504 como en
+        ejecutar); cada elemento siguiente tiene su propio tiempo máximo.
+        """
+        if not self._admitir():
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor saturado, reintente más tarde",
+                headers={"Retry-After": "1"}
+            )
+        limite = timeout or self.timeout
+        executor = self._obtener_executor_flujos()
+        fin = object()
+        ultimo = None
+        # Los hilos no heredan el contexto: cada paso del generador suma sus etapas a la traza
+        # de la solicitud, que la instrumentación registra cuando termina el cuerpo
+        traza = TRAZA.get()
+        
+        def en_traza(funcion, *argumentos):
+            token = TRAZA.set(traza)
+            try:
+                return funcion(*argumentos)
+            finally:
+                TRAZA.reset(token)
+        
+        async def avanzar(funcion, *argumentos):
+            nonlocal ultimo
+            ultimo = executor.submit(en_traza, funcion, *argumentos)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(ultimo), limite)
+            except asyncio.TimeoutError:
+                with self.lock:
+                    self.vencidas += 1
+                raise
+        
+        def liberar():
+            # Como en ejecutar: el cupo se libera cuando el hilo termina de verdad
+            if ultimo is None or ultimo.done():
+                self._liberar()
+            else:
+                ultimo.add_done_callback(self._liberar)
+        
+        def iniciar():
+            generador = crear(*args)
+            return generador, next(generador, fin)
+        
+        try:
+            generador, primero = await avanzar(iniciar)
+        except asyncio.TimeoutError:
+            liberar()
+            raise HTTPException(status_code=504, detail=f"El cálculo superó el tiempo máximo de {limite:g} s")
+        except BaseException:
+            liberar()
+            raise
+        
+        async def elementos():
+            try:
+                elemento = primero
+                while elemento is not fin:
+                    yield elemento
+                    try:
+                        elemento = await avanzar(next, generador, fin)
+                    except asyncio.TimeoutError:
+                        yield {"error": f"El cálculo superó el tiempo máximo de {limite:g} s"}
+                        return
+                    except Exception as e:
+                        yield {"error": str(e)}
+                        return
+            finally:
+                liberar()
+        
+        return elementos()
+    
+    def estadisticas(self) -> Dict:
+        with self.lock:
+            return {
+                "tipo": self.tipo,
+                "workers": self.workers,
+                "max_cola": self.max_cola,
+                "timeout_s": self.timeout,
+                "en_curso": self.en_curso,
+                "en_cola": max(0, self.en_curso - self.workers),
+                "admitidas": self.admitidas,
+                "rechazadas": self.rechazadas,
+                "vencidas": self.vencidas,
+                "reinicios": self.reinicios
+            }
 
 
-def aplicar_stress(
-    matriz_base: List[List[float]],
-    estados: List[str],
-    factor_moroso: float = 1.2,
-    factor_incobrable: float = 1.3
+POOL = PoolCalculo(TIPO_POOL, WORKERS_POOL, COLA_POOL, TIMEOUT_SOLICITUD)
+
+
+async def calcular_respuesta(formato: str, funcion: Callable, *args) -> Response:
+    """Ejecuta un cálculo pesado en el pool y devuelve la respuesta ya serializada"""
+    inicio = time.perf_counter()
+    try:
+        contenido, tipo, traza_worker = await POOL.ejecutar(_calcular_codificado, formato, funcion, *args)
+    except HTTPException:
+        raise
+    except ModeloNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    traza = TRAZA.get()
+    if traza is not None:
+        trabajo = sum(traza_worker.etapas.get(e, 0.0) for e in ("espera_secciones", "calculo", "serializacion"))
+        traza.combinar(traza_worker)
+        traza.sumar("espera_pool", max(0.0, time.perf_counter() - inicio - trabajo))
+    return Response(content=contenido, media_type=tipo)
+
+
+async def transmitir_respuesta(crear: Callable[..., Iterator], *args) -> StreamingResponse:
+    """NDJSON con una línea por elemento, ocupando un cupo del pool durante todo el flujo"""
+    try:
+        elementos = await POOL.flujo(crear, *args)
+    except HTTPException:
+        raise
+    except ModeloNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        (codificar_respuesta(elemento, "rapido")[0] + b"\n" async for elemento in elementos),
+        media_type="application/x-ndjson"
+    )
+
+
+def estimar_desde_archivo(
+    fuente,
+    formato_entrada: str,
+    columna_origen: str,
+    columna_destino: str,
+    include: Optional[List[str]],
+    persistir: bool = False
 ) -> Dict:
-    T = np.array(matriz_base)
-    n = len(estados)
+    acumulador = AcumuladorTransiciones()
+    registros = 0
+    with etapa("lectura"):
+        for etiquetas, origen, destino in leer_bloques_archivo(fuente, formato_entrada, columna_origen, columna_destino):
+            registros += acumulador.agregar_codigos(etiquetas, origen, destino)
+    registrar_tamano("registros", registros)
     
-    idx_moroso = None
-    idx_incobrable = None
+    estados, conteo = acumulador.exportar()
+    if not estados:
+        raise ValueError("El archivo no contiene transiciones")
+    return construir_resultado_matriz(estados, conteo, include, persistir)
+
+
+def resolver_registro_modelo(request: ModeloRequest) -> Dict:
+    if request.registros is not None:
+        registrar_tamano("registros", len(request.registros))
+        estados, conteo = contar_transiciones(request.registros)
+    elif request.estados is not None and request.matriz_conteo is not None:
+        estados, conteo = request.estados, np.array(request.matriz_conteo, dtype=float)
+        if conteo.shape != (len(estados), len(estados)):
+            raise ValueError("La matriz de conteo debe ser cuadrada y coincidir con los estados")
+    else:
+        raise ValueError("Se requieren registros o estados y matriz_conteo")
+    with etapa("registro_modelo"):
+        model_id = MODELOS.registrar(estados, conteo)
+    return dict(MODELOS.cargar(model_id)["metadatos"])
+
+
+def resolver_estacionario(request: Dict) -> Dict:
+    model_id = request.get("model_id")
+    matriz, estados = matriz_y_estados(request.get("matriz_transicion"), model_id, request.get("estados"), False)
+    registrar_tamano("estados", matriz.shape[0])
     
-    for i, estado in enumerate(estados):
-        if "Moroso" in estado or "moroso" in estado.lower():
-            idx_moroso = i
-        if "Incobrable" in estado or "incobrable" in estado.lower() or "Default" in estado:
-            idx_incobrable = i
+    metodo = request.get("metodo", "auto")
+    if model_id is not None and metodo == "auto" and request.get("vector_inicial") is None:
+        # Artefacto precalculado al registrar el modelo
+        modelo = MODELOS.cargar(model_id)
+        resultado = dict(modelo["metadatos"]["estacionario"])
+        resultado["vector_estacionario"] = modelo["estacionario"].tolist()
+    else:
+        resultado = vector_estacionario_cacheado(matriz, metodo=metodo, pi_inicial=request.get("vector_inicial"))
+    resultado["estados"] = estados or []
+    return resultado
+
+
+def resolver_perdidas(request: PerdidasRequest) -> Dict:
+    matriz, estados = matriz_y_estados(request.matriz_transicion, request.model_id, request.estados)
+    registrar_tamano("estados", matriz.shape[0])
+    clave = huella_contenido(
+        "perdidas", matriz, estados, request.ead, request.lgd,
+        [request.horizonte, request.tasa_descuento]
+    )
+    return CACHE.obtener_o_calcular(
+        clave,
+        lambda: calcular_perdidas_esperadas(
+            matriz,
+            estados,
+            request.ead,
+            request.lgd,
+            request.horizonte,
+            request.tasa_descuento
+        )
+    )
+
+
+def resolver_cartera(request: CarteraRequest) -> Dict:
+    registrar_tamano("registros", len(request.estado))
+    matriz, estados = matriz_y_estados(request.matriz_transicion, request.model_id, request.estados)
+    return calcular_perdidas_cartera(
+        matriz,
+        estados,
+        np.asarray(request.estado, dtype=np.int64),
+        np.asarray(request.ead, dtype=float),
+        np.asarray(request.lgd, dtype=float),
+        request.segmento,
+        request.horizonte,
+        request.incluir_prestamos
+    )
+
+
+def generador_simulacion(request: SimulacionRequest):
+    matriz, estados = matriz_y_estados(request.matriz_transicion, request.model_id, request.estados)
+    return simular_perdidas(
+        matriz,
+        estados,
+        np.asarray(request.estado, dtype=np.int64),
+        np.asarray(request.ead, dtype=float),
+        np.asarray(request.lgd, dtype=float),
+        request.pasos,
+        request.simulaciones,
+        request.semilla,
+        request.correlacion,
+        request.workers
+    )
+
+
+def resolver_simulacion(request: SimulacionRequest) -> Dict:
+    for resumen in generador_simulacion(request):
+        pass
+    return resumen
+
+
+def resolver_stress(request: StressRequest) -> Dict:
+    matriz, estados = matriz_y_estados(request.matriz_base, request.model_id, request.estados)
+    registrar_tamano("estados", matriz.shape[0])
+    if request.modo not in MODOS_STRESS:
+        raise ValueError(f"Modo desconocido: {request.modo}. Disponibles: {', '.join(MODOS_STRESS)}")
+    escenarios = [(e.factor_moroso, e.factor_incobrable) for e in request.escenarios or []]
+    if request.grilla is not None:
+        escenarios += [
+            (fm, fi)
+            for fm in request.grilla.factores_moroso
+            for fi in request.grilla.factores_incobrable
+        ]
+    if request.modo == "sensibilidad":
+        if not escenarios:
+            escenarios = [(request.factor_moroso, request.factor_incobrable)]
+        resultado = sensibilidad_stress(matriz, estados, escenarios, request.ead, request.lgd, request.celdas)
+    elif request.escenarios is not None or request.grilla is not None:
+        clave = huella_contenido(
+            "stress_lote", matriz, estados, escenarios, request.incluir_matrices
+        )
+        resultado = CACHE.obtener_o_calcular(
+            clave,
+            lambda: aplicar_stress_lote(matriz, estados, escenarios, request.incluir_matrices)
+        )
+    else:
+        clave = huella_contenido(
+            "stress", matriz, estados, [request.factor_moroso, request.factor_incobrable]
+        )
+        resultado = CACHE.obtener_o_calcular(
+            clave,
+            lambda: aplicar_stress(
+                matriz, estados, request.factor_moroso, request.factor_incobrable
+            )
+        )
+    resultado["estados"] = estados
+    return resultado
+
+
+def validar_pasos(pasos: List[PasoPipeline]) -> None:
+    """Ids únicos, tipos y parámetros conocidos; la entrada debe ser "base" o un stress anterior"""
+    if not pasos:
+        raise ValueError("Se requiere al menos un paso")
+    tipos = {}
+    for paso in pasos:
+        if paso.id in tipos or paso.id == "base":
+            raise ValueError(f"Id de paso repetido o reservado: {paso.id}")
+        if paso.tipo not in PARAMETROS_PASO_PIPELINE:
+            raise ValueError(
+                f"Tipo de paso desconocido: {paso.tipo}. Disponibles: {', '.join(PARAMETROS_PASO_PIPELINE)}"
+            )
+        desconocidos = sorted(set(paso.parametros) - PARAMETROS_PASO_PIPELINE[paso.tipo])
+        if desconocidos:
+            raise ValueError(f"Parámetros desconocidos en {paso.id}: {', '.join(desconocidos)}")
+        if paso.entrada != "base" and tipos.get(paso.entrada) != "stress":
+            raise ValueError(f"La entrada de {paso.id} debe ser 'base' o un paso de stress anterior")
+        tipos[paso.id] = paso.tipo
+
+
+class IntermediosPipeline:
+    """Resultados intermedios compartidos entre pasos; el primero que los pide los calcula"""
     
-    T_stress = T.copy()
+    def __init__(self):
+        self.futuros: Dict[Tuple, Future] = {}
+        self.lock = threading.Lock()
     
-    for i in range(n):
-        if idx_moroso is not None:
-            T_stress[i, idx_moroso] *= factor_moroso
-        if idx_incobrable is not None:
-            T_stress[i, idx_incobrable] *= factor_incobrable
-        
-        suma_fila = T_stress[i].sum()
-        if suma_fila > 0:
-            T_stress[i] = T_stress[i] / suma_fila
+    def obtener(self, clave: Tuple, calcular: Callable[[], Dict]) -> Dict:
+        with self.lock:
+            futuro = self.futuros.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self.futuros[clave] = Future()
+        if propio:
+            try:
+                futuro.set_result(calcular())
+            except Exception as e:
+                futuro.set_exception(e)
+        return futuro.result()
+
+
+class ContextoPipeline:
+    """Estados, conteo y matrices (base y estresadas) como arrays en memoria durante el pipeline"""
     
-    pi_base = calcular_vector_estacionario(T)["vector_estacionario"]
-    pi_stress = calcular_vector_estacionario(T_stress)["vector_estacionario"]
+    def __init__(self, estados: List[str], conteo, matriz):
+        self.estados = estados
+        self.conteo = conteo
+        self.matrices = {"base": matriz}
+        self.intermedios = IntermediosPipeline()
     
-    return {
-        "matriz_stress": T_stress.tolist(),
-        "vector_estacionario_base": pi_base,
-        "vector_estacionario_stress": pi_stress,
-        "cambios": {
-            "factor_moroso": factor_moroso,
-            "factor_incobrable": factor_incobrable
+    def estacionario(self, entrada: str, metodo: str = "auto") -> Dict:
+        return self.intermedios.obtener(
+            ("estacionario", entrada, metodo),
+            lambda: vector_estacionario_cacheado(self.matrices[entrada], metodo=metodo)
+        )
+
+
+def ejecutar_paso(contexto: ContextoPipeline, paso: PasoPipeline) -> Dict:
+    parametros = paso.parametros
+    estados = contexto.estados
+    matriz = contexto.matrices[paso.entrada]
+    
+    if paso.tipo == "estimar":
+        if contexto.conteo is None:
+            raise ValueError("El paso estimar requiere registros o model_id")
+        return construir_resultado_matriz(
+            estados, contexto.conteo, parametros.get("include"), parametros.get("persistir", False)
+        )
+    
+    if paso.tipo == "estacionario":
+        resultado = dict(contexto.estacionario(paso.entrada, parametros.get("metodo", "auto")))
+        resultado["estados"] = estados
+        return resultado
+    
+    if paso.tipo == "stress":
+        factor_moroso = parametros.get("factor_moroso", 1.2)
+        factor_incobrable = parametros.get("factor_incobrable", 1.3)
+        # Los pasos que dependen de este se lanzan al terminar, con la matriz ya publicada
+        contexto.matrices[paso.id] = estresar_matriz(matriz, estados, factor_moroso, factor_incobrable)
+        resultado = {
+            "vector_estacionario_base": contexto.estacionario(paso.entrada)["vector_estacionario"],
+            "vector_estacionario_stress": contexto.estacionario(paso.id)["vector_estacionario"],
+            "cambios": {"factor_moroso": factor_moroso, "factor_incobrable": factor_incobrable},
+            "estados": estados
         }
-    }
+        if parametros.get("incluir_matriz", True):
+            resultado["matriz_stress"] = matriz_a_json(contexto.matrices[paso.id])
+        return resultado
+    
+    return calcular_perdidas_esperadas(
+        matriz,
+        estados,
+        parametros.get("ead", {}),
+        parametros.get("lgd", {}),
+        parametros.get("horizonte"),
+        parametros.get("tasa_descuento", 0.0)
+    )
+
+
+def _ejecutar_paso_con_traza(contexto: ContextoPipeline, paso: PasoPipeline) -> Tuple[Dict, Traza, float]:
+    # Traza propia del hilo del paso; el bucle principal la combina con la de la solicitud
+    traza = Traza()
+    token = TRAZA.set(traza)
+    inicio = time.perf_counter()
+    try:
+        with etapa(f"pipeline.{paso.tipo}"):
+            resultado = ejecutar_paso(contexto, paso)
+    finally:
+        TRAZA.reset(token)
+    return resultado, traza, time.perf_counter() - inicio
+
+
+def ejecutar_pipeline(request: PipelineRequest) -> Iterator[Dict]:
+    """Ejecuta los pasos en cuanto sus entradas están listas y los emite según terminan"""
+    validar_pasos(request.pasos)
+    
+    # Matriz base en memoria: se cuenta y normaliza una vez y ningún paso la vuelve a leer
+    with etapa("pipeline.base"):
+        if request.registros is not None:
+            registrar_tamano("registros", len(request.registros))
+            estados, conteo = contar_transiciones(request.registros)
+            matriz = preparar_matriz(normalizar_conteos(conteo))
+        else:
+            matriz, estados = matriz_y_estados(request.matriz_transicion, request.model_id, request.estados)
+            conteo = MODELOS.cargar(request.model_id)["conteo"] if request.model_id is not None else None
+    registrar_tamano("estados", len(estados))
+    contexto = ContextoPipeline(estados, conteo, matriz)
+    
+    pendientes = {paso.id: paso for paso in request.pasos}
+    completados, fallidos = set(), set()
+    workers = min(limitar_workers(request.workers, WORKERS_PIPELINE), len(pendientes))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        en_curso: Dict[Future, PasoPipeline] = {}
+        while pendientes or en_curso:
+            for paso in list(pendientes.values()):
+                if paso.entrada in fallidos:
+                    del pendientes[paso.id]
+                    fallidos.add(paso.id)
+                    yield {"paso": paso.id, "tipo": paso.tipo, "error": f"Falló la entrada {paso.entrada}"}
+                elif paso.entrada == "base" or paso.entrada in completados:
+                    del pendientes[paso.id]
+                    en_curso[executor.submit(_ejecutar_paso_con_traza, contexto, paso)] = paso
+            if not en_curso:
+                continue
+            
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                paso = en_curso.pop(futuro)
+                try:
+                    resultado, traza_paso, duracion = futuro.result()
+                except Exception as e:
+                    fallidos.add(paso.id)
+                    yield {"paso": paso.id, "tipo": paso.tipo, "error": str(e)}
+                    continue
+                completados.add(paso.id)
+                traza = TRAZA.get()
+                if traza is not None:
+                    traza.combinar(traza_paso)
+                yield {
+                    "paso": paso.id,
+                    "tipo": paso.tipo,
+                    "entrada": paso.entrada,
+                    "duracion": duracion,
+                    "resultado": resultado
+                }
+
+
+def resolver_pipeline(request: PipelineRequest) -> Dict:
+    inicio = time.perf_counter()
+    pasos = {}
+    orden = []
+    for evento in ejecutar_pipeline(request):
+        id_paso = evento.pop("paso")
+        pasos[id_paso] = evento
+        orden.append(id_paso)
+    return {"pasos": pasos, "orden": orden, "tiempo_total": time.perf_counter() - inicio}
 
 
 @app.get("/")
-def root():
+async def root():
     return {
         "mensaje": "API de Análisis de Riesgo Crediticio con Cadenas de Markov",
         "version": "1.0.0",
         "status": "online",
         "endpoints": {
             "/matriz": "POST - Estimar matriz de transición",
+            "/matriz/archivo": "POST - Estimar matriz desde CSV / .npy / .npz / Parquet / Arrow",
+            "/matriz/panel": "POST - Matrices global y por periodo desde un panel (préstamo, periodo, estado)",
+            "/matriz/segmentos": "POST - Una matriz por segmento en una sola pasada",
+            "/matriz/bootstrap": "POST - Intervalos de confianza bootstrap / Dirichlet",
+            "/matriz/sesiones": "POST - Abrir sesión de estimación incremental; GET - Sesiones abiertas",
+            "/generador": "POST - Estimar el generador Q en tiempo continuo",
+            "/generador/transicion": "POST - P(t) = expm(Qt) y análisis para varios horizontes",
             "/estacionario": "POST - Calcular vector estacionario",
             "/perdidas": "POST - Calcular pérdidas esperadas",
-            "/stress": "POST - Aplicar escenarios de stress"
+            "/potencias": "POST - T^h para horizontes arbitrarios (filas / columnas opcionales)",
+            "/perdidas/cartera": "POST - Pérdidas esperadas por préstamo (columnas)",
+            "/stress": "POST - Aplicar escenarios de stress",
+            "/simulacion": "POST - Simulación Monte Carlo de pérdidas (VaR / ES)",
+            "/pipeline": "POST - Pasos estimar / estacionario / stress / pérdidas en una sola llamada",
+            "/cache": "GET - Estadísticas de la caché de resultados",
+            "/modelos": "GET / POST - Modelos registrados (usar model_id en lugar de la matriz)",
+            "/pool": "GET - Estado del pool de cálculo",
+            "/metrics": "GET - Métricas en formato Prometheus"
         }
     }
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {
         "status": "ok",
         "message": "Backend funcionando correctamente"
@@ -501,52 +4360,342 @@ def health_check():
 
 
 @app.post("/matriz")
-def estimar_matriz(request: TransicionRequest):
+async def estimar_matriz(request: TransicionRequest, formato: str = "json"):
+    return await calcular_respuesta(
+        formato, estimar_matriz_transicion, request.registros, request.include, request.persistir
+    )
+
+
+@app.post("/matriz/archivo")
+async def estimar_matriz_archivo(
+    archivo: UploadFile = File(...),
+    formato_entrada: Optional[str] = Form(None),
+    columna_origen: str = Form("origen"),
+    columna_destino: str = Form("destino"),
+    include: Optional[str] = Form(None),
+    persistir: bool = Form(False),
+    formato: str = "json"
+):
+    # Con procesos el archivo temporal no se puede compartir: se envía su contenido
+    fuente = io.BytesIO(await archivo.read()) if POOL.tipo == "procesos" else archivo.file
+    return await calcular_respuesta(
+        formato,
+        estimar_desde_archivo,
+        fuente,
+        inferir_formato_archivo(archivo.filename, formato_entrada),
+        columna_origen,
+        columna_destino,
+        parsear_include(include),
+        persistir
+    )
+
+
+@app.post("/matriz/panel")
+async def estimar_matriz_panel(request: PanelRequest, formato: str = "json"):
+    return await calcular_respuesta(
+        formato,
+        estimar_panel,
+        request.prestamo,
+        request.periodo,
+        request.estado,
+        request.solo_contiguos,
+        request.include,
+        request.producto.model_dump() if request.producto is not None else None
+    )
+
+
+@app.post("/generador")
+async def estimar_generador_endpoint(request: GeneradorRequest, formato: str = "json"):
+    return await calcular_respuesta(
+        formato,
+        resolver_generador,
+        request.prestamo,
+        request.tiempo,
+        request.estado,
+        request.horizontes,
+        request.metodo
+    )
+
+
+@app.post("/generador/transicion")
+async def transicion_continua(request: TransicionContinuaRequest, formato: str = "json"):
+    return await calcular_respuesta(
+        formato,
+        analizar_transicion_continua,
+        request.generador,
+        request.estados,
+        request.horizontes,
+        request.metodo,
+        request.incluir_estacionario,
+        request.ead,
+        request.lgd,
+        request.factor_moroso,
+        request.factor_incobrable
+    )
+
+
+@app.post("/potencias")
+async def calcular_potencias(request: PotenciasRequest, formato: str = "json"):
+    return await calcular_respuesta(formato, resolver_potencias, request)
+
+
+@app.post("/matriz/segmentos")
+async def estimar_matriz_segmentos(request: SegmentosRequest, formato: str = "json"):
+    return await calcular_respuesta(
+        formato,
+        estimar_segmentos,
+        request.registros,
+        request.segmento,
+        request.minimo_observaciones,
+        request.incluir_conteos
+    )
+
+
+@app.post("/matriz/bootstrap")
+async def bootstrap_matriz_endpoint(request: BootstrapRequest, formato: str = "json"):
+    return await calcular_respuesta(formato, resolver_bootstrap, request)
+
+
+@app.post("/matriz/sesiones")
+def crear_sesion_matriz():
+    return {"sesion_id": SESIONES.crear()}
+
+
+@app.get("/matriz/sesiones")
+def estadisticas_sesiones():
+    return SESIONES.estadisticas()
+
+
+async def combinar_en_sesion(sesion_id: str, funcion: Callable, *args) -> int:
+    """Calcula un conteo parcial en el pool (admisión y timeout) y lo suma a la sesión"""
+    sesion = obtener_sesion(sesion_id)
     try:
-        resultado = estimar_matriz_transicion(request.registros)
-        return resultado
+        estados, conteo, agregados = await POOL.ejecutar(funcion, *args)
+        sesion.combinar(estados, conteo)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return agregados
+
+
+@app.post("/matriz/sesiones/{sesion_id}/registros")
+async def agregar_registros_sesion(sesion_id: str, request: TransicionRequest):
+    agregados = await combinar_en_sesion(sesion_id, conteo_parcial_registros, request.registros)
+    estados, conteo = obtener_sesion(sesion_id).exportar()
+    return {
+        "sesion_id": sesion_id,
+        "registros_agregados": agregados,
+        "total_transiciones": int(conteo.sum()),
+        "estados": estados
+    }
+
+
+@app.post("/matriz/sesiones/{sesion_id}/archivo")
+async def agregar_archivo_sesion(
+    sesion_id: str,
+    archivo: UploadFile = File(...),
+    formato_entrada: Optional[str] = Form(None),
+    columna_origen: str = Form("origen"),
+    columna_destino: str = Form("destino")
+):
+    obtener_sesion(sesion_id)
+    # Con procesos el archivo temporal no se puede compartir: se envía su contenido
+    fuente = io.BytesIO(await archivo.read()) if POOL.tipo == "procesos" else archivo.file
+    agregados = await combinar_en_sesion(
+        sesion_id,
+        conteo_parcial_archivo,
+        fuente,
+        inferir_formato_archivo(archivo.filename, formato_entrada),
+        columna_origen,
+        columna_destino
+    )
+    estados, conteo = obtener_sesion(sesion_id).exportar()
+    return {
+        "sesion_id": sesion_id,
+        "registros_agregados": agregados,
+        "total_transiciones": int(conteo.sum()),
+        "estados": estados
+    }
+
+
+@app.get("/matriz/sesiones/{sesion_id}/conteo")
+def exportar_conteo_sesion(sesion_id: str):
+    estados, conteo = obtener_sesion(sesion_id).exportar()
+    return {"estados": estados, "matriz_conteo": conteo.tolist()}
+
+
+@app.post("/matriz/sesiones/{sesion_id}/combinar")
+async def combinar_conteo_sesion(sesion_id: str, request: ConteoParcial):
+    await combinar_en_sesion(sesion_id, conteo_parcial_matriz, request.estados, request.matriz_conteo)
+    estados, conteo = obtener_sesion(sesion_id).exportar()
+    return {
+        "sesion_id": sesion_id,
+        "total_transiciones": int(conteo.sum()),
+        "estados": estados
+    }
+
+
+@app.get("/matriz/sesiones/{sesion_id}")
+async def consultar_sesion(
+    sesion_id: str,
+    include: Optional[str] = None,
+    persistir: bool = False,
+    formato: str = "json"
+):
+    estados, conteo = obtener_sesion(sesion_id).exportar()
+    if not estados:
+        raise HTTPException(status_code=400, detail="La sesión aún no tiene registros")
+    return await calcular_respuesta(
+        formato, construir_resultado_matriz, estados, conteo, parsear_include(include), persistir
+    )
+
+
+@app.post("/matriz/sesiones/{sesion_id}/finalizar")
+async def finalizar_sesion(
+    sesion_id: str,
+    include: Optional[str] = None,
+    persistir: bool = False,
+    formato: str = "json"
+):
+    resultado = await consultar_sesion(sesion_id, include, persistir, formato)
+    SESIONES.eliminar(sesion_id)
+    return resultado
+
+
+@app.delete("/matriz/sesiones/{sesion_id}")
+def eliminar_sesion(sesion_id: str):
+    if not SESIONES.eliminar(sesion_id):
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada: {sesion_id}")
+    return {"sesion_id": sesion_id, "eliminada": True}
 
 
 @app.post("/estacionario")
-def calcular_estacionario(request: Dict):
-    try:
-        matriz = np.array(request["matriz_transicion"])
-        resultado = calcular_vector_estacionario(matriz)
-        resultado["estados"] = request.get("estados", [])
-        return resultado
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+async def calcular_estacionario(request: Dict):
+    return await calcular_respuesta("json", resolver_estacionario, request)
 
 
 @app.post("/perdidas")
-def calcular_perdidas(request: PerdidasRequest):
-    try:
-        resultado = calcular_perdidas_esperadas(
-            request.matriz_transicion,
-            request.estados,
-            request.ead,
-            request.lgd
+async def calcular_perdidas(request: PerdidasRequest):
+    return await calcular_respuesta("json", resolver_perdidas, request)
+
+
+@app.post("/perdidas/cartera")
+async def calcular_perdidas_cartera_endpoint(request: CarteraRequest):
+    return await calcular_respuesta("json", resolver_cartera, request)
+
+
+@app.post("/simulacion")
+async def simular_cartera(request: SimulacionRequest):
+    if not request.stream:
+        return await calcular_respuesta("json", resolver_simulacion, request)
+    # NDJSON: un resumen de cuantiles por bloque terminado; el primero valida la entrada
+    return await transmitir_respuesta(generador_simulacion, request)
+
+
+@app.post("/stress")
+async def aplicar_stress_scenario(request: StressRequest, formato: str = "json"):
+    return await calcular_respuesta(formato, resolver_stress, request)
+
+
+@app.post("/pipeline")
+async def pipeline(request: PipelineRequest, formato: str = "json"):
+    if not request.stream:
+        return await calcular_respuesta(formato, resolver_pipeline, request)
+    # NDJSON: una línea por paso terminado; la primera valida la entrada
+    return await transmitir_respuesta(ejecutar_pipeline, request)
+
+
+def estadisticas_cache_servicio() -> Dict:
+    """Contadores de la caché; en modo procesos cada worker tiene la suya y no se agregan"""
+    if POOL.tipo == "procesos":
+        return {
+            "max_bytes": CACHE.max_bytes,
+            "directorio": CACHE.directorio,
+            "por_proceso": True,
+            "estadisticas": "desactivadas en modo procesos: cada proceso del pool mantiene su propia caché"
+        }
+    return CACHE.estadisticas()
+
+
+@app.get("/cache")
+def estadisticas_cache():
+    return estadisticas_cache_servicio()
+
+
+@app.delete("/cache")
+def limpiar_cache():
+    if POOL.tipo == "procesos":
+        raise HTTPException(
+            status_code=409,
+            detail="No soportado en modo procesos: cada proceso del pool mantiene su propia caché; reinicie el servicio para vaciarla"
         )
-        return resultado
-    except Exception as e:
+    CACHE.limpiar()
+    return estadisticas_cache_servicio()
+
+
+@app.get("/modelos")
+def listar_modelos():
+    return {
+        "directorio": MODELOS.directorio,
+        "max_modelos": MODELOS.max_modelos,
+        "ttl_s": MODELOS.ttl,
+        "modelos": MODELOS.listar()
+    }
+
+
+@app.post("/modelos")
+async def registrar_modelo(request: ModeloRequest):
+    return await calcular_respuesta("json", resolver_registro_modelo, request)
+
+
+@app.get("/modelos/{model_id}")
+def consultar_modelo(model_id: str):
+    try:
+        modelo = MODELOS.cargar(model_id)
+    except ModeloNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {
+        **modelo["metadatos"],
+        "vector_estacionario": modelo["estacionario"].tolist(),
+        "pd": dict(zip(modelo["estados"], modelo["pd"].tolist()))
+    }
 
 
-@app.post("/stress")
-def aplicar_stress_scenario(request: StressRequest):
+@app.delete("/modelos/{model_id}")
+def eliminar_modelo(model_id: str):
     try:
-        resultado = aplicar_stress(
-            request.matriz_base,
-            request.estados,
-            request.factor_moroso,
-            request.factor_incobrable
-        )
-        resultado["estados"] = request.estados
-        return resultado
-    except Exception as e:
+        MODELOS.eliminar(model_id)
+    except ModeloNoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {"model_id": model_id, "eliminado": True}
+
+
+@app.get("/pool")
+async def estadisticas_pool():
+    return POOL.estadisticas()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metricas():
+    return PlainTextResponse(
+        METRICAS.exportar()
+        + (
+            "" if POOL.tipo == "procesos" else exportar_contadores(
+                "markov_cache", CACHE.estadisticas(),
+                ("aciertos", "aciertos_disco", "fallos", "desalojos"), ("entradas", "bytes")
+            )
+        )
+        + exportar_contadores(
+            "markov_pool", POOL.estadisticas(),
+            ("admitidas", "rechazadas", "vencidas"), ("en_curso", "en_cola", "workers")
+        ),
+        media_type="text/plain; version=0.0.4"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+"""
+Pruebas de la simulación Monte Carlo de pérdidas (ejecutar con: python -m pytest test_simulacion.py)
+"""
+
+import numpy as np
+
+from main import simular_perdidas
+
+
+ESTADOS = ["Al dia", "Moroso_30", "Moroso_60", "Default"]
+MATRIZ = np.array([
+    [0.90, 0.07, 0.02, 0.01],
+    [0.40, 0.35, 0.15, 0.10],
+    [0.15, 0.15, 0.40, 0.30],
+    [0.00, 0.00, 0.00, 1.00],
+])
+
+
+def _perdidas(matriz, estados, codigos, correlacion):
+    n_prestamos = len(codigos)
+    *_, final = simular_perdidas(
+        matriz,
+        estados,
+        codigos,
+        np.full(n_prestamos, 100.0),
+        np.full(n_prestamos, 0.5),
+        pasos=6,
+        simulaciones=400,
+        semilla=7,
+        correlacion=correlacion,
+        workers=1
+    )
+    return final
+
+
+def test_permutar_estados_no_cambia_la_distribucion():
+    rng = np.random.default_rng(0)
+    codigos = rng.integers(0, 3, size=200)
+    base = _perdidas(MATRIZ, ESTADOS, codigos, correlacion=0.4)
+
+    for permutacion in ([3, 0, 1, 2], [2, 3, 1, 0], [1, 2, 0, 3]):
+        # permutacion[k] = índice original del estado que pasa a ocupar la posición k
+        permutacion = np.array(permutacion)
+        inversa = np.argsort(permutacion)
+        estados = [ESTADOS[i] for i in permutacion]
+        matriz = MATRIZ[np.ix_(permutacion, permutacion)]
+        resultado = _perdidas(matriz, estados, inversa[codigos], correlacion=0.4)
+
+        for clave in ("perdida_media", "desviacion", "VaR_999", "ES_999"):
+            assert np.isclose(resultado[clave], base[clave]), (permutacion, clave)
+
+
+def test_correlacion_engorda_la_cola():
+    codigos = np.zeros(200, dtype=np.int64)
+    independiente = _perdidas(MATRIZ, ESTADOS, codigos, correlacion=0.0)
+    correlacionada = _perdidas(MATRIZ, ESTADOS, codigos, correlacion=0.4)
+
+    assert correlacionada["desviacion"] > 2 * independiente["desviacion"]
+    assert np.isclose(correlacionada["perdida_media"], independiente["perdida_media"], rtol=0.25)